@@ -1,4 +1,5 @@
 import contextlib
+import logging
 
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
@@ -8,24 +9,63 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from app.conf.config import db_config
+from app.database.query_monitor import install_query_monitor
+from app.services.metrics import instrument_engine
+from app.services.server_timing import time_engine
+from app.services.tracing import trace_engine
+
+logger = logging.getLogger(__name__)
 
 
 class DatabaseSessionManager:
-    def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url, echo=True)
-        self._session_maker: async_sessionmaker = async_sessionmaker(
-            autoflush=False, autocommit=False, bind=self._engine
-        )
+    """
+    Owns the engine and hands out sessions.
+
+    The engine, and with it the database driver, is created on first use, so
+    processes that never touch the database do not import or configure it.
+
+    Args:
+        url (str): The database URL.
+        pool_size (int, optional): Connections kept open. Defaults to `DB_POOL_SIZE`.
+        max_overflow (int, optional): Connections opened beyond `pool_size` under load,
+            -1 for no limit. Defaults to `DB_MAX_OVERFLOW`.
+    """
+
+    def __init__(self, url: str, pool_size: int | None = None, max_overflow: int | None = None):
+        self._url = url
+        self.pool_size = db_config.DB_POOL_SIZE if pool_size is None else pool_size
+        self.max_overflow = db_config.DB_MAX_OVERFLOW if max_overflow is None else max_overflow
+        self._engine: AsyncEngine | None = None
+        self._session_maker: async_sessionmaker | None = async_sessionmaker(autoflush=False, autocommit=False)
+
+    @property
+    def engine(self) -> AsyncEngine:
+        return self._ensure_engine()
+
+    def _ensure_engine(self) -> AsyncEngine:
+        if self._engine is None:
+            engine = create_async_engine(
+                self._url, echo=db_config.DB_ECHO, pool_size=self.pool_size, max_overflow=self.max_overflow
+            )
+            instrument_engine(engine)
+            trace_engine(engine)
+            time_engine(engine)
+            install_query_monitor(engine)
+            if self._session_maker is not None:
+                self._session_maker.configure(bind=engine)
+            self._engine = engine
+        return self._engine
 
     @contextlib.asynccontextmanager
     async def session(self):
         if self._session_maker is None:
             raise Exception("Session is not initialized")
+        self._ensure_engine()
         session = self._session_maker()
         try:
             yield session
-        except Exception as err:
-            print(err)
+        except Exception:
+            logger.debug("Rolling back the session after an error", exc_info=True)
             await session.rollback()
             raise
         finally:
@@ -0,0 +1,164 @@
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.conf.config import DBConfig, db_config
+from app.database.statements import ExecutedStatement, statement_hook
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_MAX_LENGTH = 300
+# Statements kept per request to explain an exceeded budget
+RECORDED_STATEMENTS = 50
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised when a request runs more SQL statements than its route allows.
+    """
+
+
+class QueryCounter:
+    """
+    The SQL statements run while serving one request.
+
+    Attributes:
+        scope (dict): The ASGI scope of the request.
+        count (int): The number of statements executed.
+        statements (list[str]): The first `RECORDED_STATEMENTS` statements, shortened.
+    """
+
+    __slots__ = ("scope", "count", "statements")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.statements: list[str] = []
+
+    @property
+    def route(self) -> str:
+        """
+        The path template of the matched route, or the raw path before routing.
+        """
+        return getattr(self.scope.get("route"), "path", self.scope.get("path", "-"))
+
+    def add(self, statement: str) -> None:
+        self.count += 1
+        if len(self.statements) < RECORDED_STATEMENTS:
+            self.statements.append(shorten(statement))
+
+
+query_counter: ContextVar[QueryCounter | None] = ContextVar("query_counter", default=None)
+
+
+def query_budget(limit: int) -> Callable:
+    """
+    Declares the maximum number of SQL statements a route may run per request.
+
+    Apply it below the route decorator. Routes without a declared budget get
+    `DB_QUERY_BUDGET`.
+
+    Example:
+        ```python
+        @router.get("/contact/")
+        @query_budget(2)
+        async def get_contacts(...):
+            ...
+        ```
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.query_budget = limit
+        return endpoint
+
+    return decorator
+
+
+def shorten(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) > STATEMENT_MAX_LENGTH:
+        return statement[:STATEMENT_MAX_LENGTH] + "..."
+    return statement
+
+
+def parameters_shape(parameters: Any, executemany: bool) -> str:
+    """
+    Describes bound parameters without their values, which may be personal data.
+
+    Returns:
+        str: e.g. "3 positional", "keys: email, id" or "100 rows of 7 positional".
+    """
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} rows of {parameters_shape(rows[0], False)}" if rows else "0 rows"
+    if not parameters:
+        return "none"
+    if isinstance(parameters, dict):
+        return "keys: " + ", ".join(sorted(map(str, parameters)))
+    return f"{len(parameters)} positional"
+
+
+def check_budget(counter: QueryCounter, budget: int, mode: str) -> None:
+    """
+    Reports a request that ran more statements than its budget.
+
+    Args:
+        counter (QueryCounter): The statements of the request.
+        budget (int): The allowed number of statements.
+        mode (str): "warn" logs a warning, "raise" raises, "off" does nothing.
+
+    Raises:
+        QueryBudgetExceeded: In "raise" mode, when the budget is exceeded.
+    """
+    if mode == "off" or counter.count <= budget:
+        return
+    message = f"{counter.scope.get('method')} {counter.route} ran {counter.count} SQL statements, budget is {budget}"
+    if mode == "raise":
+        raise QueryBudgetExceeded(message + ":\n" + "\n".join(counter.statements))
+    logger.warning(message, extra={"statements": counter.statements})
+
+
+class QueryMonitor:
+    """
+    Statement subscriber counting the statements of the current request and logging slow ones.
+
+    Args:
+        config (DBConfig): The slow statement threshold.
+    """
+
+    def __init__(self, config: DBConfig):
+        self.config = config
+
+    def before(self, statement: ExecutedStatement) -> None:
+        counter = query_counter.get()
+        if counter is not None:
+            counter.add(statement.statement)
+
+    def after(self, statement: ExecutedStatement) -> None:
+        elapsed_ms = statement.duration * 1000
+        if statement.error is None and elapsed_ms >= self.config.DB_SLOW_QUERY_MS:
+            counter = query_counter.get()
+            logger.warning(
+                "Slow query took %.1f ms on %s: %s [parameters: %s]",
+                elapsed_ms,
+                counter.route if counter is not None else "-",
+                shorten(statement.statement),
+                parameters_shape(statement.parameters, statement.executemany),
+            )
+
+
+def install_query_monitor(engine: AsyncEngine, config: DBConfig = db_config) -> None:
+    """
+    Counts the statements of the current request and logs slow statements of an engine.
+
+    Statements taking at least `DB_SLOW_QUERY_MS` are logged at WARNING level with
+    the statement, the shape of its parameters, the duration and the route of the
+    request that ran it.
+
+    Args:
+        engine (AsyncEngine): The engine to monitor.
+        config (DBConfig, optional): The thresholds. Defaults to `db_config`.
+    """
+    statement_hook(engine).subscribe(QueryMonitor(config))
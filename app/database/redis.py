@@ -1,23 +1,86 @@
+import logging
+import time
+
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 import contextlib
 from app.conf.config import config_redis
+from app.services.metrics import redis_command_duration, redis_command_errors
+from app.services.server_timing import record
+from app.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedPipeline(Pipeline):
+    """
+    A pipeline timing and tracing each round trip as a single "PIPELINE" command.
+    """
+
+    async def execute(self, raise_on_error: bool = True):
+        span = tracer.start_child("redis PIPELINE", **{"redis.commands": len(self.command_stack)})
+        started = time.perf_counter()
+        error = None
+        try:
+            return await super().execute(raise_on_error)
+        except Exception as exc:
+            error = exc
+            redis_command_errors.labels("PIPELINE").inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            redis_command_duration.labels("PIPELINE").observe(elapsed)
+            record("redis", elapsed)
+            if span is not None:
+                tracer.finish(span, error)
+
+
+class InstrumentedRedis(Redis):
+    """
+    A Redis client recording the latency and errors of every command by command name,
+    and a span per command within sampled traces.
+    """
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper()
+        span = tracer.start_child(f"redis {command}")
+        started = time.perf_counter()
+        error = None
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception as exc:
+            error = exc
+            redis_command_errors.labels(command).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            redis_command_duration.labels(command).observe(elapsed)
+            record("redis", elapsed)
+            if span is not None:
+                tracer.finish(span, error)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 
 class RedisSessionManager:
     def __init__(self, host: str, port: int, db: int, password: str | None = None):
-        self._redis_client = Redis(
-            host=host,
-            port=port,
-            db=db,
-            password=password,
-        )
+        self._options = {"host": host, "port": port, "db": db, "password": password}
+        # Created on first use, processes that never talk to Redis build no client or pool
+        self._redis_client: InstrumentedRedis | None = None
+
+    @property
+    def client(self) -> InstrumentedRedis:
+        if self._redis_client is None:
+            self._redis_client = InstrumentedRedis(**self._options)
+        return self._redis_client
 
     async def connect(self):
         """Опциональный метод, если нужно явно проверять подключение"""
         try:
-            await self._redis_client.ping()
+            await self.client.ping()
         except Exception as e:
-            print(f"Ошибка подключения к Redis: {e}")
+            logger.error("Redis connection failed: %s", e)
             
     async def close(self):
         if self._redis_client:
@@ -25,9 +88,7 @@ class RedisSessionManager:
 
     @contextlib.asynccontextmanager
     async def session(self):
-        if self._redis_client is None:
-            raise Exception("Redis is not initialized")
-        yield self._redis_client
+        yield self.client
 
 
 
@@ -0,0 +1,129 @@
+import time
+import weakref
+from typing import Any, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Key of the statements in flight in `Connection.info`
+IN_FLIGHT_KEY = "statements_in_flight"
+
+
+class ExecutedStatement:
+    """
+    A SQL statement passed to the subscribers of a `StatementHook`.
+
+    Attributes:
+        statement (str): The SQL text.
+        parameters (Any): The bound parameters, as handed to the driver.
+        executemany (bool): Whether the parameters are a list of rows.
+        started (float): `perf_counter` time the cursor was called.
+        duration (float | None): Seconds the cursor took, set before `after` is called.
+        rowcount (int | None): The rows matched or returned, if the statement succeeded.
+        error (BaseException | None): The exception the statement failed with.
+        state (dict): Per-statement data of the subscribers, e.g. a span to finish.
+    """
+
+    __slots__ = ("statement", "parameters", "executemany", "started", "duration", "rowcount", "error", "state")
+
+    def __init__(self, statement: str, parameters: Any, executemany: bool):
+        self.statement = statement
+        self.parameters = parameters
+        self.executemany = executemany
+        self.started = 0.0
+        self.duration: float | None = None
+        self.rowcount: int | None = None
+        self.error: BaseException | None = None
+        self.state: dict = {}
+
+
+class StatementSubscriber(Protocol):
+    """
+    Receives the statements of an engine from its `StatementHook`.
+
+    Both methods run on the thread executing the statement, so they must be quick
+    and must not block. Subscribers only need the two methods, so modules that
+    avoid importing SQLAlchemy can define them without this class.
+    """
+
+    def before(self, statement: ExecutedStatement) -> None:
+        """
+        Called before the statement is sent to the database.
+        """
+
+    def after(self, statement: ExecutedStatement) -> None:
+        """
+        Called once the statement has finished or failed; `error` tells which.
+        """
+
+
+class StatementHook:
+    """
+    Times every statement of an engine once and hands it to the subscribers.
+
+    The hook registers a single set of cursor listeners, so metrics, tracing,
+    Server-Timing and the query monitor share one timer and one bookkeeping list
+    per connection instead of each keeping their own. Use `statement_hook` to get
+    the hook of an engine.
+
+    Args:
+        sync_engine (Engine): The engine to listen to.
+    """
+
+    def __init__(self, sync_engine: Engine):
+        self.subscribers: list[StatementSubscriber] = []
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(sync_engine, "handle_error", self._handle_error)
+
+    def subscribe(self, subscriber: StatementSubscriber) -> None:
+        self.subscribers.append(subscriber)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        executed = ExecutedStatement(statement, parameters, executemany)
+        conn.info.setdefault(IN_FLIGHT_KEY, []).append(executed)
+        for subscriber in self.subscribers:
+            subscriber.before(executed)
+        # Started last, so the subscribers' own work is not counted as database time
+        executed.started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        finished = time.perf_counter()
+        executed = conn.info[IN_FLIGHT_KEY].pop()
+        executed.duration = finished - executed.started
+        executed.rowcount = cursor.rowcount
+        for subscriber in self.subscribers:
+            subscriber.after(executed)
+
+    def _handle_error(self, context):
+        finished = time.perf_counter()
+        in_flight = context.connection.info.get(IN_FLIGHT_KEY) if context.connection is not None else None
+        if not in_flight:
+            # The error was raised before a statement reached the cursor, e.g. on connect
+            return
+        executed = in_flight.pop()
+        executed.duration = finished - executed.started
+        executed.error = context.original_exception
+        for subscriber in self.subscribers:
+            subscriber.after(executed)
+
+
+_hooks: "weakref.WeakKeyDictionary[Engine, StatementHook]" = weakref.WeakKeyDictionary()
+
+
+def statement_hook(engine: AsyncEngine) -> StatementHook:
+    """
+    Returns the statement hook of an engine, installing it on first use.
+
+    Args:
+        engine (AsyncEngine): The engine whose statements are observed.
+
+    Returns:
+        StatementHook: The hook to subscribe to.
+    """
+    sync_engine = engine.sync_engine
+    hook = _hooks.get(sync_engine)
+    if hook is None:
+        hook = _hooks[sync_engine] = StatementHook(sync_engine)
+    return hook
@@ -0,0 +1,71 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.conf.config import CompressionConfig, compression_config
+from app.services.compression import Compressor, available_encodings, is_compressible, negotiate
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with the best coding the client accepts, brotli or gzip.
+
+    Only complete bodies of compressible media types, at least
+    `COMPRESSION_MIN_SIZE` bytes long and not encoded already, are compressed;
+    streamed responses, e.g. files, are sent as they are. Compressed bodies are
+    kept by digest of the raw body, so a response served repeatedly from the cache
+    is compressed once.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        config (CompressionConfig, optional): The threshold, levels and cache size.
+            Defaults to `compression_config`.
+    """
+
+    def __init__(self, app: ASGIApp, config: CompressionConfig = compression_config):
+        self.app = app
+        self.config = config
+        self.encodings = available_encodings()
+        self.compressor = Compressor(config)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if "content-encoding" in headers or not is_compressible(headers.get("content-type", "")):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held back until the body shows whether it is worth compressing
+                    start = message
+                return
+
+            body = message.get("body", b"")
+            passthrough = True
+            if message.get("more_body", False) or len(body) < self.config.COMPRESSION_MIN_SIZE:
+                await send(start)
+                await send(message)
+                return
+            body = self.compressor.compress(body, encoding)
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send({**start, "headers": headers.raw})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
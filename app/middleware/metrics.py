@@ -0,0 +1,47 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.metrics import http_request_duration, http_requests, http_requests_in_progress
+
+
+class MetricsMiddleware:
+    """
+    Records the latency and status of every HTTP request.
+
+    Requests are labelled with the path template of the matched route, e.g.
+    `/api/contacts/contact/{contact_id}`, so the number of series stays bounded.
+    Requests that match no route are labelled "unmatched".
+
+    Args:
+        app (ASGIApp): The wrapped application.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_progress.dec()
+            # The router stores the matched route in the shared scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_request_duration.labels(method, route).observe(elapsed)
+            http_requests.labels(method, route, str(status_code)).inc()
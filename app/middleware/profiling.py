@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.conf.config import ProfilingConfig, profiling_config
+from app.models.models import Role
+from app.services.auth import auth_service
+from app.services.profiler import ProfileSession, profile_store, profiling_lock
+
+TRUTHY = {"1", "true", "yes"}
+
+
+def profiling_requested(scope: Scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.decode("latin-1").lower() in TRUTHY
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        values = parse_qs(query.decode("latin-1")).get("profile", [])
+        return any(value.lower() in TRUTHY for value in values)
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests flagged with an `X-Profile: 1` header or a `profile=1` query parameter.
+
+    Only requests of admins are profiled, judged by the role claim of the bearer
+    token, which costs a signature check and no database or Redis round trip;
+    other flagged requests are served normally. The response of a profiled request
+    carries an `X-Profile-Id` header, the report is available from the admin
+    profiles endpoints, which authenticate the user fully. A user demoted after
+    the token was issued may still have requests profiled until the token expires,
+    but the admin endpoints check the current role and no longer serve them reports.
+
+    While another profile is running, flagged requests are served without profiling.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        config (ProfilingConfig, optional): The profiler settings. Defaults to `profiling_config`.
+    """
+
+    def __init__(self, app: ASGIApp, config: ProfilingConfig = profiling_config):
+        self.app = app
+        self.config = config
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not profiling_requested(scope) or profiling_lock.locked():
+            await self.app(scope, receive, send)
+            return
+        if not self.is_admin(scope):
+            await self.app(scope, receive, send)
+            return
+
+        async with profiling_lock:
+            session = ProfileSession(
+                "request", self.config, [threading.get_ident()], asyncio.current_task()
+            )
+            status_code = None
+
+            async def send_with_profile_id(message: Message) -> None:
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-id", session.id.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            session.start()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                route = getattr(scope.get("route"), "path", scope["path"])
+                report = session.stop(method=scope["method"], path=scope["path"], route=route, status=status_code)
+                profile_store.add(report)
+
+    def is_admin(self, scope: Scope) -> bool:
+        """
+        Checks the bearer token of the request for the admin role claim.
+        """
+        scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        claims = auth_service.decode_access_token(token)
+        return claims is not None and claims.get("role") == Role.admin.value
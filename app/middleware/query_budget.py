@@ -0,0 +1,37 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.conf.config import DBConfig, db_config
+from app.database.query_monitor import QueryCounter, check_budget, query_counter
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the SQL statements of every HTTP request and checks them against the budget of its route.
+
+    The budget is the one declared with `query_budget` on the endpoint, or
+    `DB_QUERY_BUDGET`. `DB_QUERY_BUDGET_MODE` decides whether an exceeded budget
+    logs a warning or raises `QueryBudgetExceeded`, which fails the request in tests.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        config (DBConfig, optional): The budget settings. Defaults to `db_config`.
+    """
+
+    def __init__(self, app: ASGIApp, config: DBConfig = db_config):
+        self.app = app
+        self.config = config
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.config.DB_QUERY_BUDGET_MODE == "off":
+            await self.app(scope, receive, send)
+            return
+
+        counter = QueryCounter(scope)
+        token = query_counter.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            query_counter.reset(token)
+        endpoint = getattr(scope.get("route"), "endpoint", None)
+        budget = getattr(endpoint, "query_budget", self.config.DB_QUERY_BUDGET)
+        check_budget(counter, budget, self.config.DB_QUERY_BUDGET_MODE)
@@ -0,0 +1,50 @@
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.log import request_id
+
+MAX_LENGTH = 128
+
+
+class RequestIdMiddleware:
+    """
+    Gives every HTTP request an id that is added to its log records and its response.
+
+    A well-formed `X-Request-ID` header of the client or a proxy is kept, otherwise
+    a random id is generated. The response carries the id in `X-Request-ID`.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        value = incoming_request_id(scope) or uuid.uuid4().hex
+        encoded = value.encode("ascii")
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", encoded)]}
+            await send(message)
+
+        token = request_id.set(value)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(token)
+
+
+def incoming_request_id(scope: Scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name == b"x-request-id":
+            if 0 < len(value) <= MAX_LENGTH and all(33 <= byte < 127 for byte in value):
+                return value.decode("ascii")
+            return None
+    return None
@@ -0,0 +1,43 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.server_timing import RequestTimings, request_timings
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a `Server-Timing` header with the resource breakdown of every HTTP request.
+
+    The header lists the time spent in authentication, the database and Redis, with
+    the number of queries and commands, in serialization and in the route handler,
+    followed by the total time until the response started.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        started = time.perf_counter()
+
+        async def send_with_timings(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                value = timings.header_value(time.perf_counter() - started)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = request_timings.set(timings)
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            request_timings.reset(token)
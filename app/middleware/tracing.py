@@ -0,0 +1,55 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.tracing import Tracer, tracer as default_tracer
+
+
+class TracingMiddleware:
+    """
+    Runs every HTTP request in a root span.
+
+    The trace continues the one of an incoming W3C `traceparent` header, and the
+    `traceparent` of the request span is returned in the response headers of
+    sampled requests. The span is named after the matched route template once
+    the request has been routed.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        tracer (Tracer, optional): The tracer. Defaults to the application tracer.
+    """
+
+    def __init__(self, app: ASGIApp, tracer: Tracer = default_tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        method = scope["method"]
+        attributes = {"http.method": method, "http.target": scope["path"]}
+
+        with self.tracer.start_trace(f"{method} {scope['path']}", traceparent, **attributes) as span:
+            if span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_traceparent(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    headers = list(message.get("headers", []))
+                    headers.append((b"traceparent", span.traceparent.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_traceparent)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{method} {route.path}"
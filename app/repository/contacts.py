@@ -8,8 +8,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.models import Contact, User
 from app.schemas.contact import ContactSchema, ContactUpdateSchema
+from app.services.metrics import record_cache_lookup
+from app.services.tracing import tracer
 
 
+@tracer.traced()
 async def get_contacts(user: User, limit: int, offset: int, db: AsyncSession):
     """
     Retrieve a list of contacts for a given user.
@@ -31,6 +34,7 @@ async def get_contacts(user: User, limit: int, offset: int, db: AsyncSession):
     return contacts.scalars().all()
 
 
+@tracer.traced()
 async def get_contact(user: User, contact_id: int, db: AsyncSession):
     """
     Retrieve a specific contact for a given user by contact ID.
@@ -48,6 +52,7 @@ async def get_contact(user: User, contact_id: int, db: AsyncSession):
     return contact.scalar_one_or_none()
 
 
+@tracer.traced()
 async def create_contacts(user: User, body: ContactSchema, db: AsyncSession):
     """
     Create a new contact for a given user.
@@ -63,13 +68,14 @@ async def create_contacts(user: User, body: ContactSchema, db: AsyncSession):
     contact = Contact(**body.model_dump(exclude_unset=True))
     contact.date_of_birth = datetime.strptime(contact.date_of_birth, '%Y-%m-%d').date()
     contact.user_id = user.id
-    await db.add(contact)
+    db.add(contact)
     await db.commit()
     await db.refresh(contact)
     return contact
 
 
 
+@tracer.traced()
 async def update_contacts(user: User, contact_id: int, body: ContactUpdateSchema, db: AsyncSession):
     """
     Update an existing contact for a given user.
@@ -91,13 +97,14 @@ async def update_contacts(user: User, contact_id: int, body: ContactUpdateSchema
         contact.surname = body.surname
         contact.email = body.email
         contact.phone = body.phone
-        contact.date_of_birth = body.date_of_birth
+        contact.date_of_birth = datetime.strptime(body.date_of_birth, '%Y-%m-%d').date()
         contact.additional_info = body.additional_info
         await db.commit()
         await db.refresh(contact)
     return contact
 
 
+@tracer.traced()
 async def delete_contact(user: User, contact_id: int, db: AsyncSession):
     """
     Delete a contact for a given user.
@@ -118,6 +125,7 @@ async def delete_contact(user: User, contact_id: int, db: AsyncSession):
         await db.commit()
     return contact
 
+@tracer.traced()
 async def search_by(user: User, db: AsyncSession,
         first_name: Optional[str],
         last_name: Optional[str],
@@ -150,6 +158,7 @@ async def search_by(user: User, db: AsyncSession,
     return contacts.scalars().all()
 
 
+@tracer.traced()
 async def get_upcoming_birthdays(user: User, db: AsyncSession):
     """
     Retrieve contacts with upcoming birthdays within the next 7 days.
@@ -184,6 +193,7 @@ async def get_upcoming_birthdays(user: User, db: AsyncSession):
     contacts = result.scalars().all()
     return contacts
 
+@tracer.traced()
 async def get_all_contacts_from_cache(cache_key: str, redis_client: Redis):
     """
     Retrieve all contacts from Redis cache.
@@ -196,6 +206,7 @@ async def get_all_contacts_from_cache(cache_key: str, redis_client: Redis):
         list[Contact]: A list of contacts retrieved from the cache, or an empty list if no data is cached.
     """
     cached_data = await redis_client.get(cache_key)
+    record_cache_lookup(cache_key, bool(cached_data))
     if cached_data:
         data = json.loads(cached_data)
         contacts = []
@@ -206,6 +217,7 @@ async def get_all_contacts_from_cache(cache_key: str, redis_client: Redis):
         return contacts
     return []
 
+@tracer.traced()
 async def get_contact_from_cache(contact_cache_key: str, redis_client: Redis):
     """
     Retrieve a specific contact from Redis cache.
@@ -218,6 +230,7 @@ async def get_contact_from_cache(contact_cache_key: str, redis_client: Redis):
         Contact | None: The contact object if found in the cache, or None if no data is cached.
     """
     cached_data = await redis_client.get(contact_cache_key)
+    record_cache_lookup(contact_cache_key, bool(cached_data))
     if cached_data:
         data = json.loads(cached_data)
         contact = Contact()
@@ -225,6 +238,7 @@ async def get_contact_from_cache(contact_cache_key: str, redis_client: Redis):
         return contact
     return None
 
+@tracer.traced()
 async def set_contact_to_cache(key: str, contacts: dict, redis_client: Redis, ttl: int = 60):
     """
     Store data in Redis cache.
@@ -238,5 +252,8 @@ async def set_contact_to_cache(key: str, contacts: dict, redis_client: Redis, tt
     Returns:
         None: This function does not return any value.
     """
-    serializable_value = [contact.__getstate__() for contact in contacts]
+    if isinstance(contacts, Contact):
+        serializable_value = contacts.__getstate__()
+    else:
+        serializable_value = [contact.__getstate__() for contact in contacts]
     await redis_client.setex(key, ttl, json.dumps(serializable_value))
\ No newline at end of file
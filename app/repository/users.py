@@ -4,9 +4,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.db import get_db
 from app.models.models import User
 from app.schemas.user import UserCreationSchema
+from app.services.tracing import tracer
 from sqlalchemy import select
 
 
+@tracer.traced()
 async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     """
     Retrieve a user by their email address.
@@ -23,11 +25,10 @@ async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     stmt = select(User).filter(User.email == email)
     user = await db.execute(stmt)
     user = user.scalar_one_or_none()
-    print(email)
-    print(user, "======================")
     return user
 
 
+@tracer.traced()
 async def create_user(body: UserCreationSchema, db: AsyncSession = Depends(get_db)):
     """
     Create a new user in the database.
@@ -42,14 +43,14 @@ async def create_user(body: UserCreationSchema, db: AsyncSession = Depends(get_d
     Returns:
         User: The newly created user object.
     """
-    print(db)
     user = User(**body.model_dump())
-    await db.add(user)
+    db.add(user)
     await db.commit()
     await db.refresh(user)
     return user
 
 
+@tracer.traced()
 async def update_token(user: User, token: str | None, db: AsyncSession):
     """
     Update the user's refresh token in the database.
@@ -65,6 +66,24 @@ async def update_token(user: User, token: str | None, db: AsyncSession):
     await db.commit()
 
 
+@tracer.traced()
+async def update_password(user: User, hashed_password: str, db: AsyncSession) -> None:
+    """
+    Replace the user's stored password hash.
+
+    This function is used to upgrade hashes created with an outdated scheme or
+    cost factor after the user has been authenticated with the plain password.
+
+    Args:
+        user (User): The user object whose password hash is being replaced.
+        hashed_password (str): The new password hash.
+        db (AsyncSession): The database session to commit changes.
+    """
+    user.password = hashed_password
+    await db.commit()
+
+
+@tracer.traced()
 async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     Confirm a user's email address.
@@ -86,6 +105,7 @@ async def confirmed_email(email: str, db: AsyncSession) -> None:
     return user if user else None
 
 
+@tracer.traced()
 async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> User:
     """
     Update the avatar URL for a user identified by their email.
@@ -101,7 +121,6 @@ async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> Us
     Raises:
         ValueError: If the user with the provided email is not found in the database.
     """
-    print("111111111111111111111111111111111111111")
     user = await get_user_by_email(email, db)
     user.avatar = url
     await db.commit()
@@ -1,30 +1,42 @@
-from fastapi import APIRouter, HTTPException, Depends, Request, status, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.db import get_db
+from app.database.redis import get_redis
 from app.repository import users as repositories_users
 from app.schemas.user import RequestEmail, UserCreationSchema, TokenSchema, UserResponseSchema
 from app.services.auth import auth_service
-from app.services.email import send_email
-
-auth_router = APIRouter(prefix='/auth', tags=['auth'])
+from app.services.outbox import email_outbox
+from app.services.responses import FastJSONResponse, JSONRoute
+from app.database.query_monitor import query_budget
+
+auth_router = APIRouter(
+    prefix='/auth',
+    tags=['auth'],
+    route_class=JSONRoute,
+    default_response_class=FastJSONResponse,
+)
 get_refresh_token = HTTPBearer()
 
 
 @auth_router.post("/signup", response_model=UserResponseSchema, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserCreationSchema, bt: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
+@query_budget(3)
+async def signup(body: UserCreationSchema, request: Request, db: AsyncSession = Depends(get_db),
+                 redis: Redis = Depends(get_redis)):
     """
     Sign up a new user.
 
     This endpoint allows a new user to create an account. If the email already exists, a conflict is raised.
-    The password is hashed before being saved. A confirmation email is sent after the user is created.
+    The password is hashed before being saved. A confirmation email is queued in the email outbox
+    after the user is created and delivered by the outbox worker.
 
     Args:
         body (UserCreationSchema): The user creation data, including email and password.
-        bt (BackgroundTasks): Background tasks to handle email sending.
         request (Request): The HTTP request object to retrieve base URL for email.
         db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        redis (Redis, optional): The Redis client holding the email outbox. Defaults to Depends(get_redis).
 
     Raises:
         HTTPException: If the user already exists (409 Conflict).
@@ -37,17 +49,19 @@ async def signup(body: UserCreationSchema, bt: BackgroundTasks, request: Request
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
     body.password = auth_service.get_password_hash(body.password)
     new_user = await repositories_users.create_user(body, db)
-    bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    await email_outbox.enqueue(redis, new_user.email, new_user.username, str(request.base_url))
     return new_user
 
 
 @auth_router.post("/login",  response_model=TokenSchema)
+@query_budget(3)
 async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Log in a user and return JWT tokens.
 
     This endpoint allows a user to log in by providing their credentials. If the credentials are valid,
-    an access token and a refresh token are generated and returned.
+    an access token and a refresh token are generated and returned. If the stored password hash
+    was created with an outdated scheme or cost factor, it is transparently replaced.
 
     Args:
         body (OAuth2PasswordRequestForm): The login credentials (username and password).
@@ -66,8 +80,12 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not verified")
     if not auth_service.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    if auth_service.needs_rehash(user.password):
+        # Upgrade hashes made with an outdated scheme or cost factor
+        new_hash = auth_service.get_password_hash(body.password)
+        await repositories_users.update_password(user, new_hash, db)
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
+    access_token = await auth_service.create_access_token(data=auth_service.access_token_data(user))
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
     await repositories_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
@@ -99,7 +117,7 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(get_
         await repositories_users.update_token(user, None, db)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
+    access_token = await auth_service.create_access_token(data=auth_service.access_token_data(user))
     refresh_token = await auth_service.create_refresh_token(data={"sub": email})
     await repositories_users.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
@@ -126,7 +144,6 @@ async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     email = await auth_service.verify_email_token(token)
     user = await repositories_users.get_user_by_email(email, db)
-    print(user)
     if user is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error")
     if user.verified:
@@ -136,19 +153,19 @@ async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
 
 
 @auth_router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: AsyncSession = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: AsyncSession = Depends(get_db),
+                        redis: Redis = Depends(get_redis)):
     """
     Request a new email confirmation link.
 
     This endpoint allows a user to request a new email confirmation link. If the email is already confirmed,
-    a message is returned. Otherwise, a confirmation email is sent.
+    a message is returned. Otherwise, a confirmation email is queued in the email outbox.
 
     Args:
         body (RequestEmail): The user's email address.
-        background_tasks (BackgroundTasks): Background tasks to handle email sending.
         request (Request): The HTTP request object to retrieve the base URL for the email.
         db (AsyncSession, optional): The database session. Defaults to Depends(get_db).
+        redis (Redis, optional): The Redis client holding the email outbox. Defaults to Depends(get_redis).
 
     Returns:
         dict: A message indicating the email confirmation request status.
@@ -158,7 +175,7 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user:
         if user.verified:
             return {"message": "Your email is already confirmed"}
-        background_tasks.add_task(send_email, user.email, user.username, str(request.base_url))
+        await email_outbox.enqueue(redis, user.email, user.username, str(request.base_url))
     else:
         return {"message": "User is`t exist"}
     return {"message": "Check your email for confirmation."}
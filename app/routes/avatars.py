@@ -0,0 +1,79 @@
+import os
+from email.utils import parsedate_to_datetime
+
+from fastapi import APIRouter, HTTPException, Path, Request, status
+from fastapi.responses import FileResponse, Response
+
+from app.conf.config import avatar_config
+from app.services.avatar_storage import avatar_storage
+from app.services.responses import FastJSONResponse, JSONRoute
+
+avatars_router = APIRouter(
+    prefix="/avatars",
+    tags=["avatars"],
+    route_class=JSONRoute,
+    default_response_class=FastJSONResponse,
+)
+
+
+def is_not_modified(request: Request, etag: str, modified: float) -> bool:
+    """
+    Checks the conditional request headers against the current file.
+
+    Args:
+        request (Request): The HTTP request object.
+        etag (str): The ETag of the file.
+        modified (float): The modification time of the file.
+
+    Returns:
+        bool: True if the client copy is current and a 304 response can be sent.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@avatars_router.get("/{digest}/{filename}", response_class=FileResponse)
+async def get_avatar(
+    request: Request,
+    digest: str = Path(pattern=r"^[0-9a-f]{64}$"),
+    filename: str = Path(pattern=r"^[0-9]+\.[a-z]+$"),
+):
+    """
+    Serves an avatar kept by the local avatar storage.
+
+    Avatar files are addressed by the content hash and never change, so the response
+    may be cached for `AVATAR_CACHE_MAX_AGE` seconds. The ETag is derived from the hash,
+    conditional requests with `If-None-Match` or `If-Modified-Since` get a 304 response,
+    and `Range` requests are answered with partial content.
+
+    Args:
+        request (Request): The HTTP request object.
+        digest (str): The SHA-256 hex digest of the uploaded image.
+        filename (str): The generated size and format, e.g. "250.webp".
+
+    Returns:
+        FileResponse: The image file, or an empty 304 response.
+
+    Raises:
+        HTTPException: If the avatar does not exist (404).
+    """
+    path = avatar_storage.path(digest, filename)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Avatar not found")
+    stat_result = os.stat(path)
+    headers = {
+        "ETag": f'"{digest}-{filename}"',
+        "Cache-Control": f"public, max-age={avatar_config.AVATAR_CACHE_MAX_AGE}, immutable",
+    }
+    if is_not_modified(request, headers["ETag"], stat_result.st_mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, headers=headers, stat_result=stat_result)
@@ -2,7 +2,6 @@ from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Depends, status, Path, Query
 from redis import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi_limiter.depends import RateLimiter
 
 from app.database.db import get_db
 from app.database.redis import get_redis
@@ -13,14 +12,26 @@ from app.schemas.contact import (
     ContactUpdateSchema,
 )
 from app.routes.auth import auth_service
-
-router_crud = APIRouter(prefix="/contacts", tags=["main crud contacts"])
+from app.services.rate_limiter import RateLimit
+from app.services.responses import FastJSONResponse, JSONRoute
+from app.database.query_monitor import query_budget
+
+router_crud = APIRouter(
+    prefix="/contacts",
+    tags=["main crud contacts"],
+    route_class=JSONRoute,
+    default_response_class=FastJSONResponse,
+)
 router_additional = APIRouter(
-    prefix="/contacts", tags=["contacts additional operations"]
+    prefix="/contacts",
+    tags=["contacts additional operations"],
+    route_class=JSONRoute,
+    default_response_class=FastJSONResponse,
 )
 
 @router_crud.get("/contact/",
-    dependencies=[Depends(RateLimiter(times=3, seconds=20))], response_model=list[ContactResponseSchema])
+    dependencies=[Depends(RateLimit("contacts:list"))], response_model=list[ContactResponseSchema])
+@query_budget(2)
 async def get_contacts(
     limit: int = Query(10, ge=2, le=500),
     offset: int = Query(0, ge=0),
@@ -56,7 +67,8 @@ async def get_contacts(
 
 
 @router_additional.get("/search_by/",
-    dependencies=[Depends(RateLimiter(times=3, seconds=20))], response_model=list[ContactResponseSchema])
+    dependencies=[Depends(RateLimit("contacts:search"))], response_model=list[ContactResponseSchema])
+@query_budget(2)
 async def search_by(
     db: AsyncSession = Depends(get_db),
     first_name: Optional[str] = None,
@@ -91,7 +103,8 @@ async def search_by(
 
 
 @router_crud.get("/contact/{contact_id}",
-    dependencies=[Depends(RateLimiter(times=3, seconds=20))], response_model=ContactResponseSchema)
+    dependencies=[Depends(RateLimit("contacts:get"))], response_model=ContactResponseSchema)
+@query_budget(2)
 async def get_contact(
     contact_id: int = Path(ge=1),
     db: AsyncSession = Depends(get_db),
@@ -132,8 +145,9 @@ async def get_contact(
     "/contact/",
     response_model=ContactResponseSchema,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(RateLimiter(times=3, seconds=20))]
+    dependencies=[Depends(RateLimit("contacts:create"))]
 )
+@query_budget(3)
 async def create_contact(
     body: ContactSchema,
     db: AsyncSession = Depends(get_db),
@@ -158,7 +172,8 @@ async def create_contact(
 
 
 @router_crud.put("/contact/{contact_id}",
-    dependencies=[Depends(RateLimiter(times=3, seconds=20))])
+    dependencies=[Depends(RateLimit("contacts:update"))])
+@query_budget(4)
 async def update_contact(
     body: ContactUpdateSchema,
     contact_id: int = Path(ge=1),
@@ -189,7 +204,8 @@ async def update_contact(
 
 
 @router_crud.delete("/contact/{contact_id}",
-    dependencies=[Depends(RateLimiter(times=3, seconds=20))], status_code=status.HTTP_204_NO_CONTENT)
+    dependencies=[Depends(RateLimit("contacts:delete"))], status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(3)
 async def delete_contact(
     contact_id: int = Path(ge=1),
     db: AsyncSession = Depends(get_db),
@@ -213,7 +229,8 @@ async def delete_contact(
 
 
 @router_additional.get("/birthdays",
-    dependencies=[Depends(RateLimiter(times=3, seconds=20))], response_model=list[ContactResponseSchema])
+    dependencies=[Depends(RateLimit("contacts:birthdays"))], response_model=list[ContactResponseSchema])
+@query_budget(2)
 async def get_birthdays(
     db: AsyncSession = Depends(get_db), user=Depends(auth_service.authenticate_user),
     redis_client: Redis = Depends(get_redis)
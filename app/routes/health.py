@@ -0,0 +1,42 @@
+from fastapi import APIRouter, status
+
+from app.database.query_monitor import query_budget
+from app.services.health import DEGRADED, OK, health_prober
+from app.services.responses import FastJSONResponse, JSONRoute
+
+health_router = APIRouter(
+    prefix="/health",
+    tags=["health"],
+    route_class=JSONRoute,
+    default_response_class=FastJSONResponse,
+)
+
+
+@health_router.get("/live")
+@query_budget(0)
+async def liveness():
+    """
+    Liveness probe: answers as long as the event loop serves requests.
+
+    Returns:
+        dict: {"status": "ok"}.
+    """
+    return {"status": OK}
+
+
+@health_router.get("/ready")
+@query_budget(0)
+async def readiness():
+    """
+    Readiness probe, served from the last result of the background health prober.
+
+    The probe itself touches neither the database nor Redis. A degraded app, with a
+    saturated pool or a lagging event loop, still takes traffic.
+
+    Returns:
+        FastJSONResponse: The status and the result of every check, with status 200 when
+        the app is ok or degraded and 503 while it is starting or unavailable.
+    """
+    report = health_prober.readiness()
+    ready = report["status"] in (OK, DEGRADED)
+    return FastJSONResponse(report, status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,47 @@
+import logging
+
+from fastapi import APIRouter, Depends, Response
+from redis.asyncio import Redis
+
+from app.database.redis import get_redis
+from app.services.email import mail_sender
+from app.services.metrics import CONTENT_TYPE, queue_depth, registry
+from app.services.outbox import email_outbox
+from app.services.responses import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+
+metrics_router = APIRouter(tags=["metrics"], default_response_class=FastJSONResponse)
+
+
+async def collect_queue_depths(redis: Redis) -> None:
+    """
+    Refreshes the depth gauges of the in-process queues and the Redis email outbox.
+
+    Args:
+        redis (Redis): The Redis client holding the email outbox.
+    """
+    queue_depth.labels("mail_sender").set(mail_sender.queue_size)
+    try:
+        depth = await email_outbox.depth(redis)
+    except Exception as error:
+        # The metrics must stay available while Redis is down
+        logger.warning("Failed to read the email outbox depth: %r", error)
+        return
+    for name, size in depth.items():
+        queue_depth.labels(f"mail_outbox_{name}").set(size)
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics(redis: Redis = Depends(get_redis)):
+    """
+    Exposes the application metrics in the Prometheus text format.
+
+    Args:
+        redis (Redis): The Redis client, used to read the email outbox depth.
+
+    Returns:
+        Response: The metrics exposition.
+    """
+    await collect_queue_depths(redis)
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,91 @@
+import asyncio
+from dataclasses import asdict
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app.conf.config import profiling_config
+from app.models.models import Role
+from app.services.profiler import ProfileReport, ProfileSession, profile_store, profiling_lock
+from app.services.roles import RoleAccess
+from app.services.responses import FastJSONResponse, JSONRoute
+
+profiling_router = APIRouter(
+    prefix="/admin/profiles",
+    tags=["profiling"],
+    dependencies=[Depends(RoleAccess([Role.admin]))],
+    route_class=JSONRoute,
+    default_response_class=FastJSONResponse,
+)
+
+
+def render(report: ProfileReport, format: str):
+    if format == "text":
+        return PlainTextResponse(report.render_text())
+    return asdict(report)
+
+
+@profiling_router.get("/")
+async def list_profiles():
+    """
+    Lists the stored profile reports, newest first.
+
+    Returns:
+        list[dict]: The id, kind, duration and request details of every report.
+    """
+    return [report.summary() for report in profile_store.list()]
+
+
+@profiling_router.post("/process")
+async def profile_process(
+    seconds: float = Query(5, gt=0, le=profiling_config.PROFILING_MAX_SECONDS),
+    format: Literal["json", "text"] = "json",
+):
+    """
+    Profiles all threads of the process for a number of seconds.
+
+    The event loop keeps serving requests meanwhile, their work is what the profile shows.
+
+    Args:
+        seconds (float): The profiling duration, at most `PROFILING_MAX_SECONDS`.
+        format (str): "json" for the report, "text" for a readable call tree.
+
+    Returns:
+        dict | PlainTextResponse: The profile report.
+
+    Raises:
+        HTTPException: 409 if another profile is running.
+    """
+    if profiling_lock.locked():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another profile is running")
+    async with profiling_lock:
+        session = ProfileSession("process", profiling_config)
+        session.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            report = session.stop()
+    profile_store.add(report)
+    return render(report, format)
+
+
+@profiling_router.get("/{profile_id}")
+async def get_profile(profile_id: str, format: Literal["json", "text"] = "json"):
+    """
+    Returns a stored profile report.
+
+    Args:
+        profile_id (str): The id from the `X-Profile-Id` response header or the list.
+        format (str): "json" for the report, "text" for a readable call tree.
+
+    Returns:
+        dict | PlainTextResponse: The profile report.
+
+    Raises:
+        HTTPException: 404 if the report does not exist or was evicted.
+    """
+    report = profile_store.get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return render(report, format)
@@ -1,53 +1,83 @@
-from fastapi import (
-    APIRouter,
-    File,
-    Depends,
-    Form,
-    UploadFile,
-    BackgroundTasks,
-)
+from fastapi import APIRouter, Depends
 
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.db import get_db
+from app.database.redis import get_redis
 from app.repository import users as repositories_users
 
 from app.services.auth import auth_service
-from fastapi_limiter.depends import RateLimiter
-from app.services.cloudinary import claudinary
+from app.services.avatar import AvatarUpload, get_avatar_upload
+from app.services.avatar_storage import avatar_storage
+from app.services.rate_limiter import RateLimit
+from app.services.responses import FastJSONResponse, JSONRoute
+from app.database.query_monitor import query_budget
 
-profile_router = APIRouter(prefix="/profile", tags=["profile"])
+profile_router = APIRouter(
+    prefix="/profile",
+    tags=["profile"],
+    route_class=JSONRoute,
+    default_response_class=FastJSONResponse,
+)
 
 
 @profile_router.post(
-    "/update_avatar", dependencies=[Depends(RateLimiter(times=1, seconds=20))]
+    "/update_avatar",
+    dependencies=[Depends(RateLimit("profile:update_avatar"))],
+    # The body is parsed by `get_avatar_upload`, describe it for the docs
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file"],
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                    }
+                }
+            },
+        }
+    },
 )
+@query_budget(4)
 async def update_avatar(
-    file: UploadFile = File(...),
+    file: AvatarUpload = Depends(get_avatar_upload),
     db: AsyncSession = Depends(get_db),
     user=Depends(auth_service.authenticate_user),
+    redis: Redis = Depends(get_redis),
 ):
     """
     Endpoint to update the user's avatar.
 
-    This endpoint allows an authenticated user to upload a new avatar image. The image is 
-    uploaded to Cloudinary and the URL of the uploaded image is then saved in the database 
-    for the corresponding user.
+    This endpoint allows an authenticated user to upload a new avatar image. The multipart 
+    body is parsed as it streams in, so memory per upload stays bounded; the file is checked 
+    against the size cap, content type and image magic bytes and hashed on the way, then resized off the event loop and stored under its 
+    content hash by the configured avatar storage (Cloudinary or the local filesystem). The 
+    URL of the stored image is then saved in the database for the corresponding user. 
+    Re-uploading the current avatar is a no-op. The cached user is dropped so the new URL 
+    is visible right away.
 
     Args:
-        file (UploadFile): The image file to upload, received from the client.
+        file (AvatarUpload): The image file streamed from the `file` field of the multipart body.
         db (AsyncSession): The database session used to interact with the database.
         user (User): The authenticated user (automatically injected by the `authenticate_user` method).
+        redis (Redis): The Redis client holding the cached user.
 
     Returns:
         dict: A JSON response with a success message.
 
     Raises:
-        HTTPException: If the file upload to Cloudinary fails, or if there is an issue with updating the avatar in the database.
-        RateLimiterException: If the rate limit (1 request per 20 seconds) is exceeded.
+        HTTPException: If the file is not an allowed image type (415), too large (413) or not a readable image (422).
+        HTTPException: If storing the file fails, or if there is an issue with updating the avatar in the database.
+        HTTPException: If the "profile:update_avatar" rate limit policy is exceeded (429).
     """
-    result_url =  await claudinary.upload_avatar_to_cloudinary(file, user.email)
+    if user.avatar and file.digest in user.avatar:
+        return {"message": "Avatar updated successfully!"}
+    result_url = await avatar_storage.save(user.email, file)
     await repositories_users.update_avatar_url(user.email, result_url, db)
+    await redis.delete(f"user:{user.email}")
     return {"message": "Avatar updated successfully!"}
 
 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict, Field, EmailStr, field_serializer, field_validator
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, field_validator
 from datetime import datetime
 from typing import Optional, Annotated
 from datetime import date
@@ -33,13 +33,23 @@ class ContactUpdateSchema(ContactSchema):
     completed: bool
 
 
-class ContactResponseSchema(ContactSchema):
-    id: int = 1
+class ContactResponseSchema(BaseModel):
+    """
+    A contact as returned by the API.
+
+    The rows come from our own database, written through `ContactSchema`, so the
+    fields carry plain types only: none of the input constraints, `EmailStr` or the
+    phone pattern are checked again on every response.
+    """
+
+    name: str
+    surname: str
+    email: str
+    phone: str
     date_of_birth: date
+    additional_info: Optional[str] = None
+    id: int = 1
 
     model_config = ConfigDict(
         from_attributes=True,
     )
-    @field_serializer('date_of_birth')
-    def serialize_date(self, date_value: date, _info):
-        return date_value.strftime('%Y-%m-%d')
@@ -1,9 +1,8 @@
 from datetime import datetime, timedelta, timezone
 import pickle
-from typing import Any, Coroutine, Optional
+from typing import TYPE_CHECKING, Any, Coroutine, Optional
 
 from fastapi import Depends, HTTPException, status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
@@ -13,11 +12,49 @@ from app.database.db import get_db
 from app.database.redis import get_redis
 from app.models.models import User
 from app.repository import users as repository_users
-from app.conf.config import jwt_config
+from app.conf.config import PasswordHashConfig, jwt_config, password_hash_config
+from app.services.lazy import LazyAttribute
+from app.services.metrics import record_cache_lookup
+from app.services.server_timing import timed
+from app.services.tracing import tracer
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+def build_password_context(config: PasswordHashConfig) -> "CryptContext":
+    """
+    Builds the password hashing context from the hashing configuration.
+
+    The first configured scheme is used for new hashes, every other scheme is
+    only accepted for verification and reported as deprecated. Cost factors are
+    pinned (min = default = max), so hashes created with any other cost are
+    reported by `needs_update` and can be upgraded on the next login.
+
+    Args:
+        config (PasswordHashConfig): The hashing schemes and cost factors.
+
+    Returns:
+        CryptContext: The configured passlib context.
+    """
+    # passlib and the hash backends are imported with the first password operation
+    from passlib.context import CryptContext
+
+    rounds = config.BCRYPT_ROUNDS
+    return CryptContext(
+        schemes=config.PASSWORD_SCHEMES,
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+        argon2__time_cost=config.ARGON2_TIME_COST,
+        argon2__memory_cost=config.ARGON2_MEMORY_COST,
+        argon2__parallelism=config.ARGON2_PARALLELISM,
+    )
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = LazyAttribute(lambda: build_password_context(password_hash_config))
     SECRET_KEY = jwt_config.SECRET_KEY
     ALGORITHM = jwt_config.ALGORITHM
     ACCESS_TOKEN_EXPIRE_MINUTES = jwt_config.ACCESS_TOKEN_EXPIRE_MINUTES
@@ -49,6 +86,18 @@ class Auth:
         """
         return self.pwd_context.hash(password)
 
+    def needs_rehash(self, hashed_password):
+        """
+        Checks whether a stored hash was created with an outdated scheme or cost.
+
+        Args:
+            hashed_password (str): The stored password hash.
+
+        Returns:
+            bool: `True` if the password should be rehashed with the current settings.
+        """
+        return self.pwd_context.needs_update(hashed_password)
+
     async def create_access_token(
         self, data: dict, expires_delta: Optional[timedelta] = None
     ):
@@ -77,6 +126,38 @@ class Auth:
         )
         return encoded_access_token
 
+    def access_token_data(self, user: User) -> dict:
+        """
+        Returns the claims of a new access token of a user.
+
+        The role is included so that cheap checks, e.g. whether to profile a request,
+        can be made without loading the user. It is only as fresh as the token, so
+        access control still goes through `authenticate_user` and `RoleAccess`.
+
+        Args:
+            user (User): The user the token is issued to.
+
+        Returns:
+            dict: The data to pass to `create_access_token`.
+        """
+        return {"sub": user.email, "role": getattr(user.role, "value", user.role)}
+
+    def decode_access_token(self, token: str) -> dict | None:
+        """
+        Decodes an access token without loading its user.
+
+        Args:
+            token (str): The encoded access token.
+
+        Returns:
+            dict | None: The claims, or None if the token is invalid, expired or not an access token.
+        """
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            return None
+        return payload if payload.get("scope") == "access_token" else None
+
     async def create_refresh_token(
         self, data: dict, expires_delta: Optional[timedelta] = None
     ):
@@ -135,6 +216,8 @@ class Auth:
                 detail="Could not validate credential",
             )
 
+    @timed("auth")
+    @tracer.traced("auth.authenticate_user")
     async def authenticate_user(
         self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db), redis: Redis = Depends(get_redis)
     ) -> Coroutine[Any, Any, User]:
@@ -158,7 +241,8 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            with tracer.span("auth.jwt_decode"):
+                payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload["scope"] == "access_token":
                 email = payload["sub"]
                 if email is None:
@@ -167,7 +251,11 @@ class Auth:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
-        user = await redis.get(f"user:{email}")
+        with tracer.span("auth.principal_cache") as span:
+            user = await redis.get(f"user:{email}")
+            record_cache_lookup("user", user is not None)
+            if span is not None:
+                span.set_attribute("cache.hit", user is not None)
         if user is None:
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
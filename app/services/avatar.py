@@ -0,0 +1,467 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import AsyncIterator, BinaryIO
+
+from fastapi import HTTPException, Request, status
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+
+from app.conf.config import AvatarConfig, avatar_config
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+MAGIC_BYTES = 12
+
+
+@dataclass
+class ProcessedAvatar:
+    """
+    An avatar image ready for upload.
+
+    Attributes:
+        content (bytes): The encoded image.
+        content_type (str): The MIME type of `content`.
+    """
+
+    content: bytes
+    content_type: str
+
+
+class ImageTooLarge(ValueError):
+    """
+    Raised for images with more pixels than allowed, e.g. decompression bombs.
+    """
+
+
+def resize_image_sizes(
+    source: bytes | str, sizes: list[int], image_format: str, quality: int, max_pixels: int
+) -> list[bytes]:
+    """
+    Fits an image into square boxes of several sizes and re-encodes each of them.
+
+    The image is decoded once, for the largest size, and every smaller size is
+    shrunk from a copy of the previous one. It is rotated according to its EXIF
+    orientation, which also drops the EXIF data. This function runs in a worker
+    process, so it only takes and returns picklable values.
+
+    Args:
+        source (bytes | str): The uploaded image, or the path of the file it is spooled to.
+        sizes (list[int]): The maximum widths and heights in pixels.
+        image_format (str): The Pillow format name used for encoding, e.g. "WEBP".
+        quality (int): The encoder quality.
+        max_pixels (int): The largest width times height decoded; the header is checked
+            before any pixel data is read.
+
+    Returns:
+        list[bytes]: The encoded images, in the order of `sizes`.
+
+    Raises:
+        ImageTooLarge: If the image has more than `max_pixels` pixels.
+        ValueError: If the data is not a readable image.
+    """
+    # Pillow is only needed by the process pool workers, not at application startup
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    largest = max(sizes)
+    encoded = {}
+    # Pillow's own check, for formats that only reveal their size while decoding
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+            if image.width * image.height > max_pixels:
+                raise ImageTooLarge(f"Image of {image.width}x{image.height} pixels is too large")
+            image.draft("RGB", (largest, largest))  # lets JPEG decode at a reduced scale
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            for size in sorted(set(sizes), reverse=True):
+                image = image.copy()
+                image.thumbnail((size, size))
+                output = io.BytesIO()
+                image.save(output, format=image_format, quality=quality)
+                encoded[size] = output.getvalue()
+    except Image.DecompressionBombError as err:
+        raise ImageTooLarge(f"Image is too large: {err}") from err
+    except (UnidentifiedImageError, OSError) as err:
+        raise ValueError(f"Unsupported image: {err}") from err
+    return [encoded[size] for size in sizes]
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """
+    Detects the image type from the leading bytes of a file.
+
+    Args:
+        head (bytes): At least the first `MAGIC_BYTES` bytes of the file.
+
+    Returns:
+        str | None: The MIME type, or None if the bytes match no supported format.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class AvatarUpload:
+    """
+    An uploaded avatar file and its SHA-256 digest.
+
+    The content is kept in memory up to `spool_bytes` and moved to a named temporary
+    file beyond that, so a worker process can open it by path. Chunks are hashed as
+    they are written.
+
+    Attributes:
+        content_type (str): The MIME type detected from the file content.
+        size (int): The number of bytes written.
+        path (str | None): The temporary file, if the upload was spooled to disk.
+
+    Args:
+        content_type (str): The MIME type of the upload.
+        spool_bytes (int): The largest upload kept in memory.
+    """
+
+    def __init__(self, content_type: str, spool_bytes: int):
+        self.content_type = content_type
+        self.size = 0
+        self.path: str | None = None
+        self._spool_bytes = spool_bytes
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._file: BinaryIO | None = None
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def source(self) -> bytes | str:
+        """
+        The content if it is held in memory, otherwise the path of the temporary file.
+        """
+        return bytes(self._buffer) if self.path is None else self.path
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._file is not None:
+            # Lands in the page cache, a chunk is written in microseconds
+            self._file.write(chunk)
+            return
+        self._buffer += chunk
+        if len(self._buffer) > self._spool_bytes:
+            self._file = tempfile.NamedTemporaryFile(prefix="avatar-", delete=False)
+            self.path = self._file.name
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+
+    def finish(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def open(self) -> BinaryIO:
+        """
+        Opens the content for reading.
+        """
+        return io.BytesIO(self._buffer) if self.path is None else open(self.path, "rb")
+
+    def read(self) -> bytes:
+        with self.open() as file:
+            return file.read()
+
+    def close(self) -> None:
+        """
+        Removes the temporary file.
+        """
+        self.finish()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class AvatarUploadParser:
+    """
+    Parses a multipart avatar upload straight from the request stream.
+
+    Only the `file` part is kept; it is hashed and spooled chunk by chunk as it
+    arrives, so memory per upload stays bounded by `AVATAR_SPOOL_BYTES` whatever
+    the file size. A request is rejected as early as possible:
+
+    * before reading the body, if `Content-Length` exceeds the size cap (413);
+    * after the part headers, if the declared content type is not allowed (415);
+    * after the first bytes, if they are not a supported image format (415);
+    * as soon as the received bytes cross `AVATAR_MAX_BYTES` (413).
+
+    Args:
+        config (AvatarConfig): The upload limits.
+        field (str, optional): The name of the form field with the file. Defaults to "file".
+    """
+
+    def __init__(self, config: AvatarConfig, field: str = "file"):
+        self.config = config
+        self.field = field
+
+    async def parse(self, request: Request) -> AvatarUpload:
+        """
+        Reads the avatar file from a multipart request.
+
+        Args:
+            request (Request): The HTTP request object.
+
+        Returns:
+            AvatarUpload: The uploaded file. The caller has to close it.
+
+        Raises:
+            HTTPException: 400 if the body is not valid multipart, 413 if it is too large,
+                415 if the file is not an allowed image and 422 if the file is missing.
+        """
+        max_body = self.config.AVATAR_MAX_BYTES + MULTIPART_OVERHEAD
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_body:
+            raise self._too_large()
+        content_type, options = parse_options_header(request.headers.get("content-type"))
+        if content_type.lower() != b"multipart/form-data" or b"boundary" not in options:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Expected a multipart/form-data request",
+            )
+
+        state = _PartState()
+        parser = MultipartParser(
+            options[b"boundary"],
+            callbacks={
+                "on_part_begin": state.begin,
+                "on_header_field": state.header_field,
+                "on_header_value": state.header_value,
+                "on_header_end": state.header_end,
+                "on_headers_finished": partial(self._headers_finished, state),
+                "on_part_data": partial(self._part_data, state),
+                "on_part_end": partial(self._part_end, state),
+            },
+        )
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_body:
+                    raise self._too_large()
+                parser.write(chunk)
+            parser.finalize()
+        except MultipartParseError as err:
+            state.discard()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid multipart body: {err}")
+        except BaseException:
+            state.discard()
+            raise
+        if state.upload is None or not state.done:
+            state.discard()
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Missing file field: {self.field}",
+            )
+        state.upload.finish()
+        return state.upload
+
+    def _headers_finished(self, state: "_PartState") -> None:
+        _, options = parse_options_header(state.headers.get(b"content-disposition"))
+        if options.get(b"name", b"").decode("latin-1") != self.field or state.upload is not None:
+            state.skip = True
+            return
+        content_type = state.headers.get(b"content-type", b"").decode("latin-1")
+        if content_type not in self.config.AVATAR_ALLOWED_TYPES:
+            raise self._unsupported(content_type)
+        state.upload = AvatarUpload(content_type, self.config.AVATAR_SPOOL_BYTES)
+
+    def _part_data(self, state: "_PartState", data: bytes, start: int, end: int) -> None:
+        if state.skip:
+            return
+        pending = len(state.head) if state.head is not None else 0
+        if state.upload.size + pending + end - start > self.config.AVATAR_MAX_BYTES:
+            raise self._too_large()
+        if state.head is None:
+            state.upload.write(data[start:end])
+            return
+        state.head += data[start:end]
+        if len(state.head) >= MAGIC_BYTES:
+            self._check_magic(state)
+
+    def _part_end(self, state: "_PartState") -> None:
+        if state.skip:
+            return
+        if state.head is not None:
+            self._check_magic(state)
+        state.done = True
+
+    def _check_magic(self, state: "_PartState") -> None:
+        detected = sniff_image_type(state.head)
+        if detected not in self.config.AVATAR_ALLOWED_TYPES:
+            raise self._unsupported(detected or "unknown")
+        state.upload.content_type = detected
+        state.upload.write(bytes(state.head))
+        state.head = None
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Avatar is larger than {self.config.AVATAR_MAX_BYTES} bytes",
+        )
+
+    @staticmethod
+    def _unsupported(content_type: str) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported avatar type: {content_type}",
+        )
+
+
+class _PartState:
+    """
+    Multipart parser state of a single request.
+    """
+
+    def __init__(self):
+        self.headers: dict[bytes, bytes] = {}
+        self.skip = False
+        self.upload: AvatarUpload | None = None
+        self.head: bytearray | None = None
+        self.done = False
+        self._field = b""
+        self._value = b""
+
+    def begin(self) -> None:
+        self.headers = {}
+        self.skip = False
+        self.head = bytearray()
+
+    def header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def header_end(self) -> None:
+        self.headers[self._field.lower()] = self._value
+        self._field = b""
+        self._value = b""
+
+    def discard(self) -> None:
+        if self.upload is not None:
+            self.upload.close()
+
+
+class AvatarProcessor:
+    """
+    Shrinks uploaded avatars before they are stored.
+
+    Resizing and re-encoding run in a process pool, because they are CPU bound.
+    Uploads spooled to disk are passed to the workers by path.
+
+    Args:
+        config (AvatarConfig): The upload limits and output settings.
+    """
+
+    def __init__(self, config: AvatarConfig):
+        self.config = config
+        self._executor: ProcessPoolExecutor | None = None
+
+    async def process(self, upload: AvatarUpload, size: int | None = None) -> ProcessedAvatar:
+        """
+        Resizes and re-encodes an avatar in the worker pool.
+
+        Args:
+            upload (AvatarUpload): The uploaded image.
+            size (int, optional): The maximum width and height. Defaults to `AVATAR_SIZE`.
+
+        Returns:
+            ProcessedAvatar: The image to upload.
+
+        Raises:
+            HTTPException: 413 if the image has too many pixels and 422 if the data is not a readable image.
+        """
+        size = size or self.config.AVATAR_SIZE
+        return (await self.process_sizes(upload, [size]))[size]
+
+    async def process_sizes(self, upload: AvatarUpload, sizes: list[int]) -> dict[int, ProcessedAvatar]:
+        """
+        Resizes and re-encodes an avatar to several sizes in a single worker job.
+
+        Args:
+            upload (AvatarUpload): The uploaded image.
+            sizes (list[int]): The maximum widths and heights.
+
+        Returns:
+            dict[int, ProcessedAvatar]: The image to upload for each size.
+
+        Raises:
+            HTTPException: 413 if the image has more than `AVATAR_MAX_PIXELS` pixels and
+                422 if the data is not a readable image.
+        """
+        config = self.config
+        job = partial(
+            resize_image_sizes,
+            upload.source,
+            sizes,
+            config.AVATAR_FORMAT,
+            config.AVATAR_QUALITY,
+            config.AVATAR_MAX_PIXELS,
+        )
+        try:
+            if config.AVATAR_PROCESS_WORKERS:
+                contents = await asyncio.get_running_loop().run_in_executor(self._get_executor(), job)
+            else:
+                contents = await asyncio.to_thread(job)
+        except ImageTooLarge as err:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(err))
+        except ValueError as err:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(err))
+        content_type = f"image/{config.AVATAR_FORMAT.lower()}"
+        return {size: ProcessedAvatar(content, content_type) for size, content in zip(sizes, contents)}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.config.AVATAR_PROCESS_WORKERS)
+        return self._executor
+
+    def close(self) -> None:
+        """
+        Shuts the worker pool down.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+avatar_processor = AvatarProcessor(avatar_config)
+avatar_upload_parser = AvatarUploadParser(avatar_config)
+
+
+async def get_avatar_upload(request: Request) -> AsyncIterator[AvatarUpload]:
+    """
+    Dependency streaming the avatar file of the request, removed after the response.
+
+    Args:
+        request (Request): The HTTP request object.
+
+    Yields:
+        AvatarUpload: The uploaded file.
+    """
+    upload = await avatar_upload_parser.parse(request)
+    try:
+        yield upload
+    finally:
+        upload.close()
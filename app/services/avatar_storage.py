@@ -0,0 +1,129 @@
+import asyncio
+import io
+import mimetypes
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from app.conf.config import AvatarConfig, avatar_config
+from app.services.avatar import AvatarProcessor, AvatarUpload, avatar_processor
+from app.services.cloudinary import claudinary
+
+
+class AvatarStorage(ABC):
+    """
+    Stores processed avatars and returns the URL they are served from.
+
+    Avatars are addressed by the SHA-256 digest of the uploaded file, which must be
+    part of the returned URL, so that re-uploading the current avatar can be detected.
+
+    Args:
+        config (AvatarConfig): The avatar settings.
+        processor (AvatarProcessor): The processor resizing the uploads.
+    """
+
+    def __init__(self, config: AvatarConfig, processor: AvatarProcessor):
+        self.config = config
+        self.processor = processor
+
+    @abstractmethod
+    async def save(self, user_email: str, upload: AvatarUpload) -> str:
+        """
+        Processes and stores an uploaded avatar.
+
+        Args:
+            user_email (str): The email of the avatar owner.
+            upload (AvatarUpload): The uploaded image.
+
+        Returns:
+            str: The URL of the stored avatar.
+        """
+
+    def path(self, digest: str, filename: str) -> Path | None:
+        """
+        Returns the local file of a stored avatar, if this storage keeps avatars on disk.
+
+        Args:
+            digest (str): The SHA-256 hex digest of the uploaded file.
+            filename (str): The file name of one of the generated sizes, e.g. "250.webp".
+
+        Returns:
+            Path | None: The path of an existing file, or None.
+        """
+        return None
+
+
+class CloudinaryStorage(AvatarStorage):
+    """
+    Uploads avatars to Cloudinary under their digest in the user's folder.
+    """
+
+    async def save(self, user_email: str, upload: AvatarUpload) -> str:
+        avatar = await self.processor.process(upload)
+        return await claudinary.upload_avatar_to_cloudinary(
+            io.BytesIO(avatar.content), user_email, public_id=upload.digest
+        )
+
+
+class LocalFileStorage(AvatarStorage):
+    """
+    Keeps avatars on the local filesystem in every size of `AVATAR_LOCAL_SIZES`.
+
+    Files are stored as `<AVATAR_LOCAL_DIR>/<digest>/<size>.<ext>` and never change
+    once written, so identical uploads of any user share them and they can be served
+    with an immutable cache lifetime. Files are written to a temporary name and
+    renamed, so readers never see a partial file.
+    """
+
+    def __init__(self, config: AvatarConfig, processor: AvatarProcessor):
+        super().__init__(config, processor)
+        self.root = Path(config.AVATAR_LOCAL_DIR)
+
+    async def save(self, user_email: str, upload: AvatarUpload) -> str:
+        digest = upload.digest
+        sizes = sorted(set(self.config.AVATAR_LOCAL_SIZES) | {self.config.AVATAR_SIZE})
+        avatars = await self.processor.process_sizes(upload, sizes)
+        filenames = {}
+        for size, avatar in avatars.items():
+            extension = mimetypes.guess_extension(avatar.content_type) or ".bin"
+            filenames[size] = f"{size}{extension}"
+            await asyncio.to_thread(self._write, self.root / digest / filenames[size], avatar.content)
+        return f"{self.config.AVATAR_LOCAL_URL}/{digest}/{filenames[self.config.AVATAR_SIZE]}"
+
+    def path(self, digest: str, filename: str) -> Path | None:
+        path = self.root / digest / filename
+        return path if path.is_file() else None
+
+    @staticmethod
+    def _write(path: Path, content: bytes) -> None:
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(content)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+def build_avatar_storage(config: AvatarConfig, processor: AvatarProcessor) -> AvatarStorage:
+    """
+    Creates the storage backend selected by `AVATAR_STORAGE`.
+
+    Args:
+        config (AvatarConfig): The avatar settings.
+        processor (AvatarProcessor): The processor resizing the uploads.
+
+    Returns:
+        AvatarStorage: The storage backend.
+    """
+    if config.AVATAR_STORAGE == "local":
+        return LocalFileStorage(config, processor)
+    return CloudinaryStorage(config, processor)
+
+
+avatar_storage = build_avatar_storage(avatar_config, avatar_processor)
@@ -1,32 +1,63 @@
-from cloudinary import config
-from cloudinary.utils import cloudinary_url
-from cloudinary.uploader import upload
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, partial
+from typing import BinaryIO
+
 from fastapi import HTTPException, UploadFile
 from app.conf.config import cloudinary_config
+from app.services.lazy import LazyAttribute
+from app.services.metrics import cloudinary_uploads_in_flight
 
-class Cloudinary:
-    settings = config(
+
+@cache
+def configure_sdk():
+    """
+    Imports and configures the Cloudinary SDK, once, on the first upload instead of at startup.
+    """
+    from cloudinary import config
+
+    return config(
         cloud_name=cloudinary_config.CLOUDINARY_CLOUD_NAME,
         api_key=cloudinary_config.CLOUDINARY_API_KEY,
         api_secret=cloudinary_config.CLOUDINARY_API_SECRET,
         secure=True,
     )
+
+
+def build_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=cloudinary_config.CLOUDINARY_UPLOAD_CONCURRENCY,
+        thread_name_prefix="cloudinary-upload",
+    )
+
+
+class Cloudinary:
     public_folder = f"web13/"
+    # The Cloudinary SDK is synchronous, uploads run here instead of on the event loop
+    executor = LazyAttribute(build_executor)
+    upload_timeout = cloudinary_config.CLOUDINARY_UPLOAD_TIMEOUT
 
-    async def upload_avatar_to_cloudinary(self, file: UploadFile, user_email: str):
+    async def upload_avatar_to_cloudinary(
+        self, file: UploadFile | BinaryIO, user_email: str, public_id: str | None = None
+    ):
         """
         Uploads an avatar image to Cloudinary and returns the generated URL.
 
         This function takes an avatar image file, uploads it to Cloudinary under a user-specific folder,
         and returns a URL for the uploaded image with the desired dimensions.
 
-        The upload is performed asynchronously, and the `public_id` and `version` are retrieved from the 
+        The blocking SDK upload runs in the `executor` thread pool, which bounds the number of concurrent
+        uploads, so the event loop keeps serving other requests meanwhile. Each upload is aborted after
+        `upload_timeout` seconds. The `public_id` and `version` are retrieved from the 
         response to generate a URL for the uploaded image. The URL is resized to 250x250 pixels with "fit" 
         crop settings.
 
         Args:
-            file (UploadFile): The avatar image file to upload.
+            file (UploadFile | BinaryIO): The avatar image file to upload, or a file-like object
+                with already processed image data.
             user_email (str): The email of the user to organize files in a user-specific folder.
+            public_id (str, optional): The name of the image inside the user's folder. Passing the
+                content hash keeps the URL stable for identical images. Defaults to a random name.
 
         Returns:
             str: The URL of the uploaded avatar image.
@@ -42,12 +73,29 @@ class Cloudinary:
             ```
 
         """
-        print("2222222222222222222222222222222222222222")
+        configure_sdk()
+        from cloudinary.uploader import upload
+        from cloudinary.utils import cloudinary_url
+
         # Завантажуємо файл до Cloudinary
         try:
-            upload_result = upload(
-                file.file, folder=f"{self.public_folder}{user_email}", overwrite=True
-            )
+            loop = asyncio.get_running_loop()
+            options = {"public_id": public_id} if public_id else {}
+            cloudinary_uploads_in_flight.inc()
+            try:
+                upload_result = await loop.run_in_executor(
+                    self.executor,
+                    partial(
+                        upload,
+                        getattr(file, "file", file),
+                        folder=f"{self.public_folder}{user_email}",
+                        overwrite=True,
+                        timeout=self.upload_timeout,
+                        **options,
+                    ),
+                )
+            finally:
+                cloudinary_uploads_in_flight.dec()
 
              # Отримання `public_id`
             public_id = upload_result.get("public_id")
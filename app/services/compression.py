@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+
+from app.conf.config import CompressionConfig
+from app.services.metrics import cache_requests
+
+try:
+    import brotli
+except ImportError:  # brotli is optional (the "brotli" extra), responses are gzip-compressed without it
+    brotli = None
+
+# Media types worth compressing; images, archives and fonts are compressed already
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def available_encodings() -> tuple[str, ...]:
+    """
+    Returns the supported content codings, preferred first.
+    """
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str, encodings: tuple[str, ...]) -> str | None:
+    """
+    Picks the content coding for a response from the request's `Accept-Encoding` header.
+
+    Args:
+        accept_encoding (str): The header value, e.g. "gzip, deflate, br;q=0.9".
+        encodings (tuple[str, ...]): The codings the server supports, preferred first,
+            which breaks ties between equal quality values.
+
+    Returns:
+        str | None: The coding with the highest quality value, or None when the client
+        accepts none of them.
+    """
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip()] = quality
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in encodings:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressedCache:
+    """
+    Keeps recently compressed response bodies, keyed by the digest of the raw body and the coding.
+
+    Responses built from cached data repeat byte for byte until the cache entry
+    expires, so their compression is paid once per cache fill and later requests
+    only pay for hashing the body. Each worker process fills its own cache.
+
+    Args:
+        size (int): The number of compressed bodies kept, 0 to disable the cache.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._bodies: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+
+    def get(self, key: tuple[bytes, str]) -> bytes | None:
+        body = self._bodies.get(key)
+        cache_requests.labels("compressed", "hit" if body is not None else "miss").inc()
+        if body is not None:
+            self._bodies.move_to_end(key)
+        return body
+
+    def add(self, key: tuple[bytes, str], body: bytes) -> None:
+        self._bodies[key] = body
+        while len(self._bodies) > self.size:
+            self._bodies.popitem(last=False)
+
+
+class Compressor:
+    """
+    Compresses response bodies with gzip or brotli, reusing the cached result for a repeated body.
+
+    Args:
+        config (CompressionConfig): The levels and the cache size.
+    """
+
+    def __init__(self, config: CompressionConfig):
+        self.config = config
+        self.cache = CompressedCache(config.COMPRESSION_CACHE_SIZE)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if self.cache.size == 0:
+            return self._compress(body, encoding)
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = self._compress(body, encoding)
+            self.cache.add(key, compressed)
+        return compressed
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.config.COMPRESSION_BROTLI_QUALITY)
+        # A fixed mtime keeps the output, and any ETag computed from it, stable
+        return gzip.compress(body, compresslevel=self.config.COMPRESSION_GZIP_LEVEL, mtime=0)
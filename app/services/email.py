@@ -1,59 +1,226 @@
+import asyncio
+import functools
+import logging
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from aiosmtplib.errors import SMTPException, SMTPServerDisconnected
 from pydantic import EmailStr
 
-from app.services.auth import auth_service
-from app.conf.config import email_config
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=email_config.MAIL_USERNAME,
-    MAIL_PASSWORD=email_config.MAIL_PASSWORD,
-    MAIL_FROM=email_config.MAIL_FROM,
-    MAIL_PORT=email_config.MAIL_PORT,
-    MAIL_SERVER=email_config.MAIL_SERVER,
-    MAIL_FROM_NAME=email_config.MAIL_FROM_NAME,
-    MAIL_STARTTLS=email_config.MAIL_STARTTLS,  # Для 587 - True, для 465 - False
-    MAIL_SSL_TLS=email_config.MAIL_SSL_TLS,  # Для 587 - False, для 465 - True
-    USE_CREDENTIALS=email_config.USE_CREDENTIALS,
-    VALIDATE_CERTS=email_config.VALIDATE_CERTS,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+from app.conf.config import EmailConfig, email_config
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FOLDER = Path(__file__).parent / "templates"
+
+
+@functools.cache
+def otp_template():
+    """
+    Compiles the verification email template on first use; processes that never send mail skip jinja2.
+    """
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    # `auto_reload=False` skips the per-render check of the template file modification time
+    templates = Environment(
+        loader=FileSystemLoader(TEMPLATE_FOLDER),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=False,
+    )
+    return templates.get_template("otp.html")
+
+
+class MailSender:
+    """
+    A long-lived mail sender that delivers messages over a pool of SMTP connections.
+
+    Messages are put on a queue and picked up by `MAIL_POOL_SIZE` workers. Every worker
+    owns one authenticated SMTP connection, which is opened on first use, reused for
+    all following messages and closed after `MAIL_IDLE_TIMEOUT` seconds without work.
+    A worker takes up to `MAIL_BATCH_SIZE` queued messages at once and sends them over
+    its connection back to back, so a signup spike costs one TLS handshake and login per
+    connection instead of one per message.
+
+    Args:
+        config (EmailConfig): The SMTP server settings and pool limits.
+    """
+
+    def __init__(self, config: EmailConfig):
+        self.config = config
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def queue_size(self) -> int:
+        """
+        The number of messages waiting for a connection.
+        """
+        return self._queue.qsize() if self._queue else 0
+
+    async def send(self, message: EmailMessage) -> None:
+        """
+        Queues a message and waits until it has been delivered.
+
+        Args:
+            message (EmailMessage): The message to deliver.
+
+        Raises:
+            SMTPException: If the message could not be delivered.
+        """
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, future))
+        await future
+
+    async def close(self) -> None:
+        """
+        Stops the workers and closes their SMTP connections.
+
+        Messages that are still queued or in a batch being delivered fail with `SMTPException`.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(SMTPException("Mail sender closed"))
+        self._workers = []
+        self._queue = None
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._workers and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.config.MAIL_POOL_SIZE)
+        ]
+
+    def _connection(self) -> aiosmtplib.SMTP:
+        config = self.config
+        return aiosmtplib.SMTP(
+            hostname=config.MAIL_SERVER,
+            port=config.MAIL_PORT,
+            username=config.MAIL_USERNAME if config.USE_CREDENTIALS else None,
+            password=config.MAIL_PASSWORD if config.USE_CREDENTIALS else None,
+            use_tls=config.MAIL_SSL_TLS,
+            start_tls=config.MAIL_STARTTLS,
+            validate_certs=config.VALIDATE_CERTS,
+            timeout=config.MAIL_TIMEOUT,
+        )
+
+    async def _worker(self) -> None:
+        smtp = self._connection()
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), self.config.MAIL_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await self._disconnect(smtp)
+                    continue
+                batch = [item]
+                while len(batch) < self.config.MAIL_BATCH_SIZE and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                try:
+                    await self._deliver_batch(smtp, batch)
+                except asyncio.CancelledError:
+                    # Taken off the queue already, `close` only fails what is still queued
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(SMTPException("Mail sender closed"))
+                    raise
+        finally:
+            await self._disconnect(smtp)
+
+    async def _deliver_batch(self, smtp: aiosmtplib.SMTP, batch: list[tuple[EmailMessage, asyncio.Future]]) -> None:
+        for message, future in batch:
+            try:
+                await self._deliver(smtp, message)
+            except Exception as err:
+                if not future.done():
+                    future.set_exception(err)
+            else:
+                if not future.done():
+                    future.set_result(None)
+
+    async def _deliver(self, smtp: aiosmtplib.SMTP, message: EmailMessage) -> None:
+        if not smtp.is_connected:
+            await smtp.connect()
+        try:
+            await smtp.send_message(message)
+        except SMTPServerDisconnected:
+            # The server dropped the pooled connection, retry once on a fresh one
+            smtp.close()
+            await smtp.connect()
+            await smtp.send_message(message)
+
+    async def _disconnect(self, smtp: aiosmtplib.SMTP) -> None:
+        if not smtp.is_connected:
+            return
+        try:
+            await smtp.quit()
+        except SMTPException:
+            smtp.close()
+
+
+mail_sender = MailSender(email_config)
+
+
+async def compose_email(email: EmailStr, username: str, host: str) -> EmailMessage:
+    """
+    Builds the verification email for the specified email address.
+
+    This function generates an email verification token for the given email address and
+    renders the pre-compiled `otp.html` template with the `host`, `username` and token.
+
+    Args:
+        email (EmailStr): The email address to which the verification link will be sent.
+        username (str): The username associated with the email account.
+        host (str): The host URL that will be included in the email message to provide the link.
+
+    Returns:
+        EmailMessage: The HTML message ready for delivery.
+    """
+    # Imported here: the outbox worker sends mail without loading the auth stack at startup
+    from app.services.auth import auth_service
+
+    token_verification = await auth_service.create_email_token({"sub": email})
+    message = EmailMessage()
+    message["Subject"] = "Confirm your email "
+    message["From"] = formataddr((email_config.MAIL_FROM_NAME, email_config.MAIL_FROM))
+    message["To"] = email
+    message.set_content(
+        otp_template().render(host=host, username=username, token=token_verification),
+        subtype="html",
+    )
+    return message
+
 
 async def send_email(email: EmailStr, username: str, host: str):
     """
     Sends an email containing a token verification link to the specified email address.
 
-    This function generates an email verification token for the given email address,
-    creates an email message with a link to confirm the email, and sends it using FastMail.
-    
-    The email content is dynamically populated with the `host`, `username`, and the generated token. 
-    The email is sent as an HTML message using the `otp.html` template located in the `templates` folder.
+    The message is built by `compose_email` and delivered through the pooled `mail_sender`.
+    Delivery errors are reported and swallowed, use `mail_sender.send` directly when the
+    caller has to retry failed deliveries.
 
     Args:
         email (EmailStr): The email address to which the verification link will be sent.
         username (str): The username associated with the email account.
         host (str): The host URL that will be included in the email message to provide the link.
 
-    Raises:
-        ConnectionErrors: If there is an issue connecting to the mail server, a `ConnectionErrors` exception is raised.
-    
     Example:
         ```python
         await send_email("example@example.com", "john_doe", "https://example.com")
         ```
     """
     try:
-        token_verification = await auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="otp.html")
-    except ConnectionErrors as err:
-        print(repr(err))
+        message = await compose_email(email, username, host)
+        await mail_sender.send(message)
+    except SMTPException as err:
+        logger.error("Sending the verification email failed: %r", err)
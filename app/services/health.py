@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from app.conf.config import HealthConfig, health_config
+from app.database.db import DatabaseSessionManager, sessionmanager
+from app.database.redis import RedisSessionManager, redis_manager
+from app.services.loop_monitor import LoopMonitor, loop_monitor
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+DEGRADED = "degraded"
+UNAVAILABLE = "unavailable"
+STARTING = "starting"
+
+
+def overall_status(checks: dict[str, dict[str, Any]]) -> str:
+    statuses = {check["status"] for check in checks.values()}
+    if UNAVAILABLE in statuses:
+        return UNAVAILABLE
+    if DEGRADED in statuses:
+        return DEGRADED
+    return OK
+
+
+class HealthProber:
+    """
+    Checks the dependencies of the app in the background, so readiness probes only read the result.
+
+    Every `HEALTH_PROBE_INTERVAL` seconds the database and Redis are pinged, and
+    the pool usage and event loop lag are compared with their thresholds. An
+    unreachable database or Redis makes the app unavailable, a saturated pool or a
+    lagging loop degraded. A result older than three intervals means the prober is
+    stuck and counts as unavailable.
+
+    Args:
+        config (HealthConfig, optional): The interval and thresholds. Defaults to `health_config`.
+        database (DatabaseSessionManager, optional): Defaults to the app's session manager.
+        redis (RedisSessionManager, optional): Defaults to the app's Redis manager.
+        monitor (LoopMonitor, optional): The source of the event loop lag. Defaults to `loop_monitor`.
+    """
+
+    def __init__(
+        self,
+        config: HealthConfig = health_config,
+        database: DatabaseSessionManager = sessionmanager,
+        redis: RedisSessionManager = redis_manager,
+        monitor: LoopMonitor = loop_monitor,
+    ):
+        self.config = config
+        self.database = database
+        self.redis = redis
+        self.monitor = monitor
+        self.checks: dict[str, dict[str, Any]] = {}
+        self.checked_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="health-prober")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        interval = self.config.HEALTH_PROBE_INTERVAL
+        lag = 0.0
+        while True:
+            try:
+                await self.probe(lag)
+            except Exception:
+                logger.exception("Health probe failed")
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lag = max(time.perf_counter() - expected, 0.0)
+
+    async def probe(self, lag: float = 0.0) -> None:
+        """
+        Runs all checks and stores their results.
+
+        Args:
+            lag (float, optional): The event loop lag measured by the caller. The larger of it
+                and the lag of the loop monitor is checked.
+        """
+        database, redis = await asyncio.gather(
+            self._timed(self._ping_database()), self._timed(self._ping_redis())
+        )
+        self.checks = {
+            "database": database,
+            "redis": redis,
+            "pool": self._check_pool(),
+            "event_loop": self._check_lag(max(lag, self.monitor.lag)),
+        }
+        self.checked_at = time.time()
+
+    async def _timed(self, ping) -> dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(ping, self.config.HEALTH_PROBE_TIMEOUT)
+        except Exception as error:
+            return {"status": UNAVAILABLE, "error": repr(error)}
+        return {"status": OK, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    async def _ping_database(self) -> None:
+        async with self.database.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def _ping_redis(self) -> None:
+        async with self.redis.session() as redis:
+            await redis.ping()
+
+    def _check_pool(self) -> dict[str, Any]:
+        pool = self.database.engine.sync_engine.pool
+        max_overflow = self.database.max_overflow
+        # Only bounded queue pools can be saturated
+        if not isinstance(pool, QueuePool) or max_overflow < 0:
+            return {"status": OK}
+        capacity = pool.size() + max_overflow
+        checked_out = pool.checkedout()
+        saturated = capacity > 0 and checked_out / capacity >= self.config.HEALTH_POOL_SATURATION
+        return {"status": DEGRADED if saturated else OK, "checked_out": checked_out, "capacity": capacity}
+
+    def _check_lag(self, lag: float) -> dict[str, Any]:
+        return {"status": DEGRADED if lag >= self.config.HEALTH_LOOP_LAG else OK, "lag_ms": round(lag * 1000, 2)}
+
+    def readiness(self) -> dict[str, Any]:
+        """
+        Returns the result of the last probe.
+
+        Returns:
+            dict: The overall status ("ok", "degraded", "unavailable" or "starting"), the
+            age of the result in seconds and the result of every check.
+        """
+        if self.checked_at is None:
+            return {"status": STARTING, "checks": {}}
+        age = time.time() - self.checked_at
+        status = overall_status(self.checks)
+        if age > 3 * self.config.HEALTH_PROBE_INTERVAL:
+            status = UNAVAILABLE
+        return {"status": status, "age": round(age, 3), "checks": self.checks}
+
+
+health_prober = HealthProber()
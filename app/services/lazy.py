@@ -0,0 +1,31 @@
+from typing import Any, Callable
+
+
+class LazyAttribute:
+    """
+    A class attribute computed on first access, for clients that are costly to build or import.
+
+    The value replaces the descriptor on the class, later lookups are plain
+    attribute reads. Tests can patch the attribute like any other.
+
+    Args:
+        factory (Callable[[], Any]): Builds the value.
+
+    Example:
+        ```python
+        class Auth:
+            pwd_context = LazyAttribute(lambda: build_password_context(password_hash_config))
+        ```
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+        self.name: str | None = None
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        value = self.factory()
+        setattr(owner, self.name, value)
+        return value
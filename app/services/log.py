@@ -0,0 +1,165 @@
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+from app.conf.config import LoggingConfig, logging_config
+
+try:
+    import orjson
+except ImportError:  # orjson is optional (the "orjson" extra), the standard library encoder is used without it
+    orjson = None
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attributes of every LogRecord, anything else was passed with `extra=`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+
+def dumps(value: dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(value, default=str).decode()
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line.
+
+    The object has the time, level, logger, message and request id of the record,
+    its `extra=` fields and the formatted exception, if any.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return dumps(entry)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds the request id of the current request to records, and samples DEBUG records.
+
+    Args:
+        debug_sample_ratio (float, optional): The share of DEBUG records kept. Defaults to all.
+    """
+
+    def __init__(self, debug_sample_ratio: float = 1.0):
+        super().__init__()
+        self.debug_sample_ratio = debug_sample_ratio
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and random.random() >= self.debug_sample_ratio:
+            return False
+        record.request_id = request_id.get()
+        return True
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Hands records over to the listener thread, which does the formatting and I/O.
+
+    The message and the exception text are rendered here, in the logging thread,
+    so arguments do not have to stay valid or thread safe afterwards. When the
+    queue is full records are dropped instead of blocking the event loop.
+
+    Attributes:
+        dropped (int): The number of records dropped on a full queue.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Other handlers of the logger get the same record, so it is copied
+        # before the message and the exception are replaced by their text
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: QueueListener | None = None
+_handler: LogQueueHandler | None = None
+
+
+def configure_logging(config: LoggingConfig = logging_config, stream=None) -> LogQueueHandler:
+    """
+    Routes the records of all loggers through a queue to a stream handler on a background thread.
+
+    Handlers added to the root logger by others, such as pytest's, are kept.
+    Calling it again reconfigures logging.
+
+    Args:
+        config (LoggingConfig, optional): The levels, format and sampling. Defaults to `logging_config`.
+        stream (TextIO, optional): Where the records are written. Defaults to stdout.
+
+    Returns:
+        LogQueueHandler: The handler installed on the root logger.
+    """
+    global _listener, _handler
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if config.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    handler = LogQueueHandler(queue.Queue(config.LOG_QUEUE_SIZE))
+    handler.addFilter(ContextFilter(config.LOG_DEBUG_SAMPLE_RATIO))
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(config.LOG_LEVEL.upper())
+    for name, level in config.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _handler = handler
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return handler
+
+
+def shutdown_logging() -> None:
+    """
+    Removes the queue handler, writes out the queued records and stops the listener thread.
+    """
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
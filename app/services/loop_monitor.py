@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+
+from app.conf.config import LoopMonitorConfig, loop_monitor_config
+from app.services.metrics import event_loop_blocks, event_loop_lag
+from app.services.profiler import current_task
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LoopBlock:
+    """
+    A stall of the event loop caught by the watchdog.
+
+    Attributes:
+        task (str): The name and coroutine of the task running when the stall was caught.
+        stack (str): The stack of the event loop thread, innermost call last.
+        blocked_for (float): Seconds the loop had been unresponsive when the stack was taken.
+    """
+
+    task: str
+    stack: str
+    blocked_for: float
+
+
+def describe_task(task: asyncio.Task | None) -> str:
+    if task is None:
+        return "no task"
+    coro = task.get_coro()
+    return f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+
+class LoopMonitor:
+    """
+    Measures the lag of the event loop and reports code blocking it.
+
+    A task on the loop sleeps for `LOOP_MONITOR_INTERVAL` and records how late it
+    wakes up in the `event_loop_lag_seconds` histogram. A watchdog thread checks
+    that the task keeps waking up; once the loop has been unresponsive for
+    `LOOP_BLOCK_THRESHOLD` it takes the stack of the loop thread, which shows the
+    synchronous call holding the loop, logs it and counts it in
+    `event_loop_blocks_total`. Every stall is reported once.
+
+    Args:
+        config (LoopMonitorConfig, optional): The monitor settings. Defaults to `loop_monitor_config`.
+
+    Attributes:
+        lag (float): The last lag measured, in seconds.
+        max_lag (float): The largest lag measured, in seconds.
+        blocks (list[LoopBlock]): The most recent stalls, at most `KEEP_BLOCKS`.
+    """
+
+    KEEP_BLOCKS = 20
+
+    def __init__(self, config: LoopMonitorConfig = loop_monitor_config):
+        self.config = config
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.blocks: list[LoopBlock] = []
+        self._heartbeat = 0.0
+        self._reported_heartbeat: float | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+
+    async def start(self) -> None:
+        """
+        Starts measuring the running loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _measure(self) -> None:
+        interval = self.config.LOOP_MONITOR_INTERVAL
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            lag = max(now - expected, 0.0)
+            event_loop_lag.observe(lag)
+            self.lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self._heartbeat = now
+
+    def _watch(self) -> None:
+        interval = self.config.LOOP_MONITOR_INTERVAL
+        while not self._stop.wait(interval / 2):
+            heartbeat = self._heartbeat
+            blocked_for = time.perf_counter() - heartbeat - interval
+            if blocked_for < self.config.LOOP_BLOCK_THRESHOLD or heartbeat == self._reported_heartbeat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._reported_heartbeat = heartbeat
+            self.report(
+                LoopBlock(
+                    task=describe_task(current_task(self._loop)),
+                    stack="".join(traceback.format_stack(frame)),
+                    blocked_for=blocked_for,
+                )
+            )
+
+    def report(self, block: LoopBlock) -> None:
+        event_loop_blocks.inc()
+        self.blocks.append(block)
+        del self.blocks[: -self.KEEP_BLOCKS]
+        logger.warning(
+            "Event loop blocked for %.0f ms by %s:\n%s", block.blocked_for * 1000, block.task, block.stack
+        )
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,335 @@
+import logging
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Callable, Iterable
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from app.database.statements import ExecutedStatement
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Database queries and Redis commands are expected to be an order of magnitude faster
+BACKEND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LOOP_LAG_BUCKETS = BACKEND_BUCKETS + (2.5, 5.0)
+QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeChild(CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus the +Inf bucket, made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric(ABC):
+    """
+    A named metric with an optional set of labels.
+
+    Every distinct combination of label values gets its own child, created on first
+    use and cached, so recording a sample is a dict lookup and an addition. Metrics
+    are updated from the event loop thread only and are not locked.
+
+    Args:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (Iterable[str], optional): The label names. Defaults to none.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """
+        Returns the child of the given label values, in `labelnames` order.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def clear(self) -> None:
+        self._children.clear()
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        Creates the value holder of one combination of label values.
+        """
+
+    def _label_string(self, values: tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{self._label_string(values)} {format_value(child.value)}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    """
+    A histogram of observed values over fixed buckets.
+
+    Args:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (Iterable[str], optional): The label names. Defaults to none.
+        buckets (tuple[float, ...], optional): The sorted upper bounds. Defaults to `HTTP_BUCKETS`.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = HTTP_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                total += count
+                labels = self._label_string(values, f'le="{format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {total}"
+            yield f"{self.name}_sum{self._label_string(values)} {format_value(child.sum)}"
+            yield f"{self.name}_count{self._label_string(values)} {total}"
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, rendered in the Prometheus text format.
+
+    The registry is not shared between worker processes, every worker reports only
+    the requests it served itself.
+
+    Values that are cheap to read but not worth tracking on every change, such as
+    pool sizes, are refreshed by collect callbacks right before rendering.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._callbacks: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = HTTP_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def on_collect(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a callback run before every render.
+        """
+        self._callbacks.append(callback)
+
+    def render(self) -> str:
+        """
+        Runs the collect callbacks and renders all metrics.
+
+        Returns:
+            str: The exposition in the Prometheus text format 0.0.4.
+        """
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Metrics collect callback failed")
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+http_requests_in_progress = registry.gauge("http_requests_in_progress", "HTTP requests being served.")
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Database statement execution time.", ("operation",), BACKEND_BUCKETS
+)
+db_pool_connections = registry.gauge(
+    "db_pool_connections", "Database pool connections by state.", ("state",)
+)
+redis_command_duration = registry.histogram(
+    "redis_command_duration_seconds", "Redis command round trip time.", ("command",), BACKEND_BUCKETS
+)
+redis_command_errors = registry.counter(
+    "redis_command_errors_total", "Redis commands that raised an error.", ("command",)
+)
+cache_requests = registry.counter(
+    "cache_requests_total", "Cache lookups by key namespace and result.", ("namespace", "result")
+)
+rate_limit_rejections = registry.counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter.", ("route",)
+)
+queue_depth = registry.gauge("queue_depth", "Items waiting in background queues.", ("queue",))
+cloudinary_uploads_in_flight = registry.gauge(
+    "cloudinary_uploads_in_flight", "Cloudinary uploads running or waiting for a thread."
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Delay of event loop callbacks past their scheduled time.", (), LOOP_LAG_BUCKETS
+)
+event_loop_blocks = registry.counter(
+    "event_loop_blocks_total", "Times the event loop was blocked longer than the threshold."
+)
+
+
+def record_cache_lookup(key: str, hit: bool) -> None:
+    """
+    Counts a cache lookup under the namespace of its key, e.g. "contact" for "contact:pk=1".
+    """
+    cache_requests.labels(key.split(":", 1)[0], "hit" if hit else "miss").inc()
+
+
+class QueryMetrics:
+    """
+    Statement subscriber observing the duration of successful statements in `db_query_duration`.
+    """
+
+    def before(self, statement: "ExecutedStatement") -> None:
+        pass
+
+    def after(self, statement: "ExecutedStatement") -> None:
+        if statement.error is None:
+            operation = statement.statement[:6].upper()
+            db_query_duration.labels(operation if operation in QUERY_OPERATIONS else "OTHER").observe(
+                statement.duration
+            )
+
+
+def instrument_engine(engine: "AsyncEngine") -> None:
+    """
+    Times the statements of an engine and reports its pool usage on collection.
+
+    Args:
+        engine (AsyncEngine): The engine to instrument.
+    """
+    from app.database.statements import statement_hook
+
+    sync_engine = engine.sync_engine
+    statement_hook(engine).subscribe(QueryMetrics())
+
+    def collect_pool() -> None:
+        pool = sync_engine.pool
+        for state, method in (
+            ("checked_out", "checkedout"),
+            ("checked_in", "checkedin"),
+            ("overflow", "overflow"),
+            ("size", "size"),
+        ):
+            # Only queue pools track their usage
+            if hasattr(pool, method):
+                db_pool_connections.labels(state).set(getattr(pool, method)())
+
+    registry.on_collect(collect_pool)
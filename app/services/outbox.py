@@ -0,0 +1,294 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.conf.config import OutboxConfig, outbox_config
+from app.services.email import compose_email, mail_sender
+from app.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Moves due retries back to the stream. Removing an entry from the retry set and
+# re-adding it happen atomically, and only for entries this call removed, so a
+# crash cannot lose an entry and two workers cannot both re-add it.
+RELEASE_RETRIES_SCRIPT = """
+local released = 0
+for i = 2, #ARGV do
+    if redis.call('ZREM', KEYS[1], ARGV[i]) == 1 then
+        local args = {'XADD', KEYS[2], 'MAXLEN', '~', ARGV[1], '*'}
+        for field, value in pairs(cjson.decode(ARGV[i])) do
+            table.insert(args, field)
+            table.insert(args, tostring(value))
+        end
+        redis.call(unpack(args))
+        released = released + 1
+    end
+end
+return released
+"""
+
+
+async def deliver_verification_email(fields: dict[str, str]) -> None:
+    """
+    Delivers a verification email described by outbox entry fields.
+
+    Args:
+        fields (dict[str, str]): The entry fields with `email`, `username` and `host`.
+
+    Raises:
+        Exception: Any delivery error, so that the entry is retried.
+    """
+    message = await compose_email(fields["email"], fields["username"], fields["host"])
+    await mail_sender.send(message)
+
+
+class EmailOutbox:
+    """
+    A durable queue of verification emails backed by a Redis stream.
+
+    Routes only append an entry to the stream, which is O(1) and survives API
+    restarts. Delivery happens in a separate process, see `OutboxWorker`.
+
+    Args:
+        config (OutboxConfig): The stream names and limits.
+    """
+
+    def __init__(self, config: OutboxConfig):
+        self.config = config
+
+    async def enqueue(self, redis: Redis, email: str, username: str, host: str) -> str:
+        """
+        Appends a verification email to the outbox stream.
+
+        Args:
+            redis (Redis): The Redis client.
+            email (str): The recipient email address.
+            username (str): The username used in the message.
+            host (str): The host URL used for the verification link.
+
+        Returns:
+            str: The stream entry id.
+        """
+        fields = {"email": email, "username": username, "host": host, "attempts": 0}
+        traceparent = tracer.inject()
+        if traceparent is not None:
+            # The worker continues the trace of the request that queued the email
+            fields["traceparent"] = traceparent
+        return await redis.xadd(
+            self.config.OUTBOX_STREAM,
+            fields,
+            maxlen=self.config.OUTBOX_MAXLEN,
+            approximate=True,
+        )
+
+    async def depth(self, redis: Redis) -> dict[str, int]:
+        """
+        Returns the number of entries in the outbox stream, retry set and dead-letter stream.
+
+        Args:
+            redis (Redis): The Redis client.
+
+        Returns:
+            dict[str, int]: The sizes keyed by "stream", "retry" and "dead".
+        """
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.xlen(self.config.OUTBOX_STREAM)
+            pipe.zcard(self.config.OUTBOX_RETRY_KEY)
+            pipe.xlen(self.config.OUTBOX_DEAD_LETTER_STREAM)
+            stream, retry, dead = await pipe.execute()
+        return {"stream": int(stream), "retry": int(retry), "dead": int(dead)}
+
+
+class OutboxMetrics:
+    """
+    Delivery counters of an outbox worker.
+
+    Attributes:
+        delivered (int): Messages delivered successfully.
+        retried (int): Failed deliveries scheduled for a retry.
+        dead (int): Messages moved to the dead-letter stream.
+        started_at (float): Monotonic start time of the worker.
+    """
+
+    def __init__(self):
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.started_at = time.monotonic()
+
+    def snapshot(self) -> dict[str, float]:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dead": self.dead,
+            "throughput_per_second": round(self.delivered / elapsed, 2),
+        }
+
+
+class OutboxWorker:
+    """
+    Consumes the email outbox in batches and delivers the messages.
+
+    The worker reads new entries through a consumer group, so several worker
+    processes share the load and every entry is delivered by one of them. An
+    entry is acknowledged once it was delivered, rescheduled or dead-lettered;
+    entries left unacknowledged by a crashed worker are claimed after
+    `OUTBOX_CLAIM_IDLE_MS`.
+
+    Failed deliveries are kept in a sorted set scored by their next attempt
+    time, with exponential backoff and jitter, and are moved back to the stream
+    when due. After `OUTBOX_MAX_ATTEMPTS` failures the entry is moved to the
+    dead-letter stream together with the last error.
+
+    Args:
+        redis (Redis): The Redis client.
+        config (OutboxConfig): The stream names and limits.
+        deliver (Callable): Coroutine function delivering the entry fields.
+        consumer (str, optional): The consumer name. Defaults to host name and pid.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        config: OutboxConfig = outbox_config,
+        deliver: Callable[[dict[str, str]], Awaitable[None]] = deliver_verification_email,
+        consumer: str | None = None,
+    ):
+        self.redis = redis
+        self.config = config
+        self.deliver = deliver
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.metrics = OutboxMetrics()
+        self._stopping = False
+
+    async def run(self) -> None:
+        """
+        Processes the outbox until `stop` is called.
+        """
+        await self.ensure_group()
+        reported_at = time.monotonic()
+        while not self._stopping:
+            await self.release_due_retries()
+            entries = await self.claim_stale()
+            if not entries:
+                entries = await self.read_new()
+            if entries:
+                await self.process(entries)
+            if time.monotonic() - reported_at >= self.config.OUTBOX_METRICS_INTERVAL:
+                reported_at = time.monotonic()
+                logger.info("outbox metrics %s", json.dumps(self.metrics.snapshot()))
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    async def ensure_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(
+                self.config.OUTBOX_STREAM, self.config.OUTBOX_GROUP, id="0", mkstream=True
+            )
+        except ResponseError as err:
+            if "BUSYGROUP" not in str(err):
+                raise
+
+    async def read_new(self) -> list[tuple[str, dict]]:
+        response = await self.redis.xreadgroup(
+            self.config.OUTBOX_GROUP,
+            self.consumer,
+            {self.config.OUTBOX_STREAM: ">"},
+            count=self.config.OUTBOX_BATCH_SIZE,
+            block=self.config.OUTBOX_BLOCK_MS,
+        )
+        return [entry for _, entries in response or [] for entry in entries]
+
+    async def claim_stale(self) -> list[tuple[str, dict]]:
+        response = await self.redis.xautoclaim(
+            self.config.OUTBOX_STREAM,
+            self.config.OUTBOX_GROUP,
+            self.consumer,
+            min_idle_time=self.config.OUTBOX_CLAIM_IDLE_MS,
+            count=self.config.OUTBOX_BATCH_SIZE,
+        )
+        return [entry for entry in response[1] if entry[1]]
+
+    async def release_due_retries(self) -> None:
+        """
+        Moves retries whose backoff has elapsed back to the stream.
+        """
+        due = await self.redis.zrangebyscore(
+            self.config.OUTBOX_RETRY_KEY, 0, time.time(), start=0, num=self.config.OUTBOX_BATCH_SIZE
+        )
+        if due:
+            await self.redis.eval(
+                RELEASE_RETRIES_SCRIPT,
+                2,
+                self.config.OUTBOX_RETRY_KEY,
+                self.config.OUTBOX_STREAM,
+                self.config.OUTBOX_MAXLEN,
+                *due,
+            )
+
+    async def process(self, entries: list[tuple[str, dict]]) -> None:
+        """
+        Delivers a batch of entries concurrently and records their outcome.
+
+        Args:
+            entries (list[tuple[str, dict]]): Stream entry ids and fields.
+        """
+        decoded = [(entry_id, self._decode(fields)) for entry_id, fields in entries]
+        results = await asyncio.gather(
+            *(self._deliver_traced(fields) for _, fields in decoded), return_exceptions=True
+        )
+        for (entry_id, fields), result in zip(decoded, results):
+            if isinstance(result, Exception):
+                await self._failed(fields, result)
+            else:
+                self.metrics.delivered += 1
+        await self.redis.xack(
+            self.config.OUTBOX_STREAM, self.config.OUTBOX_GROUP, *(entry_id for entry_id, _ in entries)
+        )
+
+    async def _deliver_traced(self, fields: dict[str, str]) -> None:
+        attributes = {"outbox.attempts": fields.get("attempts")}
+        with tracer.start_trace("outbox.deliver", fields.get("traceparent"), **attributes):
+            await self.deliver(fields)
+
+    async def _failed(self, fields: dict[str, str], error: Exception) -> None:
+        attempts = int(fields.get("attempts", 0)) + 1
+        fields = {**fields, "attempts": attempts}
+        if attempts >= self.config.OUTBOX_MAX_ATTEMPTS:
+            self.metrics.dead += 1
+            logger.warning("outbox entry for %s dead-lettered: %r", fields.get("email"), error)
+            await self.redis.xadd(
+                self.config.OUTBOX_DEAD_LETTER_STREAM,
+                {**fields, "error": repr(error)},
+                maxlen=self.config.OUTBOX_MAXLEN,
+                approximate=True,
+            )
+            return
+        self.metrics.retried += 1
+        delay = min(self.config.OUTBOX_BACKOFF_BASE ** attempts, self.config.OUTBOX_BACKOFF_MAX)
+        delay *= random.uniform(0.5, 1.0)
+        await self.redis.zadd(
+            self.config.OUTBOX_RETRY_KEY, {json.dumps(fields): time.time() + delay}
+        )
+
+    @staticmethod
+    def _decode(fields: dict) -> dict[str, str]:
+        return {
+            (key.decode() if isinstance(key, bytes) else key): (
+                value.decode() if isinstance(value, bytes) else value
+            )
+            for key, value in fields.items()
+        }
+
+
+email_outbox = EmailOutbox(outbox_config)
@@ -0,0 +1,294 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any
+
+from app.conf.config import BASE_DIR, ProfilingConfig, profiling_config
+
+# Children with a smaller share of the samples are left out of reports
+MIN_SHARE = 0.005
+ALLOCATION_LIMIT = 15
+
+
+def frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(str(BASE_DIR)):
+        filename = os.path.relpath(filename, BASE_DIR)
+    elif "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename}:{code.co_firstlineno})"
+
+
+class CallNode:
+    """
+    A function in the sampled call tree, with the number of samples it appeared in.
+    """
+
+    __slots__ = ("samples", "children")
+
+    def __init__(self):
+        self.samples = 0
+        self.children: dict[str, CallNode] = {}
+
+    def add(self, stack: list[str]) -> None:
+        node = self
+        node.samples += 1
+        for label in stack:
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = CallNode()
+            child.samples += 1
+            node = child
+
+    def to_dict(self, name: str, total: int) -> dict[str, Any]:
+        children = [
+            child.to_dict(label, total)
+            for label, child in sorted(self.children.items(), key=lambda item: -item[1].samples)
+            if child.samples >= total * MIN_SHARE
+        ]
+        return {"name": name, "samples": self.samples, "children": children}
+
+
+def current_task(loop: asyncio.AbstractEventLoop) -> asyncio.Task | None:
+    """
+    Returns the task running on `loop`, read from another thread.
+    """
+    tasks = getattr(asyncio.tasks, "_current_tasks", None)
+    return tasks.get(loop) if tasks is not None else None
+
+
+class SamplingProfiler:
+    """
+    A statistical profiler sampling thread stacks from a background thread.
+
+    Every `interval` seconds the stacks of the profiled threads are recorded in a
+    call tree. When profiling a single request, `task` restricts the samples to
+    the moments the request's task runs on the event loop, so concurrent requests
+    do not show up in its profile.
+
+    Args:
+        interval (float): Seconds between samples.
+        thread_ids (list[int], optional): The threads to sample. Defaults to all threads.
+        task (asyncio.Task, optional): Only sample while this task is running.
+    """
+
+    def __init__(self, interval: float, thread_ids: list[int] | None = None, task: asyncio.Task | None = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.task = task
+        self.loop = task.get_loop() if task is not None else None
+        self.root = CallNode()
+        self.skipped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self.task is not None and current_task(self.loop) is not self.task:
+                self.skipped += 1
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(f"thread {names.get(thread_id, thread_id)}")
+                stack.reverse()
+                self.root.add(stack)
+
+
+class AllocationTracker:
+    """
+    Summarizes the memory allocated between `start` and `stop` by source line.
+
+    Uses `tracemalloc`, which traces the whole process: allocations of concurrent
+    requests are included.
+    """
+
+    def __init__(self):
+        self._started_tracing = False
+        self._before: tracemalloc.Snapshot | None = None
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._before = tracemalloc.take_snapshot()
+
+    def stop(self) -> list[dict[str, Any]]:
+        after = tracemalloc.take_snapshot()
+        if self._started_tracing:
+            tracemalloc.stop()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = after.filter_traces(filters).compare_to(self._before.filter_traces(filters), "lineno")
+        return [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[:ALLOCATION_LIMIT]
+        ]
+
+
+@dataclass
+class ProfileReport:
+    """
+    The result of a profiling session.
+
+    Attributes:
+        id (str): The report id.
+        kind (str): "request" or "process".
+        started_at (float): Wall clock start time.
+        duration (float): Profiled seconds.
+        interval (float): Seconds between samples.
+        samples (int): The number of recorded samples.
+        call_tree (dict): The sampled call tree.
+        allocations (list[dict]): The largest allocation changes by source line.
+        details (dict): The request method, path and status, for request profiles.
+    """
+
+    id: str
+    kind: str
+    started_at: float
+    duration: float
+    interval: float
+    samples: int
+    call_tree: dict[str, Any]
+    allocations: list[dict[str, Any]] = field(default_factory=list)
+    details: dict[str, Any] = field(default_factory=dict)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2),
+            "samples": self.samples,
+            **self.details,
+        }
+
+    def render_text(self) -> str:
+        """
+        Renders the call tree as indented text with the share of samples per function.
+        """
+        lines = [f"{self.kind} profile {self.id}: {self.samples} samples over {self.duration * 1000:.1f} ms"]
+
+        def walk(node: dict[str, Any], depth: int) -> None:
+            for child in node["children"]:
+                share = child["samples"] / max(self.samples, 1) * 100
+                lines.append(f"{'  ' * depth}{share:5.1f}% {child['name']}")
+                walk(child, depth + 1)
+
+        walk(self.call_tree, 0)
+        if self.allocations:
+            lines.append("")
+            lines.append("allocations (size diff, count diff, location)")
+            for allocation in self.allocations:
+                lines.append(
+                    f"{allocation['size_diff']:>10} B {allocation['count_diff']:>7} {allocation['location']}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+class ProfileSession:
+    """
+    Profiles the code running between `start` and `stop`.
+
+    Args:
+        kind (str): "request" or "process".
+        config (ProfilingConfig): The sampling interval and allocation settings.
+        thread_ids (list[int], optional): The threads to sample. Defaults to all threads.
+        task (asyncio.Task, optional): Only sample while this task is running.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        config: ProfilingConfig,
+        thread_ids: list[int] | None = None,
+        task: asyncio.Task | None = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.config = config
+        self.profiler = SamplingProfiler(config.PROFILING_INTERVAL, thread_ids, task)
+        self.allocations = AllocationTracker() if config.PROFILING_TRACE_ALLOCATIONS else None
+        self._started_at = 0.0
+        self._started = 0.0
+
+    def start(self) -> None:
+        if self.allocations is not None:
+            self.allocations.start()
+        self._started_at = time.time()
+        self._started = time.perf_counter()
+        self.profiler.start()
+
+    def stop(self, **details) -> ProfileReport:
+        self.profiler.stop()
+        duration = time.perf_counter() - self._started
+        allocations = self.allocations.stop() if self.allocations is not None else []
+        samples = self.profiler.root.samples
+        return ProfileReport(
+            id=self.id,
+            kind=self.kind,
+            started_at=self._started_at,
+            duration=duration,
+            interval=self.config.PROFILING_INTERVAL,
+            samples=samples,
+            call_tree=self.profiler.root.to_dict("root", samples),
+            allocations=allocations,
+            details=details,
+        )
+
+
+class ProfileStore:
+    """
+    Keeps the most recent profile reports in memory.
+
+    Each worker process has its own store, a report is only listed by the worker
+    that recorded it.
+
+    Args:
+        size (int): The number of reports kept.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._reports: OrderedDict[str, ProfileReport] = OrderedDict()
+
+    def add(self, report: ProfileReport) -> None:
+        self._reports[report.id] = report
+        while len(self._reports) > self.size:
+            self._reports.popitem(last=False)
+
+    def get(self, report_id: str) -> ProfileReport | None:
+        return self._reports.get(report_id)
+
+    def list(self) -> list[ProfileReport]:
+        return list(reversed(self._reports.values()))
+
+
+profile_store = ProfileStore(profiling_config.PROFILING_KEEP)
+# One profile at a time: samples and tracemalloc cover the whole process
+profiling_lock = asyncio.Lock()
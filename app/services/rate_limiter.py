@@ -0,0 +1,373 @@
+import asyncio
+import logging
+import os
+import time
+from math import ceil
+from typing import NamedTuple
+
+import redis as pyredis
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi_limiter import FastAPILimiter
+from pydantic import TypeAdapter
+
+from app.conf.config import RateLimitConfig, RateLimitRule, rate_limit_config
+from app.models.models import User
+from app.services.auth import auth_service
+from app.services.metrics import rate_limit_rejections
+from app.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+POLICY_TABLE = TypeAdapter(dict[str, dict[str, RateLimitRule]])
+
+
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local elapsed = now % window
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local used = previous * (window - elapsed) / window + current
+if used + 1 > limit then
+    local retry = window - elapsed
+    if previous > 0 and current + 1 <= limit then
+        retry = math.ceil(window - (limit - 1 - current) * window / previous) - elapsed
+    end
+    return {0, math.max(0, math.floor(limit - used)), math.max(1, retry)}
+end
+if redis.call('INCR', KEYS[1]) == 1 then
+    redis.call('PEXPIRE', KEYS[1], window * 2)
+end
+return {1, math.max(0, math.floor(limit - used - 1)), window - elapsed}
+"""
+
+
+class LimitResult(NamedTuple):
+    """
+    Outcome of a rate limit check.
+
+    Attributes:
+        allowed (bool): Whether the request is admitted.
+        remaining (int): Requests left in the current window.
+        reset_ms (int): Milliseconds until the window resets, or until a retry
+            can succeed when the request is rejected.
+    """
+
+    allowed: bool
+    remaining: int
+    reset_ms: int
+
+
+class RateLimitPolicies:
+    """
+    The rate limit policy table, keyed by route name and role name.
+
+    The table comes from `RATE_LIMIT_POLICIES` and can be overridden by the JSON
+    file in `RATE_LIMIT_POLICY_FILE`. The file is checked for changes at most every
+    `RATE_LIMIT_RELOAD_INTERVAL` seconds, so limits can be changed without a restart.
+    A file that fails to parse or validate is logged and the previous table is kept.
+
+    Args:
+        config (RateLimitConfig): The rate limiting configuration.
+    """
+
+    def __init__(self, config: RateLimitConfig):
+        self.config = config
+        self._table = config.RATE_LIMIT_POLICIES
+        self._file_mtime: float | None = None
+        self._checked_at = 0.0
+
+    def rule(self, route: str, role: str) -> RateLimitRule:
+        """
+        Returns the rule for a route and role, falling back to the "default" entries.
+
+        Args:
+            route (str): The route name, e.g. "contacts:list".
+            role (str): The role name of the authenticated user.
+
+        Returns:
+            RateLimitRule: The number of requests allowed per window.
+        """
+        rules = self._table.get(route) or self._table["default"]
+        return rules.get(role) or rules.get("default") or self._table["default"]["default"]
+
+    async def maybe_reload(self) -> None:
+        """
+        Reloads the policy file if it changed since it was last read, in a worker thread.
+        """
+        path = self.config.RATE_LIMIT_POLICY_FILE
+        now = time.monotonic()
+        if path is None or now - self._checked_at < self.config.RATE_LIMIT_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        await asyncio.to_thread(self._refresh, path)
+
+    def _refresh(self, path: str) -> None:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+        if mtime == self._file_mtime:
+            return
+        # Recorded before reading, an invalid file is reported once rather than on every check
+        self._file_mtime = mtime
+        try:
+            self.reload(path)
+        except (OSError, ValueError) as error:
+            logger.error("Invalid rate limit policy file %s, keeping the current policies: %s", path, error)
+
+    def reload(self, path: str) -> None:
+        """
+        Replaces the policy table with the config table updated by the file contents.
+
+        The whole file is validated before the table is replaced.
+
+        Args:
+            path (str): Path to the JSON policy file.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file is not valid JSON or a rule is malformed.
+        """
+        with open(path, "rb") as file:
+            overrides = POLICY_TABLE.validate_json(file.read())
+        self._table = {**self.config.RATE_LIMIT_POLICIES, **overrides}
+
+
+class TokenBucket:
+    """
+    Local limiter state for a single rate key.
+
+    Attributes:
+        tokens (float): Tokens currently available in this process.
+        updated_at (float): Monotonic time of the last refill.
+        seconds (int): The window length of the rule the bucket enforces.
+        window (int): The Redis window the remote budget belongs to.
+        remote_budget (int): Requests still allowed cluster-wide at the last reconciliation.
+        pending (int): Requests admitted locally and not yet reported to Redis.
+        synced_at (float): Monotonic time of the last reconciliation.
+    """
+
+    __slots__ = ("tokens", "updated_at", "seconds", "window", "remote_budget", "pending", "synced_at")
+
+    def __init__(self, capacity: int, seconds: int, now: float, window: int):
+        self.tokens = float(capacity)
+        self.updated_at = now
+        self.seconds = seconds
+        self.window = window
+        self.remote_budget = capacity
+        self.pending = 0
+        self.synced_at = now
+
+
+class RateLimit:
+    """
+    Per-user rate limiting dependency driven by the policy table.
+
+    Requests are keyed on the authenticated user id and limited by the rule for
+    the route name and the user's role. Every admitted response carries
+    `X-RateLimit-Limit`, `X-RateLimit-Remaining` and `X-RateLimit-Reset` headers,
+    and rejected requests get a 429 error with a `Retry-After` header.
+
+    In exact mode every request runs a single sliding-window Lua script in Redis.
+    In approximate mode requests are admitted from an in-process token bucket, and
+    the locally admitted hits are pushed to a shared per-window counter in Redis
+    only every `sync_batch` requests or `sync_interval` seconds. Both are scaled
+    to the rule: the batch never exceeds `times`, and the interval is at least
+    `SYNC_WINDOW_SHARE` of the window, so low-rate limits such as 3 per 20 seconds
+    still save round trips. Each
+    reconciliation is a single pipelined round trip that also returns the
+    cluster-wide count, which caps the local budget for the rest of the window.
+    A worker can admit at most `sync_batch` requests that the other workers do
+    not know about yet, so across N workers a key may exceed its limit by
+    at most `(N - 1) * min(sync_batch, times)` requests per window.
+
+    Attributes:
+        route (str): The route name used to look up the policy.
+        redis_round_trips (int): Redis round trips made by this limiter.
+
+    Args:
+        route (str): The route name used to look up the policy.
+        mode (str, optional): "exact" or "approximate". Defaults to `RATE_LIMIT_MODE`.
+        sync_batch (int, optional): Local hits per reconciliation. Defaults to `RATE_LIMIT_SYNC_BATCH`.
+        sync_interval (float, optional): Maximum seconds between reconciliations.
+            Defaults to `RATE_LIMIT_SYNC_INTERVAL`.
+        policies (RateLimitPolicies, optional): The policy table. Defaults to `rate_limit_policies`.
+
+    Raises:
+        ValueError: If the mode is unknown, `sync_batch` is below 1 or `sync_interval` is negative.
+    """
+
+    sweep_every = 1000
+    SYNC_WINDOW_SHARE = 0.25
+    script_sha: str | None = None
+
+    def __init__(
+        self,
+        route: str,
+        mode: str | None = None,
+        sync_batch: int | None = None,
+        sync_interval: float | None = None,
+        policies: RateLimitPolicies | None = None,
+    ):
+        self.route = route
+        self.mode = rate_limit_config.RATE_LIMIT_MODE if mode is None else mode
+        self.sync_batch = rate_limit_config.RATE_LIMIT_SYNC_BATCH if sync_batch is None else sync_batch
+        self.sync_interval = rate_limit_config.RATE_LIMIT_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self.policies = rate_limit_policies if policies is None else policies
+        if self.mode not in ("exact", "approximate"):
+            raise ValueError(f"Unknown rate limit mode {self.mode!r}")
+        if self.sync_batch < 1:
+            raise ValueError("sync_batch must be at least 1")
+        if self.sync_interval < 0:
+            raise ValueError("sync_interval must not be negative")
+        self.redis_round_trips = 0
+        self._buckets: dict[str, TokenBucket] = {}
+        self._calls = 0
+
+    async def __call__(
+        self,
+        request: Request,
+        response: Response,
+        user: User = Depends(auth_service.authenticate_user),
+    ):
+        """
+        Checks the request against the user's limit for this route.
+
+        Args:
+            request (Request): The HTTP request object.
+            response (Response): The response the quota headers are added to.
+            user (User): The authenticated user the limit is keyed on.
+
+        Raises:
+            HTTPException: A 429 error if the limit is exceeded.
+        """
+        if not FastAPILimiter.redis:
+            raise Exception("You must call FastAPILimiter.init in startup event of fastapi!")
+        role = getattr(user.role, "value", user.role)
+        await self.policies.maybe_reload()
+        rule = self.policies.rule(self.route, role)
+        key = f"{FastAPILimiter.prefix}:{self.route}:{user.id}:{rule.times}/{rule.seconds}"
+        with tracer.span("rate_limit", **{"rate_limit.route": self.route}) as span:
+            if self.mode == "exact":
+                result = await self._sliding_window(key, rule)
+            else:
+                result = await self._hit(key, rule)
+            if span is not None:
+                span.set_attribute("rate_limit.allowed", result.allowed)
+
+        headers = {
+            "X-RateLimit-Limit": str(rule.times),
+            "X-RateLimit-Remaining": str(result.remaining),
+            "X-RateLimit-Reset": str(ceil(result.reset_ms / 1000)),
+        }
+        if not result.allowed:
+            rate_limit_rejections.labels(self.route).inc()
+            headers["Retry-After"] = headers["X-RateLimit-Reset"]
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too Many Requests",
+                headers=headers,
+            )
+        response.headers.update(headers)
+
+    async def _sliding_window(self, key: str, rule: RateLimitRule) -> LimitResult:
+        """
+        Runs the sliding-window script for `key` in Redis.
+        """
+        redis = FastAPILimiter.redis
+        window_ms = rule.seconds * 1000
+        now_ms = int(time.time() * 1000)
+        window = now_ms // window_ms
+        keys = (f"{key}:{window}", f"{key}:{window - 1}")
+        args = (rule.times, window_ms, now_ms)
+        if RateLimit.script_sha is None:
+            RateLimit.script_sha = await redis.script_load(SLIDING_WINDOW_SCRIPT)
+        try:
+            allowed, remaining, reset_ms = await redis.evalsha(RateLimit.script_sha, 2, *keys, *args)
+        except pyredis.exceptions.NoScriptError:
+            RateLimit.script_sha = await redis.script_load(SLIDING_WINDOW_SCRIPT)
+            allowed, remaining, reset_ms = await redis.evalsha(RateLimit.script_sha, 2, *keys, *args)
+        self.redis_round_trips += 1
+        return LimitResult(bool(allowed), int(remaining), int(reset_ms))
+
+    async def _hit(self, key: str, rule: RateLimitRule) -> LimitResult:
+        """
+        Registers a hit for `key` against the local token bucket.
+        """
+        times, seconds = rule.times, rule.seconds
+        now = time.monotonic()
+        wall = time.time()
+        window = int(wall // seconds)
+        window_ends_in = ceil(((window + 1) * seconds - wall) * 1000)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(times, seconds, now, window)
+        if bucket.window != window:
+            # Hits of an expired window no longer count anywhere
+            bucket.window = window
+            bucket.remote_budget = times
+            bucket.pending = 0
+            bucket.synced_at = now
+
+        rate = times / seconds
+        bucket.tokens = min(times, bucket.tokens + (now - bucket.updated_at) * rate)
+        bucket.updated_at = now
+
+        self._calls += 1
+        if self._calls % self.sweep_every == 0:
+            self._sweep(now)
+
+        sync_batch = min(self.sync_batch, times)
+        sync_interval = max(self.sync_interval, seconds * self.SYNC_WINDOW_SHARE)
+        if bucket.tokens < 1 or bucket.remote_budget - bucket.pending < 1:
+            if now - bucket.synced_at >= sync_interval:
+                # Other workers may have released budget by now, don't reject on stale data
+                await self._sync(key, bucket, rule)
+            if bucket.remote_budget - bucket.pending < 1:
+                return LimitResult(False, 0, window_ends_in)
+            if bucket.tokens < 1:
+                retry_ms = ceil((1 - bucket.tokens) / rate * 1000)
+                return LimitResult(False, 0, min(retry_ms, window_ends_in))
+
+        bucket.tokens -= 1
+        bucket.pending += 1
+        if bucket.pending >= sync_batch or now - bucket.synced_at >= sync_interval:
+            await self._sync(key, bucket, rule)
+        remaining = max(0, min(int(bucket.tokens), bucket.remote_budget - bucket.pending))
+        return LimitResult(True, remaining, window_ends_in)
+
+    async def _sync(self, key: str, bucket: TokenBucket, rule: RateLimitRule) -> None:
+        """
+        Pushes pending hits to the shared window counter and refreshes the remote budget.
+        """
+        redis_key = f"{key}:approx:{bucket.window}"
+        pending = bucket.pending
+        async with FastAPILimiter.redis.pipeline(transaction=False) as pipe:
+            pipe.incrby(redis_key, pending)
+            pipe.expire(redis_key, rule.seconds + 1)
+            total, _ = await pipe.execute()
+        self.redis_round_trips += 1
+        bucket.pending -= pending
+        bucket.remote_budget = rule.times - int(total)
+        bucket.synced_at = time.monotonic()
+
+    def _sweep(self, now: float) -> None:
+        """
+        Drops buckets idle for longer than their own window, which a new bucket would match.
+
+        Every bucket is measured against its rule's window, rules of other roles or a
+        reloaded rule can have a different one.
+        """
+        stale = [
+            key
+            for key, bucket in self._buckets.items()
+            if now - bucket.updated_at > bucket.seconds and bucket.pending == 0
+        ]
+        for key in stale:
+            del self._buckets[key]
+
+
+rate_limit_policies = RateLimitPolicies(rate_limit_config)
@@ -0,0 +1,131 @@
+import asyncio
+import functools
+import inspect
+from typing import Any, Callable
+
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.exceptions import ResponseValidationError
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import to_json, to_jsonable_python
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from app.services.server_timing import TimedRoute
+
+try:
+    import orjson
+except ImportError:  # orjson is optional (the "orjson" extra), pydantic-core's encoder is used without it
+    orjson = None
+
+# The sub-response FastAPI injects into `JSONRoute` endpoints, for the headers dependencies set
+SUB_RESPONSE_PARAMETER = "json_route_sub_response"
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encodes content to compact UTF-8 JSON, with orjson when installed and pydantic-core otherwise.
+
+    Types neither encoder knows natively, e.g. `Decimal`, are converted the way Pydantic does.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=to_jsonable_python, option=orjson.OPT_NON_STR_KEYS)
+    return to_json(content)
+
+
+class EncodedJSON(bytes):
+    """
+    A response body already encoded to JSON, rendered as is.
+    """
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    A JSON response encoded by `dumps` instead of the standard library encoder.
+
+    An `EncodedJSON` body, as produced by `JSONRoute`, is already encoded and is
+    sent unchanged.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, EncodedJSON):
+            return content
+        return dumps(content)
+
+
+class JSONRoute(TimedRoute):
+    """
+    A timed route whose response model is serialized to JSON bytes by pydantic-core
+    when the response class is a `FastJSONResponse`.
+
+    FastAPI dumps the response model to Python objects which the response class then
+    encodes; here the endpoint's return value is validated and dumped to JSON in one
+    pass by a `TypeAdapter` of the route's `response_model`, and returned as a ready
+    response, which FastAPI sends as is. The route's status code and
+    `response_model_*` options apply as they would otherwise.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        self.json_adapter: TypeAdapter | None = None
+        super().__init__(path, endpoint, **kwargs)
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        if self.response_model is not None and issubclass(response_class, FastJSONResponse):
+            self.json_adapter = TypeAdapter(self.response_model)
+
+    def prepare_endpoint(self, endpoint: Callable) -> Callable:
+        endpoint = super().prepare_endpoint(endpoint)
+        is_coroutine = asyncio.iscoroutinefunction(endpoint)
+
+        @functools.wraps(endpoint)
+        async def encoding_endpoint(*args, **kwargs):
+            sub_response = kwargs.pop(SUB_RESPONSE_PARAMETER)
+            if is_coroutine:
+                content = await endpoint(*args, **kwargs)
+            else:
+                content = await run_in_threadpool(endpoint, *args, **kwargs)
+            if self.json_adapter is None or isinstance(content, Response):
+                return content
+            # FastAPI only merges what dependencies set on the sub-response, e.g. the
+            # rate limit headers, into responses it builds itself
+            response = FastJSONResponse(
+                self.encode(content), status_code=sub_response.status_code or self.status_code or 200
+            )
+            response.headers.raw.extend(sub_response.headers.raw)
+            return response
+
+        signature = inspect.signature(endpoint)
+        parameters = list(signature.parameters.values())
+        position = next(
+            (index for index, parameter in enumerate(parameters) if parameter.kind is parameter.VAR_KEYWORD),
+            len(parameters),
+        )
+        parameters.insert(
+            position, inspect.Parameter(SUB_RESPONSE_PARAMETER, inspect.Parameter.KEYWORD_ONLY, annotation=Response)
+        )
+        encoding_endpoint.__signature__ = signature.replace(parameters=parameters)
+        return encoding_endpoint
+
+    def encode(self, content: Any) -> "EncodedJSON":
+        """
+        Validates content against the response model and dumps it to JSON bytes.
+
+        Raises:
+            ResponseValidationError: If the content does not match the response model.
+        """
+        try:
+            value = self.json_adapter.validate_python(content, from_attributes=True)
+        except ValidationError as err:
+            raise ResponseValidationError(err.errors(include_url=False), body=content) from err
+        return EncodedJSON(
+            self.json_adapter.dump_json(
+                value,
+                include=self.response_model_include,
+                exclude=self.response_model_exclude,
+                by_alias=self.response_model_by_alias,
+                exclude_unset=self.response_model_exclude_unset,
+                exclude_defaults=self.response_model_exclude_defaults,
+                exclude_none=self.response_model_exclude_none,
+            )
+        )
@@ -1,8 +1,12 @@
+import logging
+
 from fastapi import Request, Depends, HTTPException, status
 
 from app.models.models import Role, User
 from app.services.auth import auth_service
 
+logger = logging.getLogger(__name__)
+
 
 class RoleAccess:
     """
@@ -53,9 +57,8 @@ class RoleAccess:
             await role_access(request, user)
             ```
         """
-        print(f"Checking if user role {user.role} is allowed...")
         if user.role not in self.allowed_roles:
-            print(f"User {user.role} is not allowed")
+            logger.debug("Role %s is not allowed, allowed roles are %s", user.role, self.allowed_roles)
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="FORBIDDEN"
@@ -0,0 +1,194 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable
+
+from fastapi.routing import APIRoute
+
+from app.conf.config import metrics_config
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from app.database.statements import ExecutedStatement
+
+# Names and descriptions of the Server-Timing metrics, in header order
+METRICS = {
+    "auth": "Authentication",
+    "db": "Database",
+    "redis": "Redis",
+    "serialize": "Response serialization",
+    "app": "Route handler",
+}
+COUNTED = {"db": "queries", "redis": "commands"}
+
+
+class RequestTimings:
+    """
+    The time a request spent per resource, reported in the `Server-Timing` header.
+
+    Attributes:
+        durations (dict[str, float]): Seconds per metric name.
+        counts (dict[str, int]): Number of operations per metric name.
+        endpoint_done (float | None): `perf_counter` time the endpoint function returned.
+    """
+
+    __slots__ = ("durations", "counts", "endpoint_done")
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.endpoint_done: float | None = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def header_value(self, total: float) -> str:
+        """
+        Formats the timings, and the given total seconds, as a `Server-Timing` value.
+        """
+        entries = []
+        for name, description in METRICS.items():
+            if name not in self.durations:
+                continue
+            if name in COUNTED:
+                description = f"{description} ({self.counts[name]} {COUNTED[name]})"
+            entries.append(f'{name};dur={self.durations[name] * 1000:.2f};desc="{description}"')
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+request_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    """
+    Adds `seconds` to the metric `name` of the current request, if its timings are collected.
+    """
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def timed(name: str) -> Callable:
+    """
+    Decorates a coroutine function to add its run time to the metric `name`.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            timings = request_timings.get()
+            if timings is None:
+                return await func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                timings.add(name, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+class StatementTimer:
+    """
+    Statement subscriber adding the execution time of every statement to the "db" metric.
+    """
+
+    def before(self, statement: "ExecutedStatement") -> None:
+        pass
+
+    def after(self, statement: "ExecutedStatement") -> None:
+        record("db", statement.duration)
+
+
+def time_engine(engine: "AsyncEngine") -> None:
+    """
+    Adds the execution time of every statement of an engine to the "db" metric.
+
+    Args:
+        engine (AsyncEngine): The engine to instrument.
+    """
+    from app.database.statements import statement_hook
+
+    statement_hook(engine).subscribe(StatementTimer())
+
+
+def mark_endpoint_done() -> None:
+    timings = request_timings.get()
+    if timings is not None:
+        timings.endpoint_done = time.perf_counter()
+
+
+def wrap_endpoint(endpoint: Callable) -> Callable:
+    """
+    Wraps an endpoint function to note when it returns, keeping its signature.
+    """
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                mark_endpoint_done()
+
+    else:
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                mark_endpoint_done()
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """
+    A route recording its handler time as "app" and the time from the endpoint's
+    return to the finished response as "serialize".
+
+    The handler time covers dependency resolution, the endpoint and serialization.
+    With `SERVER_TIMING_ENABLED` off when the route is created, the endpoint and
+    the handler are used unwrapped, so the route costs nothing extra.
+
+    `endpoint` stays the undecorated function, so routes copied by
+    `include_router` wrap it once rather than wrapping the wrapper.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        self.timing_enabled = metrics_config.SERVER_TIMING_ENABLED
+        super().__init__(path, self.prepare_endpoint(endpoint), **kwargs)
+        self.endpoint = endpoint
+
+    def prepare_endpoint(self, endpoint: Callable) -> Callable:
+        """
+        Returns the function the route calls for `endpoint`, which subclasses may wrap further.
+        """
+        return wrap_endpoint(endpoint) if self.timing_enabled else endpoint
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if not self.timing_enabled:
+            return handler
+
+        async def timed_handler(request):
+            timings = request_timings.get()
+            if timings is None:
+                return await handler(request)
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                finished = time.perf_counter()
+                timings.add("app", finished - started)
+                if timings.endpoint_done is not None:
+                    timings.add("serialize", finished - timings.endpoint_done)
+
+        return timed_handler
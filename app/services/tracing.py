@@ -0,0 +1,446 @@
+import functools
+import importlib
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Callable, Iterator
+
+from app.conf.config import TracingConfig, tracing_config
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from app.database.statements import ExecutedStatement
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+EXPORT_BATCH_SIZE = 256
+STATEMENT_MAX_LENGTH = 500
+
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    Attributes:
+        name (str): The operation name, e.g. "GET /api/contacts/contact/".
+        trace_id (str): 32 hex digits shared by all spans of the trace.
+        span_id (str): 16 hex digits identifying this span.
+        parent_id (str | None): The span id of the parent, None for a root span.
+        start_time (float): Wall clock start time in seconds since the epoch.
+        duration (float | None): The duration in seconds, set when the span ends.
+        attributes (dict): Details of the operation.
+        error (str | None): The exception that ended the span, if any.
+    """
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "start_time", "duration", "attributes", "error", "_started"
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None = None, attributes: dict | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self.duration: float | None = None
+        self.attributes = attributes or {}
+        self.error: str | None = None
+        self._started = time.perf_counter()
+
+    @property
+    def traceparent(self) -> str:
+        """
+        The W3C `traceparent` header value continuing the trace from this span.
+        """
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = repr(error)
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str, bool] | None:
+    """
+    Parses a W3C `traceparent` header.
+
+    Args:
+        header (str | None): The header value.
+
+    Returns:
+        tuple[str, str, bool] | None: The trace id, parent span id and sampled flag,
+        or None if the header is missing or malformed.
+    """
+    if not header:
+        return None
+    match = TRACEPARENT_PATTERN.match(header.strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class SpanExporter(ABC):
+    """
+    Sends finished spans to a tracing backend.
+
+    Exporters run on the exporter thread, never on the event loop.
+    """
+
+    @abstractmethod
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        """
+        Exports a batch of finished spans.
+
+        Args:
+            spans (list[dict]): The spans, as returned by `Span.to_dict`.
+        """
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ConsoleExporter(SpanExporter):
+    """
+    Writes spans to standard error, one JSON object per line.
+    """
+
+    def __init__(self, config: TracingConfig):
+        self.stream = sys.stderr
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        self.stream.write("".join(json.dumps(span, default=str) + "\n" for span in spans))
+        self.stream.flush()
+
+
+class FileExporter(SpanExporter):
+    """
+    Appends spans to `TRACING_FILE`, one JSON object per line.
+    """
+
+    def __init__(self, config: TracingConfig):
+        self.path = config.TRACING_FILE
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("".join(json.dumps(span, default=str) + "\n" for span in spans))
+
+
+EXPORTERS: dict[str, type[SpanExporter]] = {"console": ConsoleExporter, "file": FileExporter}
+
+
+def build_exporter(config: TracingConfig) -> SpanExporter:
+    """
+    Creates the exporter named by `TRACING_EXPORTER`.
+
+    Args:
+        config (TracingConfig): The tracing configuration.
+
+    Returns:
+        SpanExporter: A built-in exporter, or the `module:Class` exporter given
+        by an import path, created with the config.
+    """
+    name = config.TRACING_EXPORTER
+    if name in EXPORTERS:
+        return EXPORTERS[name](config)
+    module_name, _, class_name = name.partition(":")
+    exporter_class = getattr(importlib.import_module(module_name), class_name)
+    return exporter_class(config)
+
+
+class BatchSpanProcessor:
+    """
+    Hands finished spans to the exporter on a background thread.
+
+    Ending a span only puts it on a bounded queue. When the exporter falls behind
+    and the queue is full, new spans are dropped and counted in `dropped`.
+
+    Args:
+        exporter (SpanExporter): The exporter.
+        max_queue_size (int): The queue capacity.
+        interval (float): Maximum seconds a span waits for its batch.
+    """
+
+    _stop = object()
+
+    def __init__(self, exporter: SpanExporter, max_queue_size: int, interval: float):
+        self.exporter = exporter
+        self.interval = interval
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(max_queue_size)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def shutdown(self) -> None:
+        """
+        Exports the queued spans and stops the thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(self._stop)
+            thread.join()
+        self.exporter.shutdown()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.interval)
+                while True:
+                    if item is self._stop:
+                        stopping = True
+                        break
+                    batch.append(item.to_dict())
+                    if len(batch) >= EXPORT_BATCH_SIZE:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception:
+                    logger.exception("Failed to export %d spans", len(batch))
+
+
+class Tracer:
+    """
+    Creates spans and propagates the current span through a context variable.
+
+    A trace starts at a root span, usually the HTTP request, and is sampled as a
+    whole: the sampled flag of an incoming `traceparent` is honoured, otherwise
+    `TRACING_SAMPLE_RATIO` of the traces are kept, decided on the trace id. Inside
+    a trace that is not sampled there is no current span and every `span` call
+    returns immediately, so unsampled requests pay a context variable lookup per
+    instrumented call.
+
+    Args:
+        config (TracingConfig): The tracing configuration.
+        exporter (SpanExporter, optional): The exporter. Defaults to the one
+            named by `TRACING_EXPORTER`, created on first use.
+    """
+
+    def __init__(self, config: TracingConfig, exporter: SpanExporter | None = None):
+        self.config = config
+        self.enabled = exporter is not None or config.TRACING_EXPORTER != "none"
+        self._exporter = exporter
+        self._processor: BatchSpanProcessor | None = None
+
+    @property
+    def processor(self) -> BatchSpanProcessor:
+        if self._processor is None:
+            exporter = self._exporter or build_exporter(self.config)
+            self._processor = BatchSpanProcessor(
+                exporter, self.config.TRACING_QUEUE_SIZE, self.config.TRACING_EXPORT_INTERVAL
+            )
+        return self._processor
+
+    def should_sample(self, trace_id: str) -> bool:
+        return int(trace_id[:16], 16) < self.config.TRACING_SAMPLE_RATIO * 2**64
+
+    @contextmanager
+    def start_trace(self, name: str, traceparent: str | None = None, **attributes) -> Iterator[Span | None]:
+        """
+        Starts a root span, continuing the trace of `traceparent` when given.
+
+        Args:
+            name (str): The span name.
+            traceparent (str, optional): The incoming W3C `traceparent` header.
+            **attributes: Span attributes.
+
+        Yields:
+            Span | None: The root span, or None when the trace is not sampled.
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = parse_traceparent(traceparent)
+        if parent is None:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = self.should_sample(trace_id)
+        else:
+            trace_id, parent_id, sampled = parent
+        if not sampled:
+            # Nested spans must not attach to a span of an enclosing trace
+            token = current_span.set(None)
+            try:
+                yield None
+            finally:
+                current_span.reset(token)
+            return
+        with self._activate(Span(name, trace_id, parent_id, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span | None]:
+        """
+        Starts a child of the current span and makes it current.
+
+        Args:
+            name (str): The span name.
+            **attributes: Span attributes.
+
+        Yields:
+            Span | None: The span, or None outside a sampled trace.
+        """
+        parent = current_span.get()
+        if parent is None:
+            yield None
+            return
+        with self._activate(Span(name, parent.trace_id, parent.span_id, attributes)) as span:
+            yield span
+
+    def start_child(self, name: str, **attributes) -> Span | None:
+        """
+        Starts a child of the current span without making it current.
+
+        For leaf operations observed through callbacks, such as SQL statements, which
+        end the span with `finish`.
+
+        Returns:
+            Span | None: The span, or None outside a sampled trace.
+        """
+        parent = current_span.get()
+        if parent is None:
+            return None
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+
+    def finish(self, span: Span, error: BaseException | None = None) -> None:
+        if error is not None:
+            span.record_error(error)
+        span.end()
+        self.processor.on_end(span)
+
+    def traced(self, name: str | None = None) -> Callable:
+        """
+        Decorates a coroutine function to run in a span.
+
+        Args:
+            name (str, optional): The span name. Defaults to the module path and
+                name of the function, without the "app." prefix.
+        """
+
+        def decorator(func: Callable) -> Callable:
+            span_name = name or f"{func.__module__.removeprefix('app.')}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with self.span(span_name):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def inject(self) -> str | None:
+        """
+        Returns the `traceparent` of the current span, for propagation to other processes.
+        """
+        span = current_span.get()
+        return span.traceparent if span is not None else None
+
+    def shutdown(self) -> None:
+        if self._processor is not None:
+            self._processor.shutdown()
+            self._processor = None
+
+    @contextmanager
+    def _activate(self, span: Span) -> Iterator[Span]:
+        token = current_span.set(span)
+        error = None
+        try:
+            yield span
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            current_span.reset(token)
+            self.finish(span, error)
+
+
+tracer = Tracer(tracing_config)
+
+
+class StatementSpans:
+    """
+    Statement subscriber recording a "db.query" span per statement.
+
+    Args:
+        tracer (Tracer): The tracer.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    def before(self, statement: "ExecutedStatement") -> None:
+        statement.state["span"] = self.tracer.start_child(
+            "db.query", **{"db.statement": statement.statement[:STATEMENT_MAX_LENGTH]}
+        )
+
+    def after(self, statement: "ExecutedStatement") -> None:
+        span = statement.state.get("span")
+        if span is None:
+            return
+        if statement.error is None:
+            span.set_attribute("db.rowcount", statement.rowcount)
+        self.tracer.finish(span, statement.error)
+
+
+def trace_engine(engine: "AsyncEngine", tracer: Tracer = tracer) -> None:
+    """
+    Records a span for every SQL statement executed by an engine.
+
+    Args:
+        engine (AsyncEngine): The engine to instrument.
+        tracer (Tracer, optional): The tracer. Defaults to the application tracer.
+    """
+    from app.database.statements import statement_hook
+
+    statement_hook(engine).subscribe(StatementSpans(tracer))
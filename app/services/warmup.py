@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+from datetime import date
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.conf.config import WarmupConfig, warmup_config
+from app.database.db import DatabaseSessionManager, sessionmanager
+from app.database.redis import RedisSessionManager, redis_manager
+from app.models.models import Contact, User
+from app.repository import contacts as repository_contacts
+from app.repository import users as repository_users
+from app.schemas.contact import ContactResponseSchema, ContactSchema
+from app.schemas.user import UserCreationSchema, UserResponseSchema
+from app.services.auth import auth_service
+
+logger = logging.getLogger(__name__)
+
+# Matches no row: hot statements are compiled and prepared without reading data
+PLACEHOLDER_USER_ID = -1
+PLACEHOLDER_EMAIL = "warmup@example.com"
+
+
+async def run_hot_statements(connection: AsyncConnection) -> None:
+    """
+    Runs the repository's most frequent queries on a connection, with parameters matching no row.
+
+    SQLAlchemy caches their compiled form per engine, asyncpg prepares them on the connection.
+    """
+    user = User(id=PLACEHOLDER_USER_ID, email=PLACEHOLDER_EMAIL)
+    async with AsyncSession(bind=connection) as db:
+        await repository_users.get_user_by_email(PLACEHOLDER_EMAIL, db)
+        await repository_contacts.get_contacts(user, 10, 0, db)
+        await repository_contacts.get_contact(user, 0, db)
+        await repository_contacts.search_by(user, db, "warmup", None, None)
+        await repository_contacts.get_upcoming_birthdays(user, db)
+
+
+async def warm_database(database: DatabaseSessionManager, connections: int) -> int:
+    """
+    Opens up to `connections` pooled connections at once and runs the hot statements on each.
+
+    Returns:
+        int: The number of connections opened, at most the pool size.
+    """
+    engine = database.engine
+    pool_size = getattr(engine.sync_engine.pool, "size", lambda: connections)()
+    # Overflow connections are closed when released, there is no point in opening them
+    connections = min(connections, pool_size)
+    async with AsyncExitStack() as stack:
+        opened = await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(connections)))
+        await asyncio.gather(*(run_hot_statements(connection) for connection in opened))
+    return connections
+
+
+async def warm_redis(redis: RedisSessionManager, connections: int) -> int:
+    """
+    Opens `connections` Redis connections by pinging concurrently, the pool keeps them.
+
+    Returns:
+        int: The number of pings sent.
+    """
+    async with redis.session() as client:
+        await asyncio.gather(*(client.ping() for _ in range(connections)))
+    return connections
+
+
+def warm_serializers() -> None:
+    """
+    Validates and serializes a sample through the request and response schemas of the hot routes.
+    """
+    body = {
+        "name": "Warm",
+        "surname": "Up",
+        "email": PLACEHOLDER_EMAIL,
+        "phone": "+380501234567",
+        "date_of_birth": "2000-01-01",
+    }
+    ContactSchema.model_validate(body)
+    contact = Contact(id=1, **{**body, "date_of_birth": date(2000, 1, 1)})
+    ContactResponseSchema.model_validate(contact).model_dump_json()
+    UserCreationSchema.model_validate({"username": "warmup", "email": PLACEHOLDER_EMAIL, "password": "warmup"})
+    UserResponseSchema.model_validate({"username": "warmup", "email": PLACEHOLDER_EMAIL}).model_dump_json()
+    # Builds the hashing context and loads its backends, deferred until first use otherwise
+    context = auth_service.pwd_context
+    context.handler().get_backend()
+
+
+async def warm_up(
+    config: WarmupConfig = warmup_config,
+    database: DatabaseSessionManager = sessionmanager,
+    redis: RedisSessionManager = redis_manager,
+) -> dict[str, float]:
+    """
+    Prepares a worker for traffic so the first requests do not pay for cold connections and caches.
+
+    Opens database and Redis connections, compiles and prepares the hot statements
+    and exercises the Pydantic schemas. Every step is bounded by `WARMUP_TIMEOUT`;
+    a failed step is logged and skipped, the app starts anyway.
+
+    Args:
+        config (WarmupConfig, optional): What to warm up. Defaults to `warmup_config`.
+        database (DatabaseSessionManager, optional): Defaults to the app's session manager.
+        redis (RedisSessionManager, optional): Defaults to the app's Redis manager.
+
+    Returns:
+        dict[str, float]: The seconds taken by every successful step.
+    """
+    steps = {
+        "serializers": asyncio.to_thread(warm_serializers),
+        "database": warm_database(database, config.WARMUP_DB_CONNECTIONS),
+        "redis": warm_redis(redis, config.WARMUP_REDIS_CONNECTIONS),
+    }
+    timings = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(step, config.WARMUP_TIMEOUT)
+        except Exception as error:
+            logger.warning("Warm-up of %s failed: %r", name, error)
+            continue
+        timings[name] = time.perf_counter() - started
+    logger.info("Warm-up finished", extra={"warmup_seconds": timings})
+    return timings
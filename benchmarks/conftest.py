@@ -0,0 +1,149 @@
+"""
+Fixtures of the repository micro-benchmarks.
+
+Run them explicitly, they are not part of the test suite:
+
+    ```
+    python -m pytest benchmarks -q
+    BENCH_SIZES=1000,100000,1000000 python -m pytest benchmarks -q
+    ```
+
+`BENCH_SIZES` selects the address book sizes (default 1000), `BENCH_ROUNDS` the
+timed rounds per benchmark (default 20) and `BENCH_DATA_DIR` where the seeded
+SQLite files are cached between runs (default `benchmarks/.data`).
+
+With pytest-benchmark installed the timings go through its `benchmark` fixture,
+so `--benchmark-compare` and friends work. Without it a summary table is printed
+at the end of the session.
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models.models import User
+from benchmarks import datagen
+
+SIZES = [int(size) for size in os.environ.get("BENCH_SIZES", "1000").split(",")]
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "20"))
+DATA_DIR = Path(os.environ.get("BENCH_DATA_DIR", Path(__file__).parent / ".data"))
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    pytest_benchmark = None
+
+RESULTS: list[tuple[str, list[float]]] = []
+
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        metafunc.parametrize("size", SIZES, ids=[f"{size}" for size in SIZES], scope="session")
+
+
+@pytest.fixture(scope="session")
+def runner():
+    """
+    One event loop for the session, shared by the engines and the benchmarked calls.
+    """
+    with asyncio.Runner() as runner:
+        yield runner
+
+
+class Dataset:
+    """
+    A seeded database of the given address book size.
+
+    Attributes:
+        size (int): The number of contacts of `user`.
+        session_maker (async_sessionmaker): Creates sessions on the database.
+        user (User): The owner of the large address book.
+    """
+
+    def __init__(self, size: int, session_maker: async_sessionmaker, user: User):
+        self.size = size
+        self.session_maker = session_maker
+        self.user = user
+
+
+@pytest.fixture(scope="session")
+def dataset(size, runner):
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    path = DATA_DIR / f"contacts-{size}.db"
+    if not path.exists():
+        datagen.seed_sqlite(str(path), size)
+    # Benchmarks write to the database, work on a copy so the cached file stays pristine
+    work_path = DATA_DIR / f"contacts-{size}.work.db"
+    work_path.write_bytes(path.read_bytes())
+    engine = create_async_engine(f"sqlite+aiosqlite:///{work_path}")
+    session_maker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def load_user():
+        async with session_maker() as session:
+            return await session.scalar(select(User).where(User.email == datagen.user_email(0)))
+
+    yield Dataset(size, session_maker, runner.run(load_user()))
+    runner.run(engine.dispose())
+    work_path.unlink()
+
+
+class AsyncBenchmark:
+    """
+    Times a coroutine function, in the manner of pytest-benchmark's `pedantic` mode.
+
+    Every round awaits `func(*args)` once on the session loop. When `setup` is given,
+    it is awaited before every round, untimed, and its result is used as the arguments.
+    """
+
+    def __init__(self, runner: asyncio.Runner, name: str, plugin_benchmark=None):
+        self.runner = runner
+        self.name = name
+        self.plugin_benchmark = plugin_benchmark
+
+    def __call__(self, func, *args, setup=None, rounds: int = ROUNDS):
+        def target(*call_args):
+            return self.runner.run(func(*call_args))
+
+        def make_args():
+            return (self.runner.run(setup()) if setup else args), {}
+
+        if self.plugin_benchmark is not None:
+            return self.plugin_benchmark.pedantic(target, setup=make_args, rounds=rounds, warmup_rounds=1)
+
+        timings = []
+        result = None
+        for _ in range(rounds + 1):
+            call_args, _ = make_args()
+            started = time.perf_counter()
+            result = target(*call_args)
+            timings.append(time.perf_counter() - started)
+        RESULTS.append((self.name, timings[1:]))
+        return result
+
+
+@pytest.fixture
+def async_benchmark(request, runner):
+    plugin_benchmark = request.getfixturevalue("benchmark") if pytest_benchmark else None
+    return AsyncBenchmark(runner, request.node.name, plugin_benchmark)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    width = max(len(name) for name, _ in RESULTS)
+    terminalreporter.write_sep("-", "benchmark (times in ms)")
+    terminalreporter.write_line(
+        f"{'name':<{width}} {'min':>9} {'median':>9} {'mean':>9} {'max':>9} {'ops/s':>9}"
+    )
+    for name, timings in RESULTS:
+        ms = [timing * 1000 for timing in timings]
+        terminalreporter.write_line(
+            f"{name:<{width}} {min(ms):>9.3f} {statistics.median(ms):>9.3f} "
+            f"{statistics.mean(ms):>9.3f} {max(ms):>9.3f} {1000 / statistics.mean(ms):>9.1f}"
+        )
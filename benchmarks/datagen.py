@@ -0,0 +1,198 @@
+"""
+Deterministic generators of realistic users and contacts for the benchmarks.
+
+The same seed always produces the same rows, so timings of different runs and
+machines are measured against identical data.
+"""
+
+import os
+import random
+from datetime import date, timedelta
+from typing import Iterator
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.models import Base, Contact, Role, User
+
+FIRST_NAMES = [
+    "Olena", "Andrii", "Iryna", "Taras", "Oksana", "Dmytro", "Natalia", "Serhii",
+    "Yulia", "Oleksandr", "Kateryna", "Mykola", "Sofia", "Bohdan", "Anna", "Ivan",
+    "Maria", "Petro", "Viktoria", "Yurii", "Emma", "Liam", "Noah", "Olivia",
+]
+LAST_NAMES = [
+    "Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Oliinyk",
+    "Shevchuk", "Polishchuk", "Lysenko", "Melnyk", "Moroz", "Marchenko", "Smith",
+    "Johnson", "Brown", "Taylor", "Wilson", "Davies", "Evans", "Walker",
+]
+NOTES = [None, "Friend from work", "University", "Neighbour", "Gym", "Family", "Conference"]
+PASSWORD = "Khfj98945bUGe"
+CONTACT_COLUMNS = ("name", "surname", "email", "phone", "date_of_birth", "additional_info", "user_id")
+BIRTHDAYS = (date(1960, 1, 1).toordinal(), date(2005, 12, 31).toordinal())
+
+
+def user_email(index: int) -> str:
+    return f"bench.user{index}@example.com"
+
+
+def make_user(index: int, password_hash: str) -> dict:
+    """
+    Builds the row of the `index`-th benchmark user, verified so it can log in.
+    """
+    return {
+        "id": index + 1,
+        "username": f"bench_user_{index}",
+        "email": user_email(index),
+        "password": password_hash,
+        "verified": True,
+        "role": Role.admin if index == 0 else Role.user,
+    }
+
+
+def make_contact(rng: random.Random, index: int, user_id: int, today: date | None = None) -> dict:
+    """
+    Builds a contact row.
+
+    About one contact in twenty has a birthday within the next week, so the
+    birthdays query returns a realistic share of the rows.
+
+    Args:
+        rng (random.Random): The seeded generator.
+        index (int): A number unique across all generated contacts, used in the email.
+        user_id (int): The owner of the contact.
+        today (date, optional): The reference day for upcoming birthdays.
+
+    Returns:
+        dict: The column values of the contact.
+    """
+    today = today or date.today()
+    name = rng.choice(FIRST_NAMES)
+    surname = rng.choice(LAST_NAMES)
+    if rng.random() < 0.05:
+        upcoming = today + timedelta(days=rng.randint(0, 6))
+        born = date(rng.randint(1960, 2005), upcoming.month, min(upcoming.day, 28))
+    else:
+        born = date(rng.randint(1960, 2005), rng.randint(1, 12), rng.randint(1, 28))
+    return {
+        "name": name,
+        "surname": surname,
+        "email": f"{name}.{surname}.{index}@example.com".lower(),
+        "phone": f"+38067{rng.randint(0, 9_999_999):07d}",
+        "date_of_birth": born,
+        "additional_info": rng.choice(NOTES),
+        "user_id": user_id,
+    }
+
+
+def make_contact_body(rng: random.Random, index: int) -> dict:
+    """
+    Builds a JSON body accepted by the create and update contact routes.
+    """
+    row = make_contact(rng, index, user_id=0)
+    row.pop("user_id")
+    row["date_of_birth"] = row["date_of_birth"].isoformat()
+    row["completed"] = False
+    return row
+
+
+async def seed(
+    session_maker: async_sessionmaker[AsyncSession],
+    users: int,
+    contacts_per_user: int,
+    password_hash: str,
+    seed: int = 42,
+    batch_size: int = 5000,
+) -> None:
+    """
+    Inserts the benchmark users and their contacts in bulk.
+
+    Args:
+        session_maker (async_sessionmaker): Creates the session used for the inserts.
+        users (int): The number of users.
+        contacts_per_user (int): The number of contacts of every user.
+        password_hash (str): The stored hash of `PASSWORD`, shared by all users.
+        seed (int, optional): The random seed. Defaults to 42.
+        batch_size (int, optional): Rows per insert statement. Defaults to 5000.
+    """
+    rng = random.Random(seed)
+    async with session_maker() as session:
+        await session.execute(insert(User), [make_user(i, password_hash) for i in range(users)])
+        batch = []
+        for index in range(users * contacts_per_user):
+            batch.append(make_contact(rng, index, index // contacts_per_user + 1))
+            if len(batch) >= batch_size:
+                await session.execute(insert(Contact), batch)
+                batch = []
+        if batch:
+            await session.execute(insert(Contact), batch)
+        await session.commit()
+
+
+def contact_rows(count: int, user_id: int, seed: int = 42, start: int = 0) -> Iterator[tuple]:
+    """
+    Generates contact rows quickly, as tuples in `CONTACT_COLUMNS` order.
+
+    Random values are drawn in bulk, so a million rows take a few seconds. Birthdays
+    are spread evenly over the year, about 2% of them fall within the next week.
+
+    Args:
+        count (int): The number of rows.
+        user_id (int): The owner of the contacts.
+        seed (int, optional): The random seed. Defaults to 42.
+        start (int, optional): The first index used in the unique emails. Defaults to 0.
+
+    Yields:
+        tuple: The column values of a contact.
+    """
+    rng = random.Random(seed)
+    names = rng.choices(FIRST_NAMES, k=count)
+    surnames = rng.choices(LAST_NAMES, k=count)
+    notes = rng.choices(NOTES, k=count)
+    low, high = BIRTHDAYS
+    for index in range(count):
+        name, surname = names[index], surnames[index]
+        yield (
+            name,
+            surname,
+            f"{name}.{surname}.{start + index}@example.com".lower(),
+            f"+38067{rng.randrange(10_000_000):07d}",
+            date.fromordinal(rng.randint(low, high)),
+            notes[index],
+            user_id,
+        )
+
+
+def seed_sqlite(path: str, contacts: int, others: int = 9, password_hash: str = "", seed: int = 42) -> None:
+    """
+    Creates a SQLite database with one large address book and a few small ones.
+
+    User 1 (`user_email(0)`) owns `contacts` contacts and each of the `others` users
+    owns a tenth of that, so the `user_id` filter has rows to skip. Rows are written
+    with plain `executemany` in a single transaction; the file appears only when the
+    seeding finished.
+
+    Args:
+        path (str): The database file to create.
+        contacts (int): The size of the large address book.
+        others (int, optional): The number of other users. Defaults to 9.
+        password_hash (str, optional): The stored password of all users.
+        seed (int, optional): The random seed. Defaults to 42.
+    """
+    partial_path = f"{path}.partial"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    engine = create_engine(f"sqlite:///{partial_path}")
+    Base.metadata.create_all(engine)
+    placeholders = ", ".join("?" * len(CONTACT_COLUMNS))
+    statement = f"INSERT INTO contacts ({', '.join(CONTACT_COLUMNS)}) VALUES ({placeholders})"
+    with engine.begin() as connection:
+        connection.execute(insert(User), [make_user(i, password_hash) for i in range(others + 1)])
+        start = 0
+        for user_index in range(others + 1):
+            count = contacts if user_index == 0 else max(1, contacts // 10)
+            rows = contact_rows(count, user_index + 1, seed + user_index, start)
+            while batch := [row for _, row in zip(range(50_000), rows)]:
+                connection.exec_driver_sql(statement, batch)
+            start += count
+    engine.dispose()
+    os.replace(partial_path, path)
@@ -0,0 +1,164 @@
+"""
+An in-memory stand-in for the Redis commands the API uses.
+
+It keeps the benchmarks free of external services while still exercising the
+caching, rate limiting and outbox code paths. The sliding-window Lua script of
+`app.services.rate_limiter` is emulated in Python and registered under the SHA
+`script_load` returns for it. Only what the application calls is implemented.
+"""
+
+import hashlib
+import math
+import time
+from collections import defaultdict
+from itertools import count
+
+from app.services.rate_limiter import SLIDING_WINDOW_SCRIPT
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        results = [await method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+class FakeRedis:
+    """
+    A single-process Redis replacement backed by dictionaries.
+
+    Attributes:
+        calls (int): Commands executed, pipelined commands included.
+    """
+
+    def __init__(self):
+        self._values: dict[str, bytes] = {}
+        self._expires: dict[str, float] = {}
+        self._streams: dict[str, list] = defaultdict(list)
+        self._stream_ids = count(1)
+        self._scripts: dict[str, callable] = {}
+        self.calls = 0
+
+    def _key(self, key) -> str:
+        self.calls += 1
+        key = key.decode() if isinstance(key, bytes) else str(key)
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+        return key
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    async def ping(self):
+        return True
+
+    async def get(self, key):
+        return self._values.get(self._key(key))
+
+    async def set(self, key, value, ex=None, px=None):
+        key = self._key(key)
+        self._values[key] = self._encode(value)
+        self._expires.pop(key, None)
+        if ex is not None or px is not None:
+            self._expires[key] = time.monotonic() + (ex if ex is not None else px / 1000)
+        return True
+
+    async def setex(self, key, seconds, value):
+        return await self.set(key, value, ex=seconds)
+
+    async def expire(self, key, seconds):
+        key = self._key(key)
+        if key not in self._values:
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        return True
+
+    async def pexpire(self, key, milliseconds):
+        return await self.expire(key, milliseconds / 1000)
+
+    async def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            key = self._key(key)
+            deleted += self._values.pop(key, None) is not None
+            self._expires.pop(key, None)
+        return deleted
+
+    async def incrby(self, key, amount=1):
+        key = self._key(key)
+        value = int(self._values.get(key, b"0")) + amount
+        self._values[key] = self._encode(value)
+        return value
+
+    async def incr(self, key):
+        return await self.incrby(key, 1)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def script_load(self, script: str) -> str:
+        self.calls += 1
+        sha = hashlib.sha1(script.encode()).hexdigest()
+        if script == SLIDING_WINDOW_SCRIPT:
+            self._scripts[sha] = self._sliding_window
+        return sha
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args):
+        self.calls += 1
+        return await self._scripts[sha](keys_and_args[:numkeys], keys_and_args[numkeys:])
+
+    async def _sliding_window(self, keys, args):
+        limit, window, now = (int(arg) for arg in args)
+        elapsed = now % window
+        current = int(await self.get(keys[0]) or 0)
+        previous = int(await self.get(keys[1]) or 0)
+        used = previous * (window - elapsed) / window + current
+        if used + 1 > limit:
+            retry = window - elapsed
+            if previous > 0 and current + 1 <= limit:
+                retry = math.ceil(window - (limit - 1 - current) * window / previous) - elapsed
+            return [0, max(0, math.floor(limit - used)), max(1, retry)]
+        if await self.incr(keys[0]) == 1:
+            await self.pexpire(keys[0], window * 2)
+        return [1, max(0, math.floor(limit - used - 1)), window - elapsed]
+
+    async def xadd(self, name, fields, maxlen=None, approximate=True):
+        name = self._key(name)
+        entry_id = f"{int(time.time() * 1000)}-{next(self._stream_ids)}"
+        self._streams[name].append((entry_id, dict(fields)))
+        if maxlen is not None and len(self._streams[name]) > maxlen:
+            del self._streams[name][: len(self._streams[name]) - maxlen]
+        return entry_id.encode()
+
+    async def xlen(self, name):
+        return len(self._streams.get(self._key(name), ()))
+
+    async def close(self):
+        pass
+
+    async def aclose(self):
+        pass
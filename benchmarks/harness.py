@@ -0,0 +1,141 @@
+"""
+Runs `main.app` in-process against local stand-ins for the benchmarks.
+
+The database is SQLite through aiosqlite unless another URL is given, Redis is
+the in-memory `FakeRedis`, avatars go to a local storage in the work directory
+and verification emails stay in the fake outbox stream. Rate limiting remains
+active, with limits high enough not to reject benchmark traffic.
+"""
+
+import json
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+import httpx
+from fastapi_limiter import FastAPILimiter
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.conf.config import AvatarConfig, rate_limit_config
+from app.database.db import get_db
+from app.database.query_monitor import install_query_monitor
+from app.database.redis import get_redis
+from app.models.models import Base
+from app.routes import avatars, user_profile
+from app.services.auth import auth_service
+from app.services.avatar import avatar_processor
+from app.services.avatar_storage import LocalFileStorage
+from app.services.rate_limiter import rate_limit_policies
+from app.services.server_timing import time_engine
+from benchmarks import datagen
+from benchmarks.fake_redis import FakeRedis
+from main import app
+
+UNLIMITED = {"times": 1_000_000_000, "seconds": 60}
+
+
+@dataclass
+class Harness:
+    """
+    The prepared application and its stand-ins.
+
+    Attributes:
+        engine (AsyncEngine): The benchmark database engine.
+        session_maker (async_sessionmaker): Creates sessions on `engine`.
+        redis (FakeRedis): The in-memory Redis.
+        users (int): The number of seeded users.
+        contacts_per_user (int): The number of seeded contacts per user.
+    """
+
+    engine: AsyncEngine
+    session_maker: async_sessionmaker
+    redis: FakeRedis
+    users: int
+    contacts_per_user: int
+
+    def client(self) -> httpx.AsyncClient:
+        """
+        Returns an HTTP client calling the application in-process.
+        """
+        transport = httpx.ASGITransport(app=app)
+        return httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60)
+
+
+def write_unlimited_policies(workdir: str) -> str:
+    """
+    Writes a rate limit policy file with limits benchmark traffic never reaches.
+
+    Returns:
+        str: The path of the policy file.
+    """
+    policy_file = os.path.join(workdir, "rate_limits.json")
+    with open(policy_file, "w", encoding="utf-8") as file:
+        json.dump({route: {"default": UNLIMITED} for route in rate_limit_config.RATE_LIMIT_POLICIES}, file)
+    return policy_file
+
+
+@asynccontextmanager
+async def running_app(
+    workdir: str,
+    users: int,
+    contacts_per_user: int,
+    database_url: str | None = None,
+    seed: int = 42,
+) -> AsyncIterator[Harness]:
+    """
+    Prepares a seeded database and wires the application to the stand-ins.
+
+    Args:
+        workdir (str): A directory for the SQLite file, avatars and policy overrides.
+        users (int): The number of users to seed.
+        contacts_per_user (int): The number of contacts to seed per user.
+        database_url (str, optional): An empty database to use instead of SQLite.
+        seed (int, optional): The data generator seed. Defaults to 42.
+
+    Yields:
+        Harness: The prepared application.
+    """
+    database_url = database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    connect_args = {"timeout": 30} if database_url.startswith("sqlite") else {}
+    engine = create_async_engine(database_url, connect_args=connect_args)
+    time_engine(engine)
+    install_query_monitor(engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    await datagen.seed(
+        session_maker, users, contacts_per_user, auth_service.get_password_hash(datagen.PASSWORD), seed
+    )
+
+    redis = FakeRedis()
+
+    async def override_get_db():
+        async with session_maker() as session:
+            yield session
+
+    async def override_get_redis():
+        return redis
+
+    original_table = rate_limit_policies._table
+    rate_limit_policies.reload(write_unlimited_policies(workdir))
+
+    storage = LocalFileStorage(
+        AvatarConfig(AVATAR_STORAGE="local", AVATAR_LOCAL_DIR=os.path.join(workdir, "avatars")),
+        avatar_processor,
+    )
+    original_storage = user_profile.avatar_storage
+    user_profile.avatar_storage = avatars.avatar_storage = storage
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_redis] = override_get_redis
+    await FastAPILimiter.init(redis)
+    try:
+        yield Harness(engine, session_maker, redis, users, contacts_per_user)
+    finally:
+        app.dependency_overrides.clear()
+        user_profile.avatar_storage = avatars.avatar_storage = original_storage
+        rate_limit_policies._table = original_table
+        avatar_processor.close()
+        await engine.dispose()
@@ -0,0 +1,116 @@
+"""
+Compares the CPU time FastAPI spends turning a contact list into a response body.
+
+The list route's work after the endpoint returns is replayed on `--limit` contact
+models, timed with `time.process_time`: validation against
+`list[ContactResponseSchema]`, shared by all pipelines, then serialization and
+encoding, which differ:
+
+- "stdlib": FastAPI's default, the model dumped to Python objects and `json.dumps`
+- "dumps": the same dump, encoded by `FastJSONResponse` (orjson when installed)
+- "direct": `JSONRoute`, pydantic-core writing the JSON bytes itself
+
+Example:
+    ```
+    python -m benchmarks.json_response
+    python -m benchmarks.json_response --limit 500 --iterations 500
+    ```
+"""
+
+import argparse
+import random
+import statistics
+import time
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.models.models import Contact
+from app.schemas.contact import ContactResponseSchema
+from app.services.responses import EncodedJSON, FastJSONResponse, orjson
+from benchmarks import datagen
+
+
+def make_contacts(count: int) -> list[Contact]:
+    rng = random.Random(42)
+    return [Contact(id=index + 1, **datagen.make_contact(rng, index, 1)) for index in range(count)]
+
+
+def render(
+    adapter: TypeAdapter, serialize: Callable[[Any], Any], response_class: type[JSONResponse], contacts: list[Contact]
+) -> tuple[float, float]:
+    """
+    Runs a response pipeline once.
+
+    Returns:
+        tuple[float, float]: The CPU seconds spent validating, and serializing and encoding.
+    """
+    started = time.process_time()
+    value = adapter.validate_python(contacts, from_attributes=True)
+    validated = time.process_time()
+    response_class(serialize(value))
+    return validated - started, time.process_time() - validated
+
+
+def response_body(
+    adapter: TypeAdapter, serialize: Callable[[Any], Any], response_class: type[JSONResponse], contacts: list[Contact]
+) -> bytes:
+    value = adapter.validate_python(contacts, from_attributes=True)
+    return bytes(response_class(serialize(value)).body)
+
+
+def benchmark(args) -> dict[str, tuple[list[float], list[float]]]:
+    contacts = make_contacts(args.limit)
+    adapter = TypeAdapter(list[ContactResponseSchema])
+
+    def to_python(value):
+        return adapter.dump_python(value, mode="json")
+
+    def to_json(value):
+        return EncodedJSON(adapter.dump_json(value))
+
+    pipelines = {
+        "stdlib": (adapter, to_python, JSONResponse),
+        "dumps": (adapter, to_python, FastJSONResponse),
+        "direct": (adapter, to_json, FastJSONResponse),
+    }
+    bodies = {response_body(*pipeline, contacts) for pipeline in pipelines.values()}
+    assert len(bodies) == 1, "the pipelines encode different bodies"
+    results = {name: ([], []) for name in pipelines}
+    # Interleaved, so drift in the machine's speed affects every pipeline alike
+    for _ in range(args.iterations):
+        for name, pipeline in pipelines.items():
+            validate, encode = render(*pipeline, contacts)
+            results[name][0].append(validate)
+            results[name][1].append(encode)
+    return results
+
+
+def print_report(results: dict[str, tuple[list[float], list[float]]], limit: int) -> None:
+    print(f"{limit} contacts per response, orjson {'installed' if orjson is not None else 'not installed'}")
+    print("CPU per response, median ms")
+    header = f"{'pipeline':<8} {'validate':>9} {'encode':>9} {'total':>9} {'encode speedup':>15}"
+    print(header)
+    print("-" * len(header))
+    base = None
+    for name, (validate, encode) in results.items():
+        validate_ms = statistics.median(validate) * 1000
+        encode_ms = statistics.median(encode) * 1000
+        base = base or encode_ms
+        print(
+            f"{name:<8} {validate_ms:>9.2f} {encode_ms:>9.2f} {validate_ms + encode_ms:>9.2f} "
+            f"{base / encode_ms:>14.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--limit", type=int, default=500, help="contacts per response, the route's maximum")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    print_report(benchmark(args), args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+Drives concurrent load over every API route and reports throughput and latency percentiles.
+
+`main.app` runs in-process behind the httpx ASGI transport, wired to the local
+stand-ins of `benchmarks.harness`, so no server, Postgres or Redis is needed.
+Every virtual user logs in and then loops over a weighted mix of contact,
+birthday, search, avatar and auth requests until the duration elapses.
+
+With `SERVER_TIMING_ENABLED=true` the `Server-Timing` headers of the responses
+are averaged per endpoint, so the latency can be attributed to auth, database,
+Redis and serialization time.
+
+The event loop is watched during the run: the largest loop lag and every call
+that blocked the loop for longer than `LOOP_BLOCK_THRESHOLD` are reported.
+
+Results are compared with a stored baseline: an endpoint regresses when its p95
+latency grows, or its throughput drops, by more than `--threshold`. Baselines
+depend on the machine, record them on the host that runs the check. The run
+settings and the endpoint mix are stored with the baseline, and a check with
+different settings is refused, since its numbers are not comparable. Endpoints
+the run did not exercise are skipped.
+
+Example:
+    ```
+    python -m benchmarks.load_test --users 20 --concurrency 32 --duration 30
+    python -m benchmarks.load_test --save-baseline
+    python -m benchmarks.load_test --check --threshold 0.25
+    SERVER_TIMING_ENABLED=true python -m benchmarks.load_test
+    ```
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+from sqlalchemy import select
+
+from app.models.models import User
+from app.services.loop_monitor import LoopMonitor
+from benchmarks import datagen
+from benchmarks.harness import Harness, running_app
+
+BASELINE_FILE = Path(__file__).parent / "baselines" / "load_test.json"
+EXPECTED_STATUSES = {200, 201, 204, 404}
+
+# Relative frequency of every endpoint in the request mix
+WEIGHTS = {
+    "contacts:list": 25,
+    "contacts:get": 20,
+    "contacts:search": 12,
+    "contacts:birthdays": 10,
+    "contacts:create": 8,
+    "contacts:update": 8,
+    "contacts:delete": 5,
+    "auth:login": 4,
+    "profile:update_avatar": 3,
+    "avatars:get": 3,
+    "auth:signup": 2,
+}
+
+
+def png_image(rng: random.Random) -> bytes:
+    """
+    Builds a small, unique PNG image, so avatar uploads are not deduplicated.
+    """
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return len(data).to_bytes(4, "big") + body + zlib.crc32(body).to_bytes(4, "big")
+
+    width = height = 64
+    pixel = bytes(rng.randrange(256) for _ in range(3))
+    raw = b"".join(b"\x00" + pixel * width for _ in range(height))
+    header = width.to_bytes(4, "big") + height.to_bytes(4, "big") + b"\x08\x02\x00\x00\x00"
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def parse_server_timing(header: str) -> list[tuple[str, float]]:
+    entries = []
+    for entry in header.split(","):
+        name, *params = entry.strip().split(";")
+        for param in params:
+            if param.startswith("dur="):
+                entries.append((name, float(param[4:])))
+    return entries
+
+
+class Stats:
+    """
+    Latencies and failures per endpoint.
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.server_timings: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def record(self, endpoint: str, started: float, response: httpx.Response | None) -> None:
+        self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+        if response is None or response.status_code not in EXPECTED_STATUSES:
+            self.errors[endpoint] += 1
+        if response is not None and "server-timing" in response.headers:
+            for name, duration in parse_server_timing(response.headers["server-timing"]):
+                self.server_timings[endpoint][name] += duration
+
+    def breakdown(self) -> dict[str, dict[str, float]]:
+        """
+        Returns the mean Server-Timing durations in ms per endpoint.
+        """
+        return {
+            endpoint: {name: round(total / len(self.latencies[endpoint]), 2) for name, total in timings.items()}
+            for endpoint, timings in sorted(self.server_timings.items())
+        }
+
+    def summary(self, elapsed: float) -> dict[str, dict[str, float]]:
+        results = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            results[endpoint] = summarize(latencies, self.errors[endpoint], elapsed)
+        everything = [latency for latencies in self.latencies.values() for latency in latencies]
+        if everything:
+            results["total"] = summarize(everything, sum(self.errors.values()), elapsed)
+        return results
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict[str, float]:
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(cuts[49], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+    }
+
+
+class VirtualUser:
+    """
+    A client session of one seeded user issuing the weighted request mix.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, harness: Harness, index: int, stats: Stats, seed: int):
+        self.client = client
+        self.harness = harness
+        self.stats = stats
+        self.rng = random.Random(seed * 1000 + index)
+        self.user_index = index % harness.users
+        self.email = datagen.user_email(self.user_index)
+        self.contact_ids: list[int] = []
+        self.created_ids: list[int] = []
+        self.avatar_url: str | None = None
+        self.headers: dict[str, str] = {}
+        self.counter = index * 1_000_000
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except Exception:
+            response = None
+        self.stats.record(endpoint, started, response)
+        return response
+
+    async def login(self) -> None:
+        response = await self.request(
+            "auth:login",
+            "POST",
+            "/api/auth/login",
+            data={"username": self.email, "password": datagen.PASSWORD},
+        )
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def run(self, deadline: float) -> None:
+        await self.login()
+        response = await self.request("contacts:list", "GET", "/api/contacts/contact/", params={"limit": 100})
+        if response is not None and response.status_code == 200:
+            self.contact_ids = [contact["id"] for contact in response.json()]
+        endpoints, weights = zip(*WEIGHTS.items())
+        while time.perf_counter() < deadline:
+            endpoint = self.rng.choices(endpoints, weights)[0]
+            await getattr(self, endpoint.replace(":", "_"))()
+
+    def next_index(self) -> int:
+        self.counter += 1
+        return 10_000_000 + self.counter
+
+    async def contacts_list(self) -> None:
+        params = {"limit": self.rng.choice([10, 20, 50]), "offset": self.rng.randrange(0, 50)}
+        await self.request("contacts:list", "GET", "/api/contacts/contact/", params=params)
+
+    async def contacts_get(self) -> None:
+        contact_id = self.rng.choice(self.contact_ids or [1])
+        await self.request("contacts:get", "GET", f"/api/contacts/contact/{contact_id}")
+
+    async def contacts_search(self) -> None:
+        params = {"first_name": self.rng.choice(datagen.FIRST_NAMES)[:3]}
+        await self.request("contacts:search", "GET", "/api/contacts/search_by/", params=params)
+
+    async def contacts_birthdays(self) -> None:
+        await self.request("contacts:birthdays", "GET", "/api/contacts/birthdays")
+
+    async def contacts_create(self) -> None:
+        body = datagen.make_contact_body(self.rng, self.next_index())
+        response = await self.request("contacts:create", "POST", "/api/contacts/contact/", json=body)
+        if response is not None and response.status_code == 201:
+            self.created_ids.append(response.json()["id"])
+
+    async def contacts_update(self) -> None:
+        if not self.created_ids:
+            return await self.contacts_create()
+        body = datagen.make_contact_body(self.rng, self.next_index())
+        contact_id = self.rng.choice(self.created_ids)
+        await self.request("contacts:update", "PUT", f"/api/contacts/contact/{contact_id}", json=body)
+
+    async def contacts_delete(self) -> None:
+        if not self.created_ids:
+            return await self.contacts_create()
+        contact_id = self.created_ids.pop()
+        await self.request("contacts:delete", "DELETE", f"/api/contacts/contact/{contact_id}")
+
+    async def auth_login(self) -> None:
+        await self.login()
+
+    async def auth_signup(self) -> None:
+        index = self.next_index()
+        body = {"username": f"signup{index}", "email": f"signup{index}@example.com", "password": datagen.PASSWORD}
+        await self.request("auth:signup", "POST", "/api/auth/signup", json=body)
+
+    async def profile_update_avatar(self) -> None:
+        files = {"file": ("avatar.png", png_image(self.rng), "image/png")}
+        response = await self.request("profile:update_avatar", "POST", "/api/profile/update_avatar", files=files)
+        if response is not None and response.status_code == 200:
+            async with self.harness.session_maker() as session:
+                self.avatar_url = await session.scalar(select(User.avatar).where(User.email == self.email))
+
+    async def avatars_get(self) -> None:
+        if self.avatar_url is None:
+            return await self.profile_update_avatar()
+        await self.request("avatars:get", "GET", self.avatar_url)
+
+
+async def run_load(harness: Harness, concurrency: int, duration: float, seed: int) -> tuple[Stats, float]:
+    stats = Stats()
+    async with harness.client() as client:
+        users = [VirtualUser(client, harness, index, stats, seed) for index in range(concurrency)]
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(user.run(deadline) for user in users))
+        elapsed = time.perf_counter() - started
+    return stats, elapsed
+
+
+def print_report(results: dict[str, dict[str, float]]) -> None:
+    header = f"{'endpoint':<24} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in results.items():
+        print(
+            f"{endpoint:<24} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} "
+            f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms"
+        )
+
+
+def print_loop_report(monitor: LoopMonitor) -> None:
+    print()
+    print(f"event loop: max lag {monitor.max_lag * 1000:.1f}ms, {len(monitor.blocks)} blocking calls")
+    # The innermost frame shows the synchronous call that held the loop
+    by_call = defaultdict(list)
+    for block in monitor.blocks:
+        by_call[block.stack.rstrip().splitlines()[-2].strip()].append(block.blocked_for)
+    for call, durations in sorted(by_call.items(), key=lambda item: -len(item[1])):
+        print(f"  {len(durations):>4}x up to {max(durations) * 1000:.0f}ms  {call}")
+
+
+def print_breakdown(breakdown: dict[str, dict[str, float]]) -> None:
+    names = ["auth", "db", "redis", "serialize", "app", "total"]
+    header = f"{'endpoint':<24}" + "".join(f"{name:>11}" for name in names)
+    print()
+    print("mean Server-Timing per request")
+    print(header)
+    print("-" * len(header))
+    for endpoint, timings in breakdown.items():
+        print(f"{endpoint:<24}" + "".join(f"{timings.get(name, 0):>9.2f}ms" for name in names))
+
+
+def run_settings(args) -> dict:
+    """
+    Returns the settings that decide whether two runs can be compared, including the endpoint mix.
+    """
+    settings = {key: getattr(args, key) for key in ("users", "contacts", "concurrency", "duration", "seed")}
+    settings["weights"] = WEIGHTS
+    return settings
+
+
+def settings_differences(expected: dict, actual: dict) -> list[str]:
+    """
+    Lists the run settings that differ from those the baseline was recorded with.
+
+    Args:
+        expected (dict): The settings stored with the baseline.
+        actual (dict): The settings of this run.
+
+    Returns:
+        list[str]: A description of every differing setting.
+    """
+    return [
+        f"{key}: {expected.get(key)} -> {actual.get(key)}"
+        for key in sorted(expected.keys() | actual.keys())
+        if expected.get(key) != actual.get(key)
+    ]
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float
+) -> list[str]:
+    """
+    Compares results with a baseline.
+
+    Endpoints of the baseline that this run sent no requests to are skipped, a
+    short run may not reach every endpoint of the mix.
+
+    Args:
+        results (dict): The endpoint summaries of this run.
+        baseline (dict): The endpoint summaries of the baseline run.
+        threshold (float): The tolerated relative change, e.g. 0.2 for 20%.
+
+    Returns:
+        list[str]: A description of every regression.
+    """
+    regressions = []
+    for endpoint, expected in baseline.items():
+        actual = results.get(endpoint)
+        if actual is None:
+            continue
+        if actual["p95_ms"] > expected["p95_ms"] * (1 + threshold):
+            regressions.append(f"{endpoint}: p95 {expected['p95_ms']}ms -> {actual['p95_ms']}ms")
+        if actual["rps"] < expected["rps"] * (1 - threshold):
+            regressions.append(f"{endpoint}: throughput {expected['rps']} -> {actual['rps']} req/s")
+        if actual["errors"] > expected["errors"]:
+            regressions.append(f"{endpoint}: errors {expected['errors']} -> {actual['errors']}")
+    return regressions
+
+
+async def benchmark(args) -> tuple[dict[str, dict[str, float]], dict[str, dict[str, float]], LoopMonitor]:
+    monitor = LoopMonitor()
+    with tempfile.TemporaryDirectory(prefix="load-test-") as workdir:
+        async with running_app(workdir, args.users, args.contacts, args.database_url, args.seed) as harness:
+            await monitor.start()
+            try:
+                stats, elapsed = await run_load(harness, args.concurrency, args.duration, args.seed)
+            finally:
+                await monitor.stop()
+    return stats.summary(elapsed), stats.breakdown(), monitor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20, help="seeded users")
+    parser.add_argument("--contacts", type=int, default=200, help="seeded contacts per user")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="an empty database instead of a temporary SQLite file")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--check", action="store_true", help="fail if the results regressed")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolerated relative change")
+    args = parser.parse_args()
+
+    results, breakdown, monitor = asyncio.run(benchmark(args))
+    print_report(results)
+    if breakdown:
+        print_breakdown(breakdown)
+    print_loop_report(monitor)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline = {"settings": run_settings(args), "endpoints": results}
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+    if args.check:
+        baseline = json.loads(args.baseline.read_text())
+        differences = settings_differences(baseline["settings"], run_settings(args))
+        if differences:
+            for difference in differences:
+                print(f"SETTINGS {difference}")
+            print("the run settings differ from the baseline, rerun with the same settings or save a new baseline")
+            sys.exit(2)
+        skipped = sorted(baseline["endpoints"].keys() - results.keys())
+        if skipped:
+            print(f"not exercised, skipped: {', '.join(skipped)}")
+        regressions = find_regressions(results, baseline["endpoints"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Reports password hash/verify latency for candidate hashing settings on this host.
+
+Use it to pick the highest cost factor that still fits the login throughput SLO:
+a login performs one `verify` (plus one `hash` when the stored hash is upgraded),
+so `1000 / verify_ms` is roughly the number of logins per second per core.
+
+Example:
+    ```
+    python -m benchmarks.password_hashing --bcrypt-rounds 10 11 12 13
+    python -m benchmarks.password_hashing --schemes argon2 --argon2-memory-cost 19456 65536
+    ```
+"""
+
+import argparse
+import itertools
+import statistics
+import time
+
+from passlib.exc import MissingBackendError
+
+from app.conf.config import PasswordHashConfig
+from app.services.auth import build_password_context
+
+PASSWORD = "Khfj98945bUGe"
+
+
+def measure(func, iterations: int) -> list[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def candidate_configs(args) -> list[tuple[str, PasswordHashConfig]]:
+    candidates = []
+    if "bcrypt" in args.schemes:
+        for rounds in args.bcrypt_rounds:
+            config = PasswordHashConfig(PASSWORD_SCHEMES=["bcrypt"], BCRYPT_ROUNDS=rounds)
+            candidates.append((f"rounds={rounds}", config))
+    if "argon2" in args.schemes:
+        for time_cost, memory_cost, parallelism in itertools.product(
+            args.argon2_time_cost, args.argon2_memory_cost, args.argon2_parallelism
+        ):
+            config = PasswordHashConfig(
+                PASSWORD_SCHEMES=["argon2"],
+                ARGON2_TIME_COST=time_cost,
+                ARGON2_MEMORY_COST=memory_cost,
+                ARGON2_PARALLELISM=parallelism,
+            )
+            label = f"t={time_cost} m={memory_cost}KiB p={parallelism}"
+            candidates.append((label, config))
+    return candidates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--schemes", nargs="+", default=["bcrypt", "argon2"])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--bcrypt-rounds", nargs="+", type=int, default=[10, 11, 12, 13])
+    parser.add_argument("--argon2-time-cost", nargs="+", type=int, default=[2, 3])
+    parser.add_argument("--argon2-memory-cost", nargs="+", type=int, default=[19456, 65536])
+    parser.add_argument("--argon2-parallelism", nargs="+", type=int, default=[1, 4])
+    args = parser.parse_args()
+
+    header = f"{'scheme':<8} {'settings':<30} {'hash p50':>10} {'verify p50':>11} {'verify p95':>11} {'logins/s/core':>14}"
+    print(header)
+    print("-" * len(header))
+    for label, config in candidate_configs(args):
+        scheme = config.PASSWORD_SCHEMES[0]
+        context = build_password_context(config)
+        try:
+            hashed = context.hash(PASSWORD)
+        except MissingBackendError as err:
+            print(f"{scheme:<8} {label:<30} skipped: {err}")
+            continue
+        hash_ms = measure(lambda: context.hash(PASSWORD), args.iterations)
+        verify_ms = measure(lambda: context.verify(PASSWORD, hashed), args.iterations)
+        verify_p50 = statistics.median(verify_ms)
+        verify_p95 = statistics.quantiles(verify_ms, n=20)[-1] if len(verify_ms) > 1 else verify_p50
+        print(
+            f"{scheme:<8} {label:<30} {statistics.median(hash_ms):>8.1f}ms "
+            f"{verify_p50:>9.1f}ms {verify_p95:>9.1f}ms {1000 / verify_p50:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Measures the CPU cost per row of validating contact responses against their output schema.
+
+`ContactResponseSchema` used to extend the input `ContactSchema`, re-running
+`EmailStr` and the phone pattern on rows read from our own database. The old
+schema is rebuilt here as "strict" and compared with the lean one for responses
+of `--rows` contacts; both are validated from ORM objects and dumped to JSON
+bytes, as `JSONRoute` does.
+
+Example:
+    ```
+    python -m benchmarks.response_validation
+    python -m benchmarks.response_validation --rows 1 10 100 500 --iterations 100
+    ```
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date
+
+from pydantic import ConfigDict, TypeAdapter
+
+from app.schemas.contact import ContactResponseSchema, ContactSchema
+from benchmarks.json_response import make_contacts
+
+
+class StrictContactResponseSchema(ContactSchema):
+    id: int = 1
+    date_of_birth: date
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+def measure(adapter: TypeAdapter, contacts: list, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.process_time()
+        adapter.dump_json(adapter.validate_python(contacts, from_attributes=True))
+        timings.append(time.process_time() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 10, 100, 500], help="contacts per response")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    strict = TypeAdapter(list[StrictContactResponseSchema])
+    lean = TypeAdapter(list[ContactResponseSchema])
+    header = f"{'rows':>5} {'strict/row':>11} {'lean/row':>10} {'saved/row':>10} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    for rows in args.rows:
+        contacts = make_contacts(rows)
+        assert strict.dump_json(strict.validate_python(contacts, from_attributes=True)) == lean.dump_json(
+            lean.validate_python(contacts, from_attributes=True)
+        ), "the schemas serialize different bodies"
+        strict_us = measure(strict, contacts, args.iterations) / rows * 1e6
+        lean_us = measure(lean, contacts, args.iterations) / rows * 1e6
+        print(
+            f"{rows:>5} {strict_us:>9.1f}us {lean_us:>8.1f}us {strict_us - lean_us:>8.1f}us "
+            f"{strict_us / lean_us:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
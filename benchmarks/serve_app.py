@@ -0,0 +1,47 @@
+"""
+`main.app` wired to a seeded SQLite file and an in-memory Redis, to be served by `serve.py`.
+
+Used by `benchmarks.serve_benchmark`, which sets `BENCH_SERVE_DB` to the seeded
+database and `BENCH_SERVE_POLICIES` to an unlimited rate limit policy file. Every
+worker process has its own `FakeRedis`; the database is shared and only read.
+"""
+
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi_limiter import FastAPILimiter
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database.db import get_db
+from app.database.redis import get_redis
+from app.services.rate_limiter import rate_limit_policies
+from benchmarks.fake_redis import FakeRedis
+from main import app
+
+engine = create_async_engine(f"sqlite+aiosqlite:///{os.environ['BENCH_SERVE_DB']}")
+session_maker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+redis = FakeRedis()
+
+
+async def override_get_db():
+    async with session_maker() as session:
+        yield session
+
+
+async def override_get_redis():
+    return redis
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    rate_limit_policies.reload(os.environ["BENCH_SERVE_POLICIES"])
+    await FastAPILimiter.init(redis)
+    yield
+    await FastAPILimiter.close()
+    await engine.dispose()
+
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_redis] = override_get_redis
+app.router.lifespan_context = lifespan
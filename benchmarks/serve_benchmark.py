@@ -0,0 +1,161 @@
+"""
+Compares the throughput of `serve.py` with one worker and with several on the contact list route.
+
+A SQLite database with one large address book is seeded, then `serve.py` serves
+`benchmarks.serve_app` once per worker count while concurrent clients request
+`GET /api/contacts/contact/` for the given duration. The server is stopped with
+SIGTERM between runs, exercising the graceful shutdown.
+
+The clients run in this process, on one core: give the server the remaining
+cores and raise `--clients` until the single worker run is saturated.
+
+Example:
+    ```
+    python -m benchmarks.serve_benchmark --workers 1 4 --duration 10
+    python -m benchmarks.serve_benchmark --workers 1 2 4 8 --contacts 5000 --clients 128
+    ```
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from app.services.auth import auth_service
+from benchmarks import datagen
+from benchmarks.harness import write_unlimited_policies
+
+ROOT = Path(__file__).parent.parent
+ROUTE = "/api/contacts/contact/"
+STARTUP_TIMEOUT = 60
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, env: dict[str, str]) -> subprocess.Popen:
+    command = [
+        sys.executable, "serve.py",
+        "--app", "benchmarks.serve_app:app",
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "--workers", str(workers),
+    ]  # fmt: skip
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+
+async def wait_until_live(base_url: str, server: subprocess.Popen) -> None:
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"serve.py exited with {server.returncode}")
+            try:
+                if (await client.get("/api/health/live")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("serve.py did not start in time")
+
+
+async def drive(base_url: str, token: str, clients: int, duration: float) -> dict[str, float]:
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, headers=headers, timeout=30) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+
+        async def run_client() -> None:
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                request_started = time.perf_counter()
+                try:
+                    response = await client.get(ROUTE, params={"limit": 50})
+                    ok = response.status_code == 200
+                except httpx.TransportError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - request_started)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(run_client() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+
+async def benchmark(args) -> dict[int, dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="serve-benchmark-") as workdir:
+        database = os.path.join(workdir, "serve.db")
+        datagen.seed_sqlite(database, args.contacts)
+        env = {
+            **os.environ,
+            "BENCH_SERVE_DB": database,
+            "BENCH_SERVE_POLICIES": write_unlimited_policies(workdir),
+        }
+        token = await auth_service.create_access_token(data={"sub": datagen.user_email(0)})
+
+        for workers in args.workers:
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = start_server(workers, port, env)
+            try:
+                await wait_until_live(base_url, server)
+                results[workers] = await drive(base_url, token, args.clients, args.duration)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+    return results
+
+
+def print_report(results: dict[int, dict[str, float]]) -> None:
+    header = f"{'workers':>7} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    base_rps = next(iter(results.values()))["rps"] if results else 0
+    for workers, row in results.items():
+        print(
+            f"{workers:>7} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} "
+            f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms "
+            f"{row['rps'] / base_rps if base_rps else 0:>7.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--contacts", type=int, default=1000, help="contacts in the listed address book")
+    parser.add_argument("--clients", type=int, default=64, help="concurrent connections")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    args = parser.parse_args()
+    print_report(asyncio.run(benchmark(args)))
+
+
+if __name__ == "__main__":
+    main()
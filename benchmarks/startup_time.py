@@ -0,0 +1,80 @@
+"""
+Measures how long importing the entry points takes, and which imports cost the most.
+
+Every module is imported in fresh interpreters, `--repeat` times, and the median
+wall time is reported net of an empty interpreter's startup. With `--top` the
+slowest imports of the last run are listed from `python -X importtime`, by
+cumulative time, so a new eager import of a heavy library stands out.
+
+Example:
+    ```
+    python -m benchmarks.startup_time
+    python -m benchmarks.startup_time --modules main worker --repeat 10 --top 25
+    ```
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+def run_import(module: str | None, importtime: bool = False) -> tuple[float, str]:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", f"import {module}" if module else "pass"]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, result.stderr
+
+
+def parse_importtime(output: str) -> list[tuple[str, float, float]]:
+    """
+    Parses the `-X importtime` report.
+
+    Returns:
+        list[tuple[str, float, float]]: The module, its own and its cumulative import time
+        in milliseconds.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(own) / 1000, int(cumulative) / 1000))
+    return imports
+
+
+def measure(module: str | None, repeat: int) -> float:
+    return statistics.median(run_import(module)[0] for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", nargs="+", default=["main", "worker", "serve"])
+    parser.add_argument("--repeat", type=int, default=5, help="interpreters per module")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports listed per module, 0 for none")
+    args = parser.parse_args()
+
+    baseline = measure(None, args.repeat)
+    print(f"{'module':<12} {'import':>9}   (interpreter startup {baseline * 1000:.0f}ms excluded)")
+    for module in args.modules:
+        print(f"{module:<12} {(measure(module, args.repeat) - baseline) * 1000:>7.0f}ms")
+
+    for module in args.modules if args.top else []:
+        _, output = run_import(module, importtime=True)
+        imports = sorted(parse_importtime(output), key=lambda item: -item[2])[: args.top]
+        print()
+        print(f"slowest imports of {module} (ms, inflated by -X importtime)")
+        print(f"{'cumulative':>10} {'self':>8}  module")
+        for name, own, cumulative in imports:
+            print(f"{cumulative:>10.1f} {own:>8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
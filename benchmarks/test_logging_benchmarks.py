@@ -0,0 +1,89 @@
+"""
+Per-request logging overhead: synchronous `print` calls against the queue-based logging.
+
+The `print` benchmark replays what a login request used to write to stdout: the
+email and the user object of `get_user_by_email`, the session of `create_user`
+and the role checks of `RoleAccess`. The logging benchmarks emit the same events
+through `app.services.log`, as DEBUG records under the default INFO level and as
+INFO records written by the listener thread.
+
+Output goes to a line-buffered file, like stdout of a container, so every line
+costs a write in the `print` case.
+"""
+
+import logging
+
+import pytest
+
+from app.conf.config import LoggingConfig
+from app.services.log import configure_logging, shutdown_logging
+
+EVENTS_PER_REQUEST = 5
+REQUESTS_PER_ROUND = 200
+
+logger = logging.getLogger("benchmarks.logging")
+
+
+class FakeUser:
+    def __init__(self, index: int):
+        self.id = index
+        self.email = f"user{index}@example.com"
+        self.role = "user"
+
+    def __repr__(self) -> str:
+        return f"<User id={self.id} email={self.email} role={self.role}>"
+
+
+USERS = [FakeUser(index) for index in range(REQUESTS_PER_ROUND)]
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    with open(tmp_path / "out.log", "w", buffering=1, encoding="utf-8") as file:
+        yield file
+
+
+@pytest.fixture
+def queue_logging(log_file):
+    def configure(level: str):
+        configure_logging(LoggingConfig(LOG_LEVEL=level), log_file)
+
+    yield configure
+    shutdown_logging()
+
+
+def test_print_per_request(async_benchmark, log_file):
+    async def requests():
+        for user in USERS:
+            print(user.email, file=log_file)
+            print(user, "======================", file=log_file)
+            print("<AsyncSession object>", file=log_file)
+            print(f"Checking if user role {user.role} is allowed...", file=log_file)
+            print(f"User {user.role} is allowed", file=log_file)
+
+    async_benchmark(requests)
+
+
+def emit_events(user: FakeUser, level: int) -> None:
+    for _ in range(EVENTS_PER_REQUEST):
+        logger.log(level, "Role %s checked for %s", user.role, user)
+
+
+def test_queue_logging_debug_filtered(async_benchmark, queue_logging):
+    queue_logging("INFO")
+
+    async def requests():
+        for user in USERS:
+            emit_events(user, logging.DEBUG)
+
+    async_benchmark(requests)
+
+
+def test_queue_logging_info_written(async_benchmark, queue_logging):
+    queue_logging("INFO")
+
+    async def requests():
+        for user in USERS:
+            emit_events(user, logging.INFO)
+
+    async_benchmark(requests)
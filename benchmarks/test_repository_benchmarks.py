@@ -0,0 +1,176 @@
+"""
+Micro-benchmarks of the repository functions and cache helpers.
+
+Each benchmark runs against an address book of every size in `BENCH_SIZES`, see
+`benchmarks/conftest.py`. Every call gets a fresh session, as in a request.
+"""
+
+import itertools
+import random
+
+from app.models.models import Contact
+from app.repository import contacts as repository_contacts
+from app.repository import users as repository_users
+from app.schemas.contact import ContactSchema, ContactUpdateSchema
+from app.schemas.user import UserCreationSchema
+from benchmarks import datagen
+from benchmarks.fake_redis import FakeRedis
+
+counter = itertools.count(50_000_000)
+
+
+def in_session(dataset, func, *args):
+    async def call():
+        async with dataset.session_maker() as db:
+            return await func(*args, db)
+
+    return call
+
+
+def contact_body(schema=ContactSchema):
+    return schema(**datagen.make_contact_body(random.Random(next(counter)), next(counter)))
+
+
+def middle_contact_id(dataset) -> int:
+    return dataset.size // 2
+
+
+# Contacts
+
+
+def test_get_contacts_first_page(async_benchmark, dataset):
+    async_benchmark(in_session(dataset, repository_contacts.get_contacts, dataset.user, 50, 0))
+
+
+def test_get_contacts_deep_page(async_benchmark, dataset):
+    offset = dataset.size - 50
+    async_benchmark(in_session(dataset, repository_contacts.get_contacts, dataset.user, 50, offset))
+
+
+def test_get_contact(async_benchmark, dataset):
+    contact_id = middle_contact_id(dataset)
+    async_benchmark(in_session(dataset, repository_contacts.get_contact, dataset.user, contact_id))
+
+
+def test_create_contact(async_benchmark, dataset):
+    async def setup():
+        return (contact_body(),)
+
+    async def create(body):
+        return await in_session(dataset, repository_contacts.create_contacts, dataset.user, body)()
+
+    async_benchmark(create, setup=setup)
+
+
+def test_update_contact(async_benchmark, dataset):
+    contact_id = middle_contact_id(dataset)
+
+    async def setup():
+        return (contact_body(ContactUpdateSchema),)
+
+    async def update(body):
+        return await in_session(dataset, repository_contacts.update_contacts, dataset.user, contact_id, body)()
+
+    async_benchmark(update, setup=setup)
+
+
+def test_delete_contact(async_benchmark, dataset):
+    async def setup():
+        contact = await in_session(dataset, repository_contacts.create_contacts, dataset.user, contact_body())()
+        return (contact.id,)
+
+    async def delete(contact_id):
+        return await in_session(dataset, repository_contacts.delete_contact, dataset.user, contact_id)()
+
+    async_benchmark(delete, setup=setup)
+
+
+def test_search_by_first_name(async_benchmark, dataset):
+    async def search():
+        async with dataset.session_maker() as db:
+            return await repository_contacts.search_by(dataset.user, db, "ole", None, None)
+
+    async_benchmark(search)
+
+
+def test_search_by_email(async_benchmark, dataset):
+    email = f"{middle_contact_id(dataset) - 1}@example.com"
+
+    async def search():
+        async with dataset.session_maker() as db:
+            return await repository_contacts.search_by(dataset.user, db, None, None, email)
+
+    async_benchmark(search)
+
+
+def test_get_upcoming_birthdays(async_benchmark, dataset):
+    async_benchmark(in_session(dataset, repository_contacts.get_upcoming_birthdays, dataset.user))
+
+
+# Users
+
+
+def test_get_user_by_email(async_benchmark, dataset):
+    async_benchmark(in_session(dataset, repository_users.get_user_by_email, dataset.user.email))
+
+
+def test_create_user(async_benchmark, dataset):
+    async def setup():
+        index = next(counter)
+        body = UserCreationSchema(
+            username=f"bench{index}", email=f"bench{index}@example.com", password="hashed-password"
+        )
+        return (body,)
+
+    async def create(body):
+        return await in_session(dataset, repository_users.create_user, body)()
+
+    async_benchmark(create, setup=setup)
+
+
+def test_update_token(async_benchmark, dataset):
+    async def update():
+        async with dataset.session_maker() as db:
+            user = await db.merge(dataset.user, load=False)
+            return await repository_users.update_token(user, f"token-{next(counter)}", db)
+
+    async_benchmark(update)
+
+
+def test_confirmed_email(async_benchmark, dataset):
+    async_benchmark(in_session(dataset, repository_users.confirmed_email, dataset.user.email))
+
+
+def test_update_avatar_url(async_benchmark, dataset):
+    async def update():
+        async with dataset.session_maker() as db:
+            url = f"/api/avatars/{next(counter)}/250.webp"
+            return await repository_users.update_avatar_url(dataset.user.email, url, db)
+
+    async_benchmark(update)
+
+
+# Cache helpers
+
+
+def make_page(count: int) -> list[Contact]:
+    rows = datagen.contact_rows(count, user_id=1)
+    return [Contact(id=index + 1, **dict(zip(datagen.CONTACT_COLUMNS, row))) for index, row in enumerate(rows)]
+
+
+def test_set_contacts_to_cache(async_benchmark):
+    redis = FakeRedis()
+    page = make_page(50)
+    async_benchmark(repository_contacts.set_contact_to_cache, "contacts:page", page, redis)
+
+
+def test_get_all_contacts_from_cache(async_benchmark, runner):
+    redis = FakeRedis()
+    runner.run(repository_contacts.set_contact_to_cache("contacts:page", make_page(50), redis))
+    async_benchmark(repository_contacts.get_all_contacts_from_cache, "contacts:page", redis)
+
+
+def test_get_contact_from_cache(async_benchmark, runner):
+    redis = FakeRedis()
+    runner.run(repository_contacts.set_contact_to_cache("contact:pk=1", make_page(1)[0], redis))
+    async_benchmark(repository_contacts.get_contact_from_cache, "contact:pk=1", redis)
@@ -1,21 +1,49 @@
+import logging
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from fastapi_limiter import FastAPILimiter
 import redis.asyncio as redis
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.conf.config import (
+    app_config,
+    compression_config,
+    loop_monitor_config,
+    metrics_config,
+    profiling_config,
+    warmup_config,
+)
 from app.database.db import get_db
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.profiling import ProfilingMiddleware
+from app.middleware.query_budget import QueryBudgetMiddleware
+from app.middleware.request_id import RequestIdMiddleware
+from app.middleware.server_timing import ServerTimingMiddleware
+from app.middleware.tracing import TracingMiddleware
 from app.models.models import Role
 from app.routes.contacts import router_additional, router_crud
 from app.routes.auth import auth_router
+from app.routes.health import health_router
+from app.routes.avatars import avatars_router
+from app.routes.metrics import metrics_router
+from app.routes.profiling import profiling_router
 from app.routes.user_profile import profile_router
 from app.services.roles import RoleAccess
 from app.database.redis import redis_manager
-
+from app.services.avatar import avatar_processor
+from app.services.email import mail_sender
+from app.services.health import health_prober
+from app.services.log import configure_logging, shutdown_logging
+from app.services.loop_monitor import loop_monitor
+from app.services.responses import FastJSONResponse, JSONRoute
+from app.services.tracing import tracer
+from app.services.warmup import warm_up
+
+logger = logging.getLogger(__name__)
 admin_access = RoleAccess([Role.admin])
 
 
@@ -40,21 +68,35 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         app = FastAPI(lifespan=lifespan)
         ```
     """
-    print("App starting up...")
+    configure_logging()
+    logger.info("App starting up")
 
     await redis_manager.connect()
     # Отримуємо сесію Redis для FastAPILimiter
     async with redis_manager.session() as redis:
         await FastAPILimiter.init(redis)
+    if loop_monitor_config.LOOP_MONITOR_ENABLED:
+        await loop_monitor.start()
+    # Readiness reports "starting" until the first probe, which runs once the worker is warm
+    if warmup_config.WARMUP_ENABLED:
+        await warm_up()
+    health_prober.start()
 
     yield
-    print("App shutting down...")
+    logger.info("App shutting down")
+    await health_prober.stop()
+    await loop_monitor.stop()
     await redis_manager.close()
     await FastAPILimiter.close()
+    await mail_sender.close()
+    avatar_processor.close()
+    tracer.shutdown()
+    shutdown_logging()
 
 
 
-app = FastAPI(debug=True, lifespan=lifespan)
+app = FastAPI(debug=app_config.APP_DEBUG, lifespan=lifespan, default_response_class=FastJSONResponse)
+app.router.route_class = JSONRoute
 
 origins = [
     "http://localhost",  # Дозволяє запити з localhost
@@ -69,11 +111,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if compression_config.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryBudgetMiddleware)
+if profiling_config.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+if metrics_config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if metrics_config.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+if tracer.enabled:
+    app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(auth_router, prefix="/api")
+app.include_router(health_router, prefix="/api")
 app.include_router(router_additional, prefix="/api")
 app.include_router(router_crud, prefix="/api")
 app.include_router(profile_router, prefix="/api")
+app.include_router(avatars_router, prefix="/api")
+if metrics_config.METRICS_ENABLED:
+    app.include_router(metrics_router)
+if profiling_config.PROFILING_ENABLED:
+    app.include_router(profiling_router, prefix="/api")
 
 
 @app.get("/admin", dependencies=[Depends(admin_access)])
@@ -104,7 +164,7 @@ async def index():
         ```
     """
     
-    return JSONResponse(content={"message": "you admin!"})
+    return FastJSONResponse(content={"message": "you admin!"})
 
 
 @app.get("/api/health_checker")
@@ -112,6 +172,9 @@ async def health_checker(db: AsyncSession = Depends(get_db)):
     """
     Endpoint to check the health of the database connection.
 
+    Every call opens a session and queries the database, orchestrator probes should
+    use `/api/health/live` and `/api/health/ready` instead.
+
     This endpoint performs a simple database query (`SELECT 1`) to verify if the database 
     is connected and configured correctly. If the query succeeds, a success message with 
     the result is returned. If the query fails or any other error occurs during the connection,
@@ -138,7 +201,6 @@ async def health_checker(db: AsyncSession = Depends(get_db)):
         # Make request
         result = await db.execute(text("SELECT 1"))
         result = result.fetchone()
-        print(result)
         if result is None:
             raise HTTPException(
                 status_code=500, detail="Database is not configured correctly"
@@ -146,7 +208,7 @@ async def health_checker(db: AsyncSession = Depends(get_db)):
 
         return {"message": "Database is connected and healthy", "result": result[0]}
 
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception("Health check query failed")
         raise HTTPException(status_code=500, detail="Error connecting to the database")
 
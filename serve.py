@@ -0,0 +1,82 @@
+"""
+Production entry point of the API: pre-forked uvicorn workers behind one listening socket.
+
+    python serve.py
+    SERVER_WORKERS=8 SERVER_PORT=8080 python serve.py
+    python serve.py --workers 1 --port 9000
+
+The supervisor binds the socket once with `SERVER_BACKLOG` and starts
+`SERVER_WORKERS` processes accepting from it, restarting workers that die. uvloop
+and httptools are used when installed. On SIGINT or SIGTERM the workers stop
+accepting connections, give in-flight requests `SERVER_GRACEFUL_TIMEOUT` seconds
+and then run the shutdown of `main.lifespan`.
+
+`SERVER_WORKERS` defaults to 1. The metrics registry, the profile store and the
+compressed body cache live in the memory of each worker and are not aggregated,
+so with several workers `/metrics` reports the counters of whichever worker
+answered the scrape and a profile report is only found on the worker that
+recorded it. Run one worker per container and scale out with replicas when the
+metrics matter, or scrape each worker separately.
+"""
+
+import argparse
+import importlib.util
+from typing import Any
+
+import uvicorn
+
+from app.conf.config import ServerConfig, server_config
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def uvicorn_options(config: ServerConfig, app: str = "main:app", **overrides) -> dict[str, Any]:
+    """
+    Builds the uvicorn settings from the server config.
+
+    Args:
+        config (ServerConfig): The server settings.
+        app (str, optional): The import string of the ASGI app. Defaults to "main:app".
+        **overrides: Settings replacing the configured ones, e.g. `workers=1`.
+
+    Returns:
+        dict: Keyword arguments of `uvicorn.run`.
+    """
+    options = {
+        "app": app,
+        "host": config.SERVER_HOST,
+        "port": config.SERVER_PORT,
+        "workers": config.SERVER_WORKERS,
+        "loop": event_loop(),
+        "http": http_protocol(),
+        "backlog": config.SERVER_BACKLOG,
+        "timeout_keep_alive": config.SERVER_KEEP_ALIVE,
+        "timeout_graceful_shutdown": config.SERVER_GRACEFUL_TIMEOUT,
+        "limit_concurrency": config.SERVER_LIMIT_CONCURRENCY,
+        "access_log": config.SERVER_ACCESS_LOG,
+        "lifespan": "on",
+        # The app configures logging in its lifespan, uvicorn's records propagate to it
+        "log_config": None,
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--app", default="main:app", help="import string of the ASGI app")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    uvicorn.run(**uvicorn_options(server_config, args.app, host=args.host, port=args.port, workers=args.workers))
+
+
+if __name__ == "__main__":
+    main()
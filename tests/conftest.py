@@ -1,4 +1,5 @@
 import asyncio
+import os
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
 from fastapi import FastAPI
 import pytest
@@ -8,11 +9,16 @@ from redis.asyncio import Redis
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
+# Profiling is off by default; the app is built with it to test the admin profiles
+os.environ.setdefault("PROFILING_ENABLED", "true")
+
 from main import app, lifespan
 from app.models.models import Base, Contact, User
 from app.database.db import get_db
 from app.database.redis import get_redis
 from app.services.auth import Auth, auth_service
+from app.conf.config import db_config
+from app.database.query_monitor import install_query_monitor
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
@@ -21,6 +27,9 @@ engine = create_async_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
+install_query_monitor(engine)
+# Requests running more statements than their route's budget fail the test
+db_config.DB_QUERY_BUDGET_MODE = "raise"
 
 TestingSessionLocal = async_sessionmaker(
     autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
@@ -88,6 +97,7 @@ def client():
         mock_redis.get = AsyncMock(return_value=None)
         mock_redis.set = AsyncMock(return_value=True)
         mock_redis.expire = AsyncMock(return_value=True)
+        mock_redis.delete = AsyncMock(return_value=1)
 
         return mock_redis
 
@@ -110,7 +120,7 @@ def mock_auth_settings():
 @pytest_asyncio.fixture(scope="function")
 async def get_token_admin(mock_auth_settings):
     token = await auth_service.create_access_token(
-        data={"sub": test_admin_user["email"]}
+        data={"sub": test_admin_user["email"], "role": "admin"}
     )
     return token
 
@@ -118,7 +128,7 @@ async def get_token_admin(mock_auth_settings):
 @pytest_asyncio.fixture(scope="function")
 async def get_token_not_admin(mock_auth_settings):
     token = await auth_service.create_access_token(
-        data={"sub": test__not_admin_user["email"]}
+        data={"sub": test__not_admin_user["email"], "role": "user"}
     )
     return token
 
@@ -139,7 +149,7 @@ class TestFixtures:
     def setup_db(self):
         mock_db: AsyncSession = AsyncMock(spec=AsyncSession)
         mock_db.execute = AsyncMock()
-        mock_db.add = AsyncMock()
+        mock_db.add = Mock()
         mock_db.commit = AsyncMock()
         mock_db.refresh = AsyncMock()
         return mock_db
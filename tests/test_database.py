@@ -1,7 +1,24 @@
 import pytest
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.conf.config import DBConfig
 from app.database.db import get_db
+from app.database.query_monitor import (
+    QueryBudgetExceeded,
+    QueryCounter,
+    check_budget,
+    install_query_monitor,
+    parameters_shape,
+    query_budget,
+    query_counter,
+)
+from app.database.statements import statement_hook
+from app.middleware.query_budget import QueryBudgetMiddleware
 
 
 @pytest.fixture
@@ -68,6 +85,17 @@ class TestDB:
         mock_session.rollback.assert_called_once()
         mock_session.close.assert_called_once()
 
+    async def test_engine_created_on_first_use(self, tmp_path):
+        from app.database.db import DatabaseSessionManager
+
+        sessionmanager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path / 'lazy.db'}")
+        assert sessionmanager._engine is None
+
+        async with sessionmanager.session() as session:
+            assert (await session.execute(text("SELECT 1"))).scalar() == 1
+        assert sessionmanager.engine is sessionmanager._engine
+        await sessionmanager.engine.dispose()
+
     @patch("app.conf.config.db_config.DATABASE_URL")
     async def test_get_db(self, mock_db_url):
         from app.database.db import sessionmanager
@@ -79,3 +107,93 @@ class TestDB:
 
         async for session in get_db():
             assert session == mock_session
+
+
+class TestQueryMonitor:
+    def test_parameters_shape_hides_values(self):
+        assert parameters_shape({"email": "a@b.c", "id": 1}, False) == "keys: email, id"
+        assert parameters_shape(("a@b.c", 1), False) == "2 positional"
+        assert parameters_shape([(1, 2), (3, 4)], True) == "2 rows of 2 positional"
+        assert parameters_shape((), False) == "none"
+
+    def test_check_budget_modes(self, caplog):
+        counter = QueryCounter({"method": "GET", "path": "/api/contacts/contact/"})
+        for _ in range(3):
+            counter.add("SELECT 1")
+
+        check_budget(counter, 3, "raise")
+        with pytest.raises(QueryBudgetExceeded, match="ran 3 SQL statements, budget is 2"):
+            check_budget(counter, 2, "raise")
+        check_budget(counter, 2, "warn")
+        assert "GET /api/contacts/contact/ ran 3 SQL statements" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_slow_queries_are_logged_with_route(self, tmp_path, caplog):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'slow.db'}")
+        install_query_monitor(engine, DBConfig(DB_SLOW_QUERY_MS=0))
+        token = query_counter.set(QueryCounter({"path": "/api/contacts/birthdays"}))
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT :value"), {"value": "secret"})
+        finally:
+            query_counter.reset(token)
+            await engine.dispose()
+
+        assert "Slow query" in caplog.text
+        assert "/api/contacts/birthdays" in caplog.text
+        assert "[parameters: 1 positional]" in caplog.text
+        assert "secret" not in caplog.text
+
+    def test_middleware_enforces_route_budget(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'budget.db'}")
+        install_query_monitor(engine)
+        app = FastAPI()
+        app.add_middleware(QueryBudgetMiddleware, config=DBConfig(DB_QUERY_BUDGET_MODE="raise"))
+
+        @app.get("/items")
+        @query_budget(1)
+        async def items(count: int):
+            async with engine.connect() as connection:
+                for _ in range(count):
+                    await connection.execute(text("SELECT 1"))
+            return []
+
+        client = TestClient(app)
+        assert client.get("/items", params={"count": 1}).status_code == 200
+        with pytest.raises(QueryBudgetExceeded):
+            client.get("/items", params={"count": 2})
+
+
+class RecordingSubscriber:
+    def __init__(self):
+        self.statements = []
+
+    def before(self, statement):
+        statement.state.setdefault("seen", 0)
+        statement.state["seen"] += 1
+
+    def after(self, statement):
+        self.statements.append(statement)
+
+
+class TestStatementHook:
+    @pytest.mark.asyncio
+    async def test_subscribers_share_one_timing(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'hook.db'}")
+        first, second = RecordingSubscriber(), RecordingSubscriber()
+        statement_hook(engine).subscribe(first)
+        statement_hook(engine).subscribe(second)
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                with pytest.raises(Exception):
+                    await connection.execute(text("SELECT * FROM missing"))
+        finally:
+            await engine.dispose()
+
+        assert statement_hook(engine) is statement_hook(engine)
+        assert first.statements == second.statements
+        ok, failed = first.statements
+        assert ok.statement == "SELECT 1" and ok.error is None and ok.duration >= 0
+        assert failed.error is not None and failed.duration >= 0
+        assert ok.state["seen"] == 2
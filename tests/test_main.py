@@ -1,12 +1,18 @@
+import time
 from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi import FastAPI, HTTPException, status
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
 import pytest
 from main import app, lifespan
-from conftest import user, admin
+from app.services.health import health_prober
+from app.conf.config import ServerConfig
+from serve import uvicorn_options
+from conftest import user, admin, TestingSessionLocal
 from app.services.auth import Auth
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User
 
 
 @pytest.mark.asyncio
@@ -25,6 +31,72 @@ class TestMainAsync:
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == {"message": "you admin!"}
 
+    async def test_request_id(self, client: TestClient):
+        response = client.get("/api/health_checker", headers={"X-Request-ID": "abc-123"})
+        assert response.headers["x-request-id"] == "abc-123"
+
+        response = client.get("/api/health_checker")
+        assert len(response.headers["x-request-id"]) == 32
+
+    async def test_health_probes(self, client: TestClient):
+        response = client.get("/api/health/live")
+        assert response.json() == {"status": "ok"}
+
+        with patch.object(health_prober, "checked_at", None):
+            response = client.get("/api/health/ready")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+        checks = {"database": {"status": "degraded"}}
+        with patch.object(health_prober, "checked_at", time.time()), patch.object(health_prober, "checks", checks):
+            response = client.get("/api/health/ready")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["status"] == "degraded"
+
+    async def test_profile_request_of_admin(self, mock_auth_settings, client: TestClient, get_token_admin: str):
+        response = client.get(
+            "/admin", headers={"Authorization": f"Bearer {get_token_admin}", "X-Profile": "1"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        profile_id = response.headers["x-profile-id"]
+
+        response = client.get(
+            f"/api/admin/profiles/{profile_id}", headers={"Authorization": f"Bearer {get_token_admin}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["details"]["route"] == "/admin"
+
+    async def test_profile_request_of_not_admin(
+        self, mock_auth_settings, client: TestClient, get_token_not_admin: str
+    ):
+        headers = {"Authorization": f"Bearer {get_token_not_admin}"}
+        response = client.get("/admin?profile=1", headers=headers)
+        assert "x-profile-id" not in response.headers
+
+        response = client.get("/api/admin/profiles/", headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_profiles_of_admin_demoted_after_token_issue(
+        self, mock_auth_settings, client: TestClient, get_token_admin: str
+    ):
+        headers = {"Authorization": f"Bearer {get_token_admin}"}
+        response = client.get("/admin", headers={**headers, "X-Profile": "1"})
+        profile_id = response.headers["x-profile-id"]
+
+        async with TestingSessionLocal() as session:
+            await session.execute(update(User).where(User.email == admin.email).values(role="user"))
+            await session.commit()
+        try:
+            # The token still carries the admin role claim, the profiles endpoints check the stored role
+            assert client.get("/admin", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+            response = client.get(f"/api/admin/profiles/{profile_id}", headers=headers)
+            assert response.status_code == status.HTTP_403_FORBIDDEN
+            response = client.get("/api/admin/profiles/", headers=headers)
+            assert response.status_code == status.HTTP_403_FORBIDDEN
+        finally:
+            async with TestingSessionLocal() as session:
+                await session.execute(update(User).where(User.email == admin.email).values(role="admin"))
+                await session.commit()
+
 
 
     async def test_lifespan(self):
@@ -36,7 +108,9 @@ class TestMainAsync:
             "main.FastAPILimiter.init", new_callable=AsyncMock
         ) as mock_limiter_init, patch(
             "main.FastAPILimiter.close", new_callable=AsyncMock
-        ) as mock_limiter_close:
+        ) as mock_limiter_close, patch(
+            "main.warm_up", new_callable=AsyncMock
+        ) as mock_warm_up:
 
             # Set up __aenter__ to return an AsyncMock (redis object)
             mock_session.__aenter__.return_value = AsyncMock()
@@ -52,6 +126,7 @@ class TestMainAsync:
             mock_close.assert_awaited_once()
             mock_limiter_init.assert_awaited_once()
             mock_limiter_close.assert_awaited_once()
+            mock_warm_up.assert_awaited_once()
 
 
 
@@ -65,3 +140,27 @@ class TestMainAsync:
         assert data["message"] == "Database is connected and healthy"
         assert data["result"] == 1
 
+
+    async def test_metrics(self, client: TestClient):
+        client.get("/api/health_checker")
+
+        depth = {"stream": 4, "retry": 1, "dead": 0}
+        with patch("app.routes.metrics.email_outbox.depth", AsyncMock(return_value=depth)):
+            response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'http_requests_total{method="GET",route="/api/health_checker",status="200"}' in response.text
+        assert 'queue_depth{queue="mail_sender"} 0' in response.text
+        assert 'queue_depth{queue="mail_outbox_stream"} 4' in response.text
+
+
+def test_uvicorn_options():
+    options = uvicorn_options(ServerConfig(SERVER_WORKERS=4, SERVER_BACKLOG=512), port=9000, host=None)
+
+    assert options["workers"] == 4
+    assert options["backlog"] == 512
+    assert options["port"] == 9000
+    assert options["host"] == "0.0.0.0"
+    assert options["loop"] in ("uvloop", "asyncio")
+    assert app.debug is False
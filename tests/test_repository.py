@@ -21,6 +21,7 @@ from app.repository.users import (
     create_user,
     get_user_by_email,
     update_avatar_url,
+    update_password,
     update_token,
 )
 from app.models.models import Contact
@@ -69,6 +70,11 @@ class TestUser(TestFixtures):
         assert setup_user.refresh_token == new_token
         setup_db.commit.assert_called_once()
 
+    async def test_update_password(self, setup_user, setup_db):
+        await update_password(setup_user, "new_hash", setup_db)
+        assert setup_user.password == "new_hash"
+        setup_db.commit.assert_called_once()
+
     @patch("app.repository.users.get_user_by_email")
     async def test_confirmed_email(self, mock_get_user_by_email, setup_user, setup_db):
         mock_get_user_by_email.return_value = setup_user
@@ -433,3 +439,22 @@ class TestContact(TestFixtures):
             mock_setex.assert_called_once_with(
                 key, 60, json.dumps([contact.__getstate__() for contact in contacts])
             )
+
+    async def test_set_single_contact_to_cache(self):
+        contact = Contact(
+            id=1,
+            name="John",
+            surname="Doe",
+            email="john.doe@example.com",
+            phone="380963487456",
+            date_of_birth=date.fromisoformat("1990-05-10"),
+            additional_info="Some info",
+        )
+        mock_redis = AsyncMock()
+
+        await set_contact_to_cache("contact:pk=1", contact, mock_redis)
+        mock_redis.get.return_value = mock_redis.setex.call_args.args[2]
+        cached = await get_contact_from_cache("contact:pk=1", mock_redis)
+
+        assert cached.name == "John"
+        assert cached.date_of_birth == date(1990, 5, 10)
@@ -1,3 +1,4 @@
+import hashlib
 import io
 import json
 from types import SimpleNamespace
@@ -9,8 +10,13 @@ import pytest
 from app.models.models import User
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.user import UserCreationSchema
+from app.conf.config import AvatarConfig
+from app.services.avatar import AvatarProcessor, ProcessedAvatar
+from app.services.avatar_storage import LocalFileStorage
 from conftest import test_admin_user, TestFixtures
 
+JPEG_CONTENT = b"\xff\xd8\xff\xe0fake_image_content"
+
 user_data = {
     "email": "test@example.com",
     "username": "testuser",
@@ -20,7 +26,7 @@ user_data = {
 
 @pytest.mark.asyncio
 class TestAuth:
-    @patch("app.routes.auth.BackgroundTasks.add_task", new_callable=Mock)
+    @patch("app.services.outbox.EmailOutbox.enqueue", new_callable=AsyncMock)
     @patch("app.repository.users.create_user", new_callable=AsyncMock)
     @patch("app.services.auth.Auth.get_password_hash", new_callable=Mock)
     @patch("app.repository.users.get_user_by_email", new_callable=AsyncMock)
@@ -40,6 +46,8 @@ class TestAuth:
         response = client.post("/api/auth/signup", json=user_data)
         assert response.status_code == status.HTTP_201_CREATED
         assert response.json()["username"] == "mock_username"
+        bt.assert_awaited_once()
+        assert bt.await_args.args[1:3] == ("mock@email.com", "mock_username")
 
     @patch("app.repository.users.get_user_by_email", new_callable=AsyncMock)
     async def test_signup_exist_user(self, mock_get_user_by_email, client: TestClient):
@@ -52,10 +60,12 @@ class TestAuth:
     @patch("app.services.auth.Auth.create_refresh_token", new_callable=AsyncMock)
     @patch("app.repository.users.update_token", new_callable=AsyncMock)
     @patch("app.repository.users.get_user_by_email", new_callable=AsyncMock)
+    @patch("app.services.auth.Auth.needs_rehash", new_callable=Mock, return_value=False)
     @patch("app.services.auth.Auth.verify_password", new_callable=Mock)
     async def test_login_successful(
         self,
         mock_verify_password,
+        mock_needs_rehash,
         mock_get_user_by_email,
         mock_update,
         mock_refresh,
@@ -81,6 +91,44 @@ class TestAuth:
         data = response.json()
         assert data["access_token"]
 
+    @patch("app.services.auth.Auth.create_access_token", new_callable=AsyncMock)
+    @patch("app.services.auth.Auth.create_refresh_token", new_callable=AsyncMock)
+    @patch("app.repository.users.update_token", new_callable=AsyncMock)
+    @patch("app.repository.users.update_password", new_callable=AsyncMock)
+    @patch("app.repository.users.get_user_by_email", new_callable=AsyncMock)
+    @patch("app.services.auth.Auth.get_password_hash", new_callable=Mock)
+    @patch("app.services.auth.Auth.needs_rehash", new_callable=Mock, return_value=True)
+    @patch("app.services.auth.Auth.verify_password", new_callable=Mock, return_value=True)
+    async def test_login_rehashes_outdated_password(
+        self,
+        mock_verify_password,
+        mock_needs_rehash,
+        mock_get_password_hash,
+        mock_get_user_by_email,
+        mock_update_password,
+        mock_update,
+        mock_refresh,
+        mock_access,
+        client: TestClient,
+    ):
+        found_user = Mock(email=test_admin_user["email"], verified=True)
+        mock_get_user_by_email.return_value = found_user
+        mock_get_password_hash.return_value = "upgraded_hash"
+        mock_refresh.return_value = "new_refresh_token"
+        mock_access.return_value = "access_token"
+        response = client.post(
+            "/api/auth/login",
+            data={
+                "username": test_admin_user["email"],
+                "password": test_admin_user["password"],
+            },
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        mock_get_password_hash.assert_called_once_with(test_admin_user["password"])
+        mock_update_password.assert_awaited_once()
+        assert mock_update_password.await_args.args[:2] == (found_user, "upgraded_hash")
+
     @patch("app.repository.users.get_user_by_email", new_callable=AsyncMock)
     async def test_login_invalid_email(
         self, mock_get_user_by_email, client: TestClient
@@ -230,7 +278,7 @@ class TestAuth:
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == {"message": "Your email is already confirmed"}
 
-    @patch("app.routes.auth.BackgroundTasks.add_task", new_callable=Mock)
+    @patch("app.services.outbox.EmailOutbox.enqueue", new_callable=AsyncMock)
     @patch("app.repository.users.get_user_by_email", new_callable=AsyncMock)
     async def test_request_email(self, mock_get_user_by_email, bt, client: TestClient):
         mock_get_user_by_email.return_value = SimpleNamespace(
@@ -271,7 +319,8 @@ class TestAuth:
 
 @pytest.mark.asyncio
 class TestUserProfile:
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
+    @patch("app.services.avatar.AvatarProcessor.process", new_callable=AsyncMock)
     @patch(
         "app.services.cloudinary.Cloudinary.upload_avatar_to_cloudinary",
         new_callable=AsyncMock,
@@ -281,17 +330,18 @@ class TestUserProfile:
         self,
         mock_update_avatar_url,
         mock_upload_avatar_to_cloudinary,
+        mock_process,
         mock_rate_limiter,
         mock_auth_settings,
         get_token_admin,
         client: TestClient,
     ):
         mock_rate_limiter.return_value = True
+        mock_process.return_value = ProcessedAvatar(b"resized", "image/webp")
         mock_update_avatar_url.return_value = Mock()
         mock_upload_avatar_to_cloudinary.return_value = "mock_url"
-        file_content = io.BytesIO(b"fake_image_content")
+        file_content = io.BytesIO(JPEG_CONTENT)
         file_content.name = "avatar.jpg"
-        file_content = io.BytesIO(b"fake_image_content")
 
         response = client.post(
             "/api/profile/update_avatar",
@@ -306,11 +356,61 @@ class TestUserProfile:
         print(response.json())
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == {"message": "Avatar updated successfully!"}
+        (upload,), _ = mock_process.call_args
+        assert upload.content_type == "image/jpeg"
+        _, kwargs = mock_upload_avatar_to_cloudinary.call_args
+        assert kwargs["public_id"] == hashlib.sha256(JPEG_CONTENT).hexdigest()
+
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
+    @patch(
+        "app.services.cloudinary.Cloudinary.upload_avatar_to_cloudinary",
+        new_callable=AsyncMock,
+    )
+    async def test_update_avatar_unsupported_type(
+        self,
+        mock_upload_avatar_to_cloudinary,
+        mock_rate_limiter,
+        mock_auth_settings,
+        get_token_admin,
+        client: TestClient,
+    ):
+        response = client.post(
+            "/api/profile/update_avatar",
+            headers={"Authorization": f"Bearer {get_token_admin}"},
+            files={"file": ("avatar.svg", io.BytesIO(b"<svg/>"), "image/svg+xml")},
+            params={"args": "value_for_args", "kwargs": "value_for_kwargs"},
+        )
+
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        mock_upload_avatar_to_cloudinary.assert_not_awaited()
+
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
+    @patch(
+        "app.services.cloudinary.Cloudinary.upload_avatar_to_cloudinary",
+        new_callable=AsyncMock,
+    )
+    async def test_update_avatar_content_not_an_image(
+        self,
+        mock_upload_avatar_to_cloudinary,
+        mock_rate_limiter,
+        mock_auth_settings,
+        get_token_admin,
+        client: TestClient,
+    ):
+        response = client.post(
+            "/api/profile/update_avatar",
+            headers={"Authorization": f"Bearer {get_token_admin}"},
+            files={"file": ("avatar.png", io.BytesIO(b"#!/bin/sh\nrm -rf /"), "image/png")},
+            params={"args": "value_for_args", "kwargs": "value_for_kwargs"},
+        )
+
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        mock_upload_avatar_to_cloudinary.assert_not_awaited()
 
 
 @pytest.mark.asyncio
 class TestContacts(TestFixtures):
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.get_contacts", new_callable=AsyncMock)
     @patch("app.repository.contacts.set_contact_to_cache", new_callable=AsyncMock)
     @patch(
@@ -343,7 +443,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_200_OK
         assert response.json()[0]["name"] == setup_contacts[0].name
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.search_by", new_callable=AsyncMock)
     async def test_search_by_successful(
         self,
@@ -369,7 +469,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_200_OK
         assert response.json()[0]["name"] == setup_contacts[0].name
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.search_by", new_callable=AsyncMock)
     async def test_search_by_fail(
         self,
@@ -394,7 +494,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.json() == {"detail": "NOT FOUND"}
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.get_contact_from_cache", new_callable=AsyncMock)
     async def test_get_contact_cached(
         self,
@@ -420,7 +520,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_200_OK
         assert response.json()["name"] == setup_contacts[0].name
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.get_contact_from_cache", new_callable=AsyncMock)
     @patch("app.repository.contacts.get_contact", new_callable=AsyncMock)
     async def test_get_contact_not_found(
@@ -448,7 +548,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.json() == {"detail": "NOT FOUND"}
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.get_contact_from_cache", new_callable=AsyncMock)
     @patch("app.repository.contacts.get_contact", new_callable=AsyncMock)
     @patch("app.repository.contacts.set_contact_to_cache", new_callable=AsyncMock)
@@ -480,7 +580,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_200_OK
         assert response.json()["name"] == setup_contacts[0].name
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.create_contacts", new_callable=AsyncMock)
     async def test_create_contact(
         self,
@@ -516,7 +616,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_201_CREATED
         assert response.json()["name"] == setup_contacts[0].name
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.update_contacts", new_callable=AsyncMock)
     async def test_update_contact_successful(
         self,
@@ -544,7 +644,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_200_OK
         assert response.json()["name"] == setup_dict_contacts["name"]
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.update_contacts", new_callable=AsyncMock)
     async def test_update_contact_fail(
         self,
@@ -572,7 +672,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.json() == {"detail": "NOT FOUND"}
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.delete_contact", new_callable=AsyncMock)
     async def test_delete_contact(
         self,
@@ -597,7 +697,7 @@ class TestContacts(TestFixtures):
         )
         assert response.status_code == status.HTTP_204_NO_CONTENT
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch(
         "app.repository.contacts.get_all_contacts_from_cache", new_callable=AsyncMock
     )
@@ -625,7 +725,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_200_OK
         assert response.json()[0]["name"] == setup_contacts[0].name
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch("app.repository.contacts.get_upcoming_birthdays", new_callable=AsyncMock)
     @patch(
         "app.repository.contacts.get_all_contacts_from_cache",
@@ -656,7 +756,7 @@ class TestContacts(TestFixtures):
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.json() == {"detail": "No upcoming birthdays found"}
 
-    @patch("app.routes.user_profile.RateLimiter.__call__", new_callable=AsyncMock)
+    @patch("app.services.rate_limiter.RateLimit.__call__", new_callable=AsyncMock)
     @patch(
         "app.repository.contacts.get_all_contacts_from_cache", new_callable=AsyncMock
     )
@@ -689,3 +789,55 @@ class TestContacts(TestFixtures):
         )
         assert response.status_code == status.HTTP_200_OK
         assert response.json()[0]["name"] == setup_contacts[0].name
+
+
+@pytest.fixture
+def local_avatars(tmp_path):
+    config = AvatarConfig(AVATAR_STORAGE="local", AVATAR_LOCAL_DIR=str(tmp_path))
+    storage = LocalFileStorage(config, AvatarProcessor(config))
+    digest = hashlib.sha256(b"upload").hexdigest()
+    (tmp_path / digest).mkdir()
+    (tmp_path / digest / "250.webp").write_bytes(b"0123456789")
+    with patch("app.routes.avatars.avatar_storage", storage):
+        yield digest
+
+
+class TestAvatars:
+    def test_get_avatar(self, local_avatars, client: TestClient):
+        response = client.get(f"/api/avatars/{local_avatars}/250.webp")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == b"0123456789"
+        assert response.headers["content-type"] == "image/webp"
+        assert response.headers["etag"] == f'"{local_avatars}-250.webp"'
+        assert "immutable" in response.headers["cache-control"]
+        assert "last-modified" in response.headers
+
+    def test_get_avatar_not_modified(self, local_avatars, client: TestClient):
+        etag = client.get(f"/api/avatars/{local_avatars}/250.webp").headers["etag"]
+
+        response = client.get(
+            f"/api/avatars/{local_avatars}/250.webp", headers={"If-None-Match": etag}
+        )
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+
+    def test_get_avatar_range(self, local_avatars, client: TestClient):
+        response = client.get(
+            f"/api/avatars/{local_avatars}/250.webp", headers={"Range": "bytes=2-5"}
+        )
+
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert response.content == b"2345"
+        assert response.headers["content-range"] == "bytes 2-5/10"
+
+    def test_get_avatar_not_found(self, local_avatars, client: TestClient):
+        response = client.get(f"/api/avatars/{local_avatars}/64.webp")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_get_avatar_invalid_digest(self, local_avatars, client: TestClient):
+        response = client.get("/api/avatars/..%2F..%2Fetc/250.webp")
+
+        assert response.status_code in (status.HTTP_404_NOT_FOUND, status.HTTP_422_UNPROCESSABLE_ENTITY)
@@ -1,16 +1,79 @@
-from datetime import datetime, timedelta, timezone
+import asyncio
+from contextlib import asynccontextmanager
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import logging
+import os
 import pickle
+import sys
+import threading
+import time
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
-from fastapi import HTTPException, UploadFile, status
+from fastapi import HTTPException, Request, UploadFile, status
+import cloudinary
 import pytest
+from PIL import Image
+import pytest_asyncio
+from aiosmtplib.errors import SMTPConnectError, SMTPException
 from jose import JWTError, jwt
-
-from app.models.models import Role, User
-from app.services.cloudinary import claudinary as cloud_service
-from app.services.email import send_email
+from pydantic import ValidationError
+
+from app.models.models import Base, Contact, Role, User
+from app.schemas.contact import ContactResponseSchema
+from app.services.avatar import AvatarProcessor, AvatarUpload, AvatarUploadParser, ProcessedAvatar
+from app.services.avatar_storage import LocalFileStorage, build_avatar_storage
+from app.services.cloudinary import Cloudinary, claudinary as cloud_service
+from app.services.email import MailSender, send_email
+from app.services.rate_limiter import RateLimit, RateLimitPolicies, TokenBucket
+from app.conf.config import RateLimitConfig, RateLimitRule
+from fastapi import Response
+from fastapi_limiter import FastAPILimiter
 from app.services.roles import RoleAccess
 from tests.conftest import TestFixtures
-from app.services.auth import Auth, auth_service
+from app.services.auth import Auth, auth_service, build_password_context
+from app.conf.config import (
+    AvatarConfig,
+    CompressionConfig,
+    EmailConfig,
+    OutboxConfig,
+    PasswordHashConfig,
+    WarmupConfig,
+)
+from app.services.outbox import RELEASE_RETRIES_SCRIPT, EmailOutbox, OutboxWorker
+from app.services.metrics import (
+    Metric,
+    MetricsRegistry,
+    cache_requests,
+    db_query_duration,
+    instrument_engine,
+    record_cache_lookup,
+)
+from app.services.tracing import SpanExporter, Tracer, parse_traceparent, trace_engine
+from app.middleware.tracing import TracingMiddleware
+from app.middleware.server_timing import ServerTimingMiddleware
+from app.services.server_timing import RequestTimings, TimedRoute, record, request_timings, time_engine, timed
+from app.conf.config import HealthConfig, LoggingConfig, LoopMonitorConfig, ProfilingConfig, TracingConfig
+from app.services.log import configure_logging, request_id, shutdown_logging
+from app.services.loop_monitor import LoopMonitor
+from app.services.health import HealthProber
+from app.services.lazy import LazyAttribute
+from app.services.warmup import warm_up
+from app.services.compression import Compressor, negotiate
+from app.middleware.compression import CompressionMiddleware
+from app.services.responses import FastJSONResponse, JSONRoute
+from app.services.profiler import ProfileSession, ProfileStore
+from decimal import Decimal
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.exceptions import ResponseValidationError
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
 
 
 @pytest.mark.asyncio
@@ -35,40 +98,164 @@ class TestRoles:
         assert exc_info.value.detail == "FORBIDDEN"
 
 
+class LocalSMTPServer:
+    """
+    A minimal in-process SMTP server standing in for the real mail server.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 localhost ESMTP\r\n")
+        while line := await reader.readline():
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                writer.write(b"250-localhost\r\n250 AUTH PLAIN LOGIN\r\n")
+            elif command.startswith("AUTH"):
+                self.logins += 1
+                writer.write(b"235 Authentication successful\r\n")
+            elif command == "DATA":
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                data = await reader.readuntil(b"\r\n.\r\n")
+                self.messages.append(data.decode())
+                writer.write(b"250 OK\r\n")
+            elif command == "QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+
+@pytest_asyncio.fixture
+async def smtp_server():
+    server = LocalSMTPServer()
+    await server.start()
+    yield server
+    await server.stop()
+
+
+def local_email_config(port: int, **overrides) -> EmailConfig:
+    settings = dict(
+        MAIL_SERVER="127.0.0.1",
+        MAIL_PORT=port,
+        MAIL_USERNAME="sender@example.com",
+        MAIL_PASSWORD="password",
+        MAIL_FROM="sender@example.com",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=True,
+        VALIDATE_CERTS=False,
+    )
+    settings.update(overrides)
+    return EmailConfig(**settings)
+
+
+def make_message(recipient: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "sender@example.com"
+    message["To"] = recipient
+    message["Subject"] = "test"
+    message.set_content("body")
+    return message
+
+
 @pytest.mark.asyncio
 class TestEmail:
+    async def test_mail_sender_reuses_pooled_connections(self, smtp_server):
+        sender = MailSender(local_email_config(smtp_server.port, MAIL_POOL_SIZE=2))
+        try:
+            await asyncio.gather(
+                *(sender.send(make_message(f"user{i}@example.com")) for i in range(10))
+            )
+            await sender.send(make_message("late@example.com"))
+        finally:
+            await sender.close()
+
+        assert len(smtp_server.messages) == 11
+        assert smtp_server.connections <= 2
+        assert smtp_server.logins == smtp_server.connections
+
+    async def test_mail_sender_reconnects_after_idle_timeout(self, smtp_server):
+        sender = MailSender(local_email_config(smtp_server.port, MAIL_POOL_SIZE=1, MAIL_IDLE_TIMEOUT=0.05))
+        try:
+            await sender.send(make_message("first@example.com"))
+            await asyncio.sleep(0.2)
+            await sender.send(make_message("second@example.com"))
+        finally:
+            await sender.close()
+
+        assert len(smtp_server.messages) == 2
+        assert smtp_server.connections == 2
+
+    async def test_mail_sender_reports_delivery_errors(self):
+        sender = MailSender(local_email_config(1, MAIL_POOL_SIZE=1, MAIL_TIMEOUT=1))
+        try:
+            with pytest.raises(SMTPConnectError):
+                await sender.send(make_message("user@example.com"))
+        finally:
+            await sender.close()
+
+    async def test_mail_sender_close_fails_the_batch_in_flight(self):
+        sender = MailSender(local_email_config(1, MAIL_POOL_SIZE=1, MAIL_BATCH_SIZE=3))
+        delivering = asyncio.Event()
+
+        async def hang(smtp, message):
+            delivering.set()
+            await asyncio.Event().wait()
+
+        with patch.object(sender, "_deliver", hang):
+            sends = [
+                asyncio.create_task(sender.send(make_message(f"user{i}@example.com"))) for i in range(3)
+            ]
+            await delivering.wait()
+            await asyncio.wait_for(sender.close(), 1)
+            results = await asyncio.wait_for(asyncio.gather(*sends, return_exceptions=True), 1)
+
+        assert all(isinstance(result, SMTPException) for result in results)
+
     @patch(
         "app.services.auth.auth_service.create_email_token", return_value="mocked-token"
     )
-    @patch("app.services.email.FastMail")
-    @patch("app.services.email.conf")
-    async def test_send_email_success(
-        self, mock_conf, MockFastMail, mock_create_email_token
-    ):
-        username = "john_doe"
-        email = "example@example.com"
-        host = "https://example.com"
-
-        fm = AsyncMock()
-        fm.send_message.return_value = None
-        MockFastMail.return_value = fm
-        await send_email(email=email, username=username, host=host)
+    async def test_send_email_success(self, mock_create_email_token, smtp_server):
+        sender = MailSender(local_email_config(smtp_server.port))
+        try:
+            with patch("app.services.email.mail_sender", sender):
+                await send_email(
+                    email="example@example.com", username="john_doe", host="https://example.com/"
+                )
+        finally:
+            await sender.close()
 
-        # Assertions
-        fm.send_message.assert_called_once()
-        MockFastMail.assert_called_once()
+        assert len(smtp_server.messages) == 1
+        body = smtp_server.messages[0]
+        assert "To: example@example.com" in body
+        assert "Hi john_doe" in body
+        assert "https://example.com/api/auth/confirmed_email/mocked-token" in body
 
     @patch(
         "app.services.auth.auth_service.create_email_token", return_value="mocked-token"
     )
-    @patch("app.services.email.FastMail")
-    @patch("app.services.email.conf")
-    async def test_send_email_connection_error(
-        self, mock_conf, MockFastMail, mock_create_email_token
-    ):
-        fm = AsyncMock()
-        fm.send_message.side_effect = ConnectionError("Failed to connect to the server")
-        MockFastMail.return_value = fm
+    @patch("app.services.email.mail_sender")
+    async def test_send_email_connection_error(self, mock_sender, mock_create_email_token):
+        mock_sender.send = AsyncMock(side_effect=ConnectionError("Failed to connect to the server"))
 
         with pytest.raises(ConnectionError):
             await send_email(
@@ -77,12 +264,111 @@ class TestEmail:
                 host="https://example.com",
             )
 
-        fm.send_message.assert_called_once()
+        mock_sender.send.assert_called_once()
+
+    @patch(
+        "app.services.auth.auth_service.create_email_token", return_value="mocked-token"
+    )
+    @patch("app.services.email.mail_sender")
+    async def test_send_email_smtp_error_is_logged(self, mock_sender, mock_create_email_token):
+        mock_sender.send = AsyncMock(side_effect=SMTPConnectError("refused"))
+
+        await send_email(
+            email="example@example.com",
+            username="john_doe",
+            host="https://example.com",
+        )
+
+        mock_sender.send.assert_called_once()
+
+
+@pytest.mark.asyncio
+class TestOutbox:
+    @pytest.fixture
+    def outbox_redis(self):
+        redis = AsyncMock()
+        redis.xadd.return_value = b"1-0"
+        return redis
+
+    async def test_enqueue_appends_to_stream(self, outbox_redis):
+        config = OutboxConfig(OUTBOX_MAXLEN=10)
+        entry_id = await EmailOutbox(config).enqueue(
+            outbox_redis, "user@example.com", "user", "http://testserver/"
+        )
+
+        assert entry_id == b"1-0"
+        outbox_redis.xadd.assert_awaited_once_with(
+            "mail:outbox",
+            {"email": "user@example.com", "username": "user", "host": "http://testserver/", "attempts": 0},
+            maxlen=10,
+            approximate=True,
+        )
+
+    async def test_process_acknowledges_delivered_batch(self, outbox_redis):
+        deliver = AsyncMock()
+        worker = OutboxWorker(outbox_redis, OutboxConfig(), deliver=deliver, consumer="test")
+        entries = [
+            (b"1-0", {b"email": b"a@example.com", b"username": b"a", b"host": b"h", b"attempts": b"0"}),
+            (b"2-0", {b"email": b"b@example.com", b"username": b"b", b"host": b"h", b"attempts": b"0"}),
+        ]
+
+        await worker.process(entries)
+
+        assert deliver.await_count == 2
+        assert deliver.await_args_list[0].args[0]["email"] == "a@example.com"
+        outbox_redis.xack.assert_awaited_once_with("mail:outbox", "mailers", b"1-0", b"2-0")
+        assert worker.metrics.delivered == 2
+        outbox_redis.zadd.assert_not_called()
+
+    async def test_process_schedules_retry_with_backoff(self, outbox_redis):
+        deliver = AsyncMock(side_effect=ConnectionError("down"))
+        worker = OutboxWorker(outbox_redis, OutboxConfig(OUTBOX_BACKOFF_BASE=10), deliver=deliver, consumer="test")
+        fields = {"email": "a@example.com", "username": "a", "host": "h", "attempts": "0"}
+
+        before = datetime.now().timestamp()
+        await worker.process([("1-0", fields)])
+
+        (key, scheduled), = [call.args for call in outbox_redis.zadd.await_args_list]
+        (payload, due_at), = scheduled.items()
+        assert key == "mail:outbox:retry"
+        assert json.loads(payload)["attempts"] == 1
+        assert before + 5 <= due_at <= before + 11
+        outbox_redis.xack.assert_awaited_once()
+        assert worker.metrics.retried == 1
+
+    async def test_process_dead_letters_after_max_attempts(self, outbox_redis):
+        deliver = AsyncMock(side_effect=ConnectionError("down"))
+        worker = OutboxWorker(outbox_redis, OutboxConfig(OUTBOX_MAX_ATTEMPTS=3), deliver=deliver, consumer="test")
+        fields = {"email": "a@example.com", "username": "a", "host": "h", "attempts": "2"}
+
+        await worker.process([("1-0", fields)])
+
+        stream, dead_fields = outbox_redis.xadd.await_args.args
+        assert stream == "mail:outbox:dead"
+        assert outbox_redis.xadd.await_args.kwargs == {"maxlen": 100000, "approximate": True}
+        assert dead_fields["attempts"] == 3
+        assert "down" in dead_fields["error"]
+        outbox_redis.zadd.assert_not_called()
+        assert worker.metrics.dead == 1
+
+    async def test_release_due_retries(self, outbox_redis):
+        payload = json.dumps({"email": "a@example.com", "username": "a", "host": "h", "attempts": 1})
+        outbox_redis.zrangebyscore.return_value = [payload]
+        worker = OutboxWorker(outbox_redis, OutboxConfig(), consumer="test")
+
+        await worker.release_due_retries()
+
+        # Removed from the retry set and re-added to the stream in one script
+        outbox_redis.eval.assert_awaited_once_with(
+            RELEASE_RETRIES_SCRIPT, 2, "mail:outbox:retry", "mail:outbox", 100000, payload
+        )
+        outbox_redis.zrem.assert_not_called()
+        outbox_redis.xadd.assert_not_called()
 
 
 @pytest.mark.asyncio
 class TestCloudinary:
-    @patch("app.services.cloudinary.upload")
+    @patch("cloudinary.uploader.upload")
     async def test_upload_avatar_to_cloudinary_public_id_missing(self, mock_upload):
         # Setup mock return values
         mock_upload.return_value = {"version": "123"}
@@ -101,8 +387,8 @@ class TestCloudinary:
             == "Failed to upload to Cloudinary: 500: Failed to retrieve public_id from Cloudinary"
         )
 
-    @patch("app.services.cloudinary.upload")
-    @patch("app.services.cloudinary.cloudinary_url")
+    @patch("cloudinary.uploader.upload")
+    @patch("cloudinary.utils.cloudinary_url")
     async def test_upload_avatar_to_cloudinary_exception(
         self, mock_cloudinary_url, mock_upload
     ):
@@ -124,8 +410,8 @@ class TestCloudinary:
         assert exc_info.value.status_code == 500
         assert "Failed to upload to Cloudinary: Upload failed" == exc_info.value.detail
 
-    @patch("app.services.cloudinary.upload")
-    @patch("app.services.cloudinary.cloudinary_url")
+    @patch("cloudinary.uploader.upload")
+    @patch("cloudinary.utils.cloudinary_url")
     async def test_upload_avatar_to_cloudinary(self, mock_cloudinary_url, mock_upload):
         # Setup mock return values
         mock_upload.return_value = {"public_id": "sample_public_id", "version": "123"}
@@ -142,7 +428,10 @@ class TestCloudinary:
 
         # Assertions
         mock_upload.assert_called_once_with(
-            mock_file.file, folder="web13/example@example.com", overwrite=True
+            mock_file.file,
+            folder="web13/example@example.com",
+            overwrite=True,
+            timeout=cloud_service.upload_timeout,
         )
         mock_cloudinary_url.assert_called_once_with(
             "sample_public_id", width=250, height=250, crop="fit", version="123"
@@ -150,6 +439,330 @@ class TestCloudinary:
         assert result_url == "https://example.com/image_example"
 
 
+class SlowUploadHandler(BaseHTTPRequestHandler):
+    delay = 0.5
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.delay)
+        body = json.dumps({"public_id": "web13/example@example.com/avatar", "version": 7}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_cloudinary():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowUploadHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    cloudinary.config(upload_prefix=f"http://127.0.0.1:{server.server_port}")
+    yield server
+    cloudinary.config(upload_prefix=None)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+class TestCloudinaryNonBlocking:
+    async def test_upload_does_not_block_event_loop(self, slow_cloudinary):
+        ticks = 0
+
+        async def other_requests():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.02)
+                ticks += 1
+
+        ticker = asyncio.create_task(other_requests())
+        mock_file = Mock(spec=UploadFile)
+        mock_file.file = io.BytesIO(b"fake image bytes")
+        try:
+            result_url = await cloud_service.upload_avatar_to_cloudinary(
+                file=mock_file, user_email="example@example.com"
+            )
+        finally:
+            ticker.cancel()
+
+        assert result_url.endswith("/v7/web13/example%40example.com/avatar")
+        # The loop kept running for most of the 0.5s upload
+        assert ticks >= 10
+
+    async def test_upload_concurrency_is_bounded(self, slow_cloudinary):
+        SlowUploadHandler.delay = 0.2
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            with patch.object(Cloudinary, "executor", executor):
+                started = time.monotonic()
+                await asyncio.gather(
+                    *(
+                        cloud_service.upload_avatar_to_cloudinary(
+                            file=Mock(spec=UploadFile, file=io.BytesIO(b"img")),
+                            user_email="example@example.com",
+                        )
+                        for _ in range(4)
+                    )
+                )
+                elapsed = time.monotonic() - started
+        finally:
+            SlowUploadHandler.delay = 0.5
+            executor.shutdown()
+
+        assert 0.4 <= elapsed < 0.8
+
+    async def test_upload_timeout(self, slow_cloudinary):
+        with patch.object(Cloudinary, "upload_timeout", 0.1):
+            with pytest.raises(HTTPException) as exc_info:
+                await cloud_service.upload_avatar_to_cloudinary(
+                    file=Mock(spec=UploadFile, file=io.BytesIO(b"img")),
+                    user_email="example@example.com",
+                )
+        assert exc_info.value.status_code == 500
+
+
+def make_image(size: tuple[int, int], image_format: str = "PNG") -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, "red").save(output, format=image_format)
+    return output.getvalue()
+
+
+def multipart_request(
+    content: bytes,
+    content_type: str = "image/png",
+    chunk_size: int = 7,
+    content_length: int | None = None,
+) -> Request:
+    body = (
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="note"\r\n\r\n'
+        b"hello\r\n"
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="avatar"\r\n'
+        b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + content + b"\r\n"
+        b"--boundary--\r\n"
+    )
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+    received = []
+
+    async def receive():
+        chunk = chunks.pop(0)
+        received.append(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    headers = [(b"content-type", b"multipart/form-data; boundary=boundary")]
+    headers.append((b"content-length", str(content_length or len(body)).encode()))
+    request = Request({"type": "http", "method": "POST", "headers": headers}, receive)
+    request.received = received
+    return request
+
+
+PNG_CONTENT = b"\x89PNG\r\n\x1a\n" + b"x" * 992
+
+
+def make_upload(content: bytes, spool_bytes: int = 1024 * 1024) -> AvatarUpload:
+    upload = AvatarUpload("image/png", spool_bytes)
+    upload.write(content)
+    upload.finish()
+    return upload
+
+
+@pytest.mark.asyncio
+class TestAvatarUploadParser:
+    @pytest.fixture
+    def parser(self):
+        return AvatarUploadParser(AvatarConfig(AVATAR_MAX_BYTES=1024, AVATAR_SPOOL_BYTES=100))
+
+    async def test_parse_streams_file_to_disk(self, parser):
+        upload = await parser.parse(multipart_request(PNG_CONTENT))
+        path = upload.path
+        try:
+            assert upload.content_type == "image/png"
+            assert upload.size == len(PNG_CONTENT)
+            assert upload.digest == hashlib.sha256(PNG_CONTENT).hexdigest()
+            assert upload.source == path
+            assert upload.read() == PNG_CONTENT
+        finally:
+            upload.close()
+        assert not os.path.exists(path)
+
+    async def test_parse_keeps_small_file_in_memory(self, parser):
+        upload = await parser.parse(multipart_request(PNG_CONTENT[:50]))
+
+        assert upload.path is None
+        assert upload.source == PNG_CONTENT[:50]
+
+    async def test_parse_rejects_large_content_length_before_reading(self, parser):
+        request = multipart_request(PNG_CONTENT, content_length=200 * 1024)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await parser.parse(request)
+
+        assert exc_info.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert request.received == []
+
+    async def test_parse_stops_reading_at_the_cap(self, parser):
+        request = multipart_request(PNG_CONTENT + b"x" * 1000)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await parser.parse(request)
+
+        assert exc_info.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert len(request.received) < 200 // 7 + 1024 // 7 + 2
+
+    async def test_parse_rejects_declared_type(self, parser):
+        request = multipart_request(b"%PDF-1.7" + b"x" * 900, content_type="application/pdf")
+
+        with pytest.raises(HTTPException) as exc_info:
+            await parser.parse(request)
+
+        assert exc_info.value.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        assert len(request.received) < 30
+
+    async def test_parse_rejects_magic_bytes(self, parser):
+        request = multipart_request(b"<html>" + b"x" * 900)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await parser.parse(request)
+
+        assert exc_info.value.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        assert len(request.received) < 30
+
+    async def test_parse_missing_file(self, parser):
+        request = multipart_request(PNG_CONTENT)
+        parser.field = "avatar"
+
+        with pytest.raises(HTTPException) as exc_info:
+            await parser.parse(request)
+
+        assert exc_info.value.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+class TestAvatarProcessor:
+    @pytest.fixture
+    def processor(self):
+        processor = AvatarProcessor(AvatarConfig(AVATAR_PROCESS_WORKERS=0))
+        yield processor
+        processor.close()
+
+    async def test_process_resizes_and_reencodes(self, processor):
+        avatar = await processor.process(make_upload(make_image((1200, 600))))
+
+        assert avatar.content_type == "image/webp"
+        with Image.open(io.BytesIO(avatar.content)) as image:
+            assert image.format == "WEBP"
+            assert image.size == (250, 125)
+
+    async def test_process_in_worker_processes(self):
+        processor = AvatarProcessor(AvatarConfig(AVATAR_PROCESS_WORKERS=1, AVATAR_FORMAT="JPEG"))
+        try:
+            avatar = await processor.process(make_upload(make_image((500, 500)), spool_bytes=0))
+        finally:
+            processor.close()
+
+        assert avatar.content_type == "image/jpeg"
+        assert avatar.content.startswith(b"\xff\xd8")
+
+    @pytest.mark.parametrize("size", [(1500, 1000), (3000, 3000)])
+    async def test_process_rejects_too_many_pixels(self, size):
+        processor = AvatarProcessor(AvatarConfig(AVATAR_PROCESS_WORKERS=0, AVATAR_MAX_PIXELS=1000 * 1000))
+        output = io.BytesIO()
+        # Bilevel PNGs compress to a few kilobytes whatever their dimensions
+        Image.new("1", size).save(output, format="PNG")
+
+        with pytest.raises(HTTPException) as exc_info:
+            await processor.process(make_upload(output.getvalue()))
+
+        assert exc_info.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert "too large" in exc_info.value.detail.lower()
+
+    async def test_process_invalid_image(self, processor):
+        with pytest.raises(HTTPException) as exc_info:
+            await processor.process(make_upload(b"not an image"))
+
+        assert exc_info.value.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    @patch("cloudinary.uploader.upload")
+    @patch("cloudinary.utils.cloudinary_url")
+    async def test_upload_processed_avatar_by_hash(self, mock_cloudinary_url, mock_upload):
+        mock_upload.return_value = {"public_id": "web13/example@example.com/abc", "version": "1"}
+        mock_cloudinary_url.return_value = ("https://example.com/abc", {})
+        content = io.BytesIO(b"resized")
+
+        await cloud_service.upload_avatar_to_cloudinary(content, "example@example.com", public_id="abc")
+
+        mock_upload.assert_called_once_with(
+            content,
+            folder="web13/example@example.com",
+            overwrite=True,
+            timeout=cloud_service.upload_timeout,
+            public_id="abc",
+        )
+
+
+@pytest.mark.asyncio
+class TestLocalFileStorage:
+    async def test_save_generates_sizes(self, tmp_path):
+        config = AvatarConfig(
+            AVATAR_STORAGE="local",
+            AVATAR_LOCAL_DIR=str(tmp_path),
+            AVATAR_LOCAL_SIZES=[64, 128],
+            AVATAR_PROCESS_WORKERS=0,
+        )
+        storage = build_avatar_storage(config, AvatarProcessor(config))
+        upload = make_upload(make_image((600, 600)))
+        digest = upload.digest
+
+        url = await storage.save("example@example.com", upload)
+
+        assert isinstance(storage, LocalFileStorage)
+        assert url == f"/api/avatars/{digest}/250.webp"
+        assert sorted(path.name for path in (tmp_path / digest).iterdir()) == [
+            "128.webp",
+            "250.webp",
+            "64.webp",
+        ]
+        assert storage.path(digest, "64.webp") == tmp_path / digest / "64.webp"
+        assert storage.path(digest, "32.webp") is None
+
+    async def test_save_decodes_the_upload_once(self, tmp_path):
+        config = AvatarConfig(
+            AVATAR_STORAGE="local",
+            AVATAR_LOCAL_DIR=str(tmp_path),
+            AVATAR_LOCAL_SIZES=[64, 128],
+            AVATAR_PROCESS_WORKERS=0,
+        )
+        storage = LocalFileStorage(config, AvatarProcessor(config))
+        upload = make_upload(make_image((600, 300)))
+
+        with patch("PIL.Image.open", wraps=Image.open) as mock_open:
+            await storage.save("example@example.com", upload)
+
+        mock_open.assert_called_once()
+        for size in (64, 128, 250):
+            with Image.open(tmp_path / upload.digest / f"{size}.webp") as image:
+                assert image.size == (size, size // 2)
+
+    async def test_save_keeps_existing_files(self, tmp_path):
+        config = AvatarConfig(AVATAR_STORAGE="local", AVATAR_LOCAL_DIR=str(tmp_path), AVATAR_LOCAL_SIZES=[])
+        processor = AvatarProcessor(config)
+        processor.process_sizes = AsyncMock(return_value={250: ProcessedAvatar(b"new", "image/webp")})
+        storage = LocalFileStorage(config, processor)
+        upload = make_upload(b"upload")
+        (tmp_path / upload.digest).mkdir()
+        (tmp_path / upload.digest / "250.webp").write_bytes(b"old")
+
+        await storage.save("example@example.com", upload)
+
+        assert (tmp_path / upload.digest / "250.webp").read_bytes() == b"old"
+        assert [path.name for path in (tmp_path / upload.digest).iterdir()] == ["250.webp"]
+
+
 class TestAuthSync:
     @patch("app.services.auth.Auth.pwd_context")
     def test_verify_password_success(self, mock_pwd_context):
@@ -172,6 +785,24 @@ class TestAuthSync:
         mock_pwd_context.hash.assert_called_once_with("password")
         assert result == "mock_hash_password"
 
+    def test_needs_rehash_on_cost_change(self):
+        old_context = build_password_context(PasswordHashConfig(BCRYPT_ROUNDS=4))
+        new_context = build_password_context(PasswordHashConfig(BCRYPT_ROUNDS=5))
+        hashed = old_context.hash("password")
+        with patch.object(Auth, "pwd_context", new_context):
+            assert auth_service.needs_rehash(hashed) is True
+            assert auth_service.needs_rehash(new_context.hash("password")) is False
+            assert auth_service.verify_password("password", hashed) is True
+
+    def test_needs_rehash_on_deprecated_scheme(self):
+        context = build_password_context(
+            PasswordHashConfig(PASSWORD_SCHEMES=["sha256_crypt", "bcrypt"], BCRYPT_ROUNDS=4)
+        )
+        hashed = build_password_context(PasswordHashConfig(BCRYPT_ROUNDS=4)).hash("password")
+        with patch.object(Auth, "pwd_context", context):
+            assert auth_service.verify_password("password", hashed) is True
+            assert auth_service.needs_rehash(hashed) is True
+
 
 @pytest.mark.asyncio
 class TestAuthAsync(TestFixtures):
@@ -204,6 +835,18 @@ class TestAuthAsync(TestFixtures):
         assert abs(decoded_token["exp"] - expected_expiration.timestamp()) < 60
         assert decoded_token["scope"] == "access_token"
 
+    async def test_access_token_carries_the_role(self):
+        user = User(email="admin@example.com", role=Role.admin)
+        token = await auth_service.create_access_token(auth_service.access_token_data(user))
+        refresh = await auth_service.create_refresh_token({"sub": user.email})
+
+        claims = auth_service.decode_access_token(token)
+
+        assert claims["sub"] == "admin@example.com"
+        assert claims["role"] == "admin"
+        assert auth_service.decode_access_token(refresh) is None
+        assert auth_service.decode_access_token("garbage") is None
+
     async def test_create_access_token_with_custom_expiration(self):
         data = {"sub": "user123"}
         expires_delta = timedelta(minutes=30)
@@ -430,3 +1073,765 @@ class TestAuthAsync(TestFixtures):
 
         assert excinfo.value.status_code == status.HTTP_403_FORBIDDEN
         assert excinfo.value.detail == "Invalid email verification token"
+
+
+class FakeLimiterRedis:
+    def __init__(self):
+        self.counters = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakeLimiterPipeline(self)
+
+
+class FakeLimiterPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    def incrby(self, key, amount):
+        self.commands.append(("incrby", key, amount))
+
+    def expire(self, key, seconds):
+        self.commands.append(("expire", key, seconds))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        results = []
+        for command, key, value in self.commands:
+            if command == "incrby":
+                self.redis.counters[key] = self.redis.counters.get(key, 0) + value
+                results.append(self.redis.counters[key])
+            else:
+                results.append(True)
+        return results
+
+
+@pytest.fixture
+def policies():
+    config = RateLimitConfig(
+        RATE_LIMIT_POLICIES={
+            "default": {"default": RateLimitRule(times=3, seconds=20)},
+            "contacts:list": {
+                "default": RateLimitRule(times=100, seconds=60),
+                "admin": RateLimitRule(times=1000, seconds=60),
+            },
+        }
+    )
+    return RateLimitPolicies(config)
+
+
+class TestRateLimitPolicies:
+    def test_policy_lookup(self, policies):
+        assert policies.rule("contacts:list", "admin").times == 1000
+        assert policies.rule("contacts:list", "user").times == 100
+        assert policies.rule("contacts:get", "admin").times == 3
+
+    @pytest.mark.asyncio
+    async def test_policy_reload_from_file(self, tmp_path):
+        policy_file = tmp_path / "policies.json"
+        policy_file.write_text('{"contacts:get": {"default": {"times": 7, "seconds": 10}}}')
+        policies = RateLimitPolicies(
+            RateLimitConfig(RATE_LIMIT_POLICY_FILE=str(policy_file), RATE_LIMIT_RELOAD_INTERVAL=0)
+        )
+        await policies.maybe_reload()
+        assert policies.rule("contacts:get", "user").times == 7
+
+        policy_file.write_text('{"contacts:get": {"default": {"times": 9, "seconds": 10}}}')
+        os.utime(policy_file, (1, 1))
+        await policies.maybe_reload()
+        assert policies.rule("contacts:get", "user").times == 9
+        assert policies.rule("contacts:list", "user").times == 3
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("content", ['{"contacts:get": {"default": {"times": 5}}}', '{"contacts:get": '])
+    async def test_invalid_policy_file_keeps_current_table(self, tmp_path, caplog, content):
+        policy_file = tmp_path / "policies.json"
+        policy_file.write_text('{"contacts:get": {"default": {"times": 7, "seconds": 10}}}')
+        policies = RateLimitPolicies(
+            RateLimitConfig(RATE_LIMIT_POLICY_FILE=str(policy_file), RATE_LIMIT_RELOAD_INTERVAL=0)
+        )
+        await policies.maybe_reload()
+
+        policy_file.write_text(content)
+        os.utime(policy_file, (1, 1))
+        with caplog.at_level(logging.ERROR, logger="app.services.rate_limiter"), patch.object(
+            policies, "reload", wraps=policies.reload
+        ) as reload:
+            await policies.maybe_reload()
+            await policies.maybe_reload()
+
+        assert policies.rule("contacts:get", "user").times == 7
+        assert "Invalid rate limit policy file" in caplog.text
+        reload.assert_called_once()
+
+
+@pytest.mark.asyncio
+class TestRateLimit:
+    @pytest.fixture
+    def limiter_redis(self):
+        fake_redis = FakeLimiterRedis()
+        with patch.object(FastAPILimiter, "redis", fake_redis), patch.object(
+            FastAPILimiter, "prefix", "test"
+        ):
+            yield fake_redis
+
+    async def test_exact_mode_uses_sliding_window_script(self, limiter_redis, policies):
+        limiter = RateLimit("contacts:list", mode="exact", policies=policies)
+        limiter_redis.script_load = AsyncMock(return_value="sha")
+        limiter_redis.evalsha = AsyncMock(return_value=[1, 41, 1500])
+        response = Response()
+
+        with patch.object(RateLimit, "script_sha", None):
+            await limiter(MagicMock(), response, User(id=5, role=Role.user))
+
+        args = limiter_redis.evalsha.await_args.args
+        assert args[0] == "sha" and args[1] == 2
+        assert args[2].startswith("test:contacts:list:5:100/60:")
+        assert args[4:6] == (100, 60000)
+        assert response.headers["X-RateLimit-Limit"] == "100"
+        assert response.headers["X-RateLimit-Remaining"] == "41"
+        assert response.headers["X-RateLimit-Reset"] == "2"
+
+    async def test_exact_mode_rejects_with_retry_after(self, limiter_redis, policies):
+        limiter = RateLimit("contacts:get", mode="exact", policies=policies)
+        limiter_redis.evalsha = AsyncMock(return_value=[0, 0, 4200])
+
+        with patch.object(RateLimit, "script_sha", "sha"), pytest.raises(HTTPException) as exc_info:
+            await limiter(MagicMock(), Response(), User(id=5, role=Role.user))
+        assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert exc_info.value.headers["Retry-After"] == "5"
+        assert exc_info.value.headers["X-RateLimit-Remaining"] == "0"
+
+    async def test_approximate_mode_batches_redis_round_trips(self, limiter_redis, policies):
+        limiter = RateLimit("contacts:list", mode="approximate", sync_batch=5, sync_interval=60, policies=policies)
+        user = User(id=1, role=Role.user)
+
+        for _ in range(20):
+            await limiter(MagicMock(), Response(), user)
+
+        assert limiter_redis.round_trips == limiter.redis_round_trips
+        assert limiter.redis_round_trips <= 5
+        pending = sum(bucket.pending for bucket in limiter._buckets.values())
+        assert sum(limiter_redis.counters.values()) + pending == 20
+        assert pending < limiter.sync_batch
+
+    async def test_approximate_mode_keys_on_user(self, limiter_redis, policies):
+        limiter = RateLimit("contacts:get", mode="approximate", policies=policies)
+        for _ in range(3):
+            await limiter(MagicMock(), Response(), User(id=1, role=Role.user))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await limiter(MagicMock(), Response(), User(id=1, role=Role.user))
+        assert exc_info.value.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert "Retry-After" in exc_info.value.headers
+        await limiter(MagicMock(), Response(), User(id=2, role=Role.user))
+
+    async def test_approximate_mode_scales_sync_to_low_rate_rules(self, limiter_redis, policies):
+        limiter = RateLimit("contacts:get", mode="approximate", sync_batch=5, sync_interval=1.0, policies=policies)
+        user = User(id=1, role=Role.user)
+
+        clock = [100.0]
+        with patch("app.services.rate_limiter.time.monotonic", lambda: clock[0]):
+            for _ in range(3):
+                await limiter(MagicMock(), Response(), user)
+                clock[0] += 2
+
+        # A 3 per 20s rule syncs once its 3 hits are in, not on every hit spaced over 1s
+        assert limiter.redis_round_trips == 1
+        assert sum(limiter_redis.counters.values()) == 3
+
+    async def test_sweep_measures_buckets_against_their_own_window(self, policies):
+        limiter = RateLimit("contacts:list", mode="approximate", policies=policies)
+        limiter._buckets = {
+            "long": TokenBucket(100, 60, now=100.0, window=1),
+            "short": TokenBucket(3, 1, now=100.0, window=50),
+        }
+
+        limiter._sweep(now=110.0)
+
+        assert set(limiter._buckets) == {"long"}
+
+    async def test_approximate_mode_stays_within_tolerance_across_workers(self, limiter_redis, policies):
+        times, sync_batch = 100, 2
+        workers = [
+            RateLimit("contacts:list", mode="approximate", sync_batch=sync_batch, sync_interval=60, policies=policies)
+            for _ in range(3)
+        ]
+        user = User(id=1, role=Role.user)
+        admitted = 0
+        for _ in range(50):
+            for worker in workers:
+                try:
+                    await worker(MagicMock(), Response(), user)
+                    admitted += 1
+                except HTTPException:
+                    pass
+
+        assert times <= admitted <= times + (len(workers) - 1) * sync_batch
+
+    async def test_explicit_settings_are_kept_or_rejected(self, policies):
+        limiter = RateLimit("contacts:list", mode="approximate", sync_batch=1, sync_interval=0, policies=policies)
+
+        assert (limiter.sync_batch, limiter.sync_interval) == (1, 0)
+        with pytest.raises(ValueError):
+            RateLimit("contacts:list", mode="approximate", sync_batch=0, policies=policies)
+        with pytest.raises(ValueError):
+            RateLimit("contacts:list", mode="", policies=policies)
+
+    async def test_config_rejects_empty_sync_batch(self):
+        with pytest.raises(ValidationError):
+            RateLimitConfig(RATE_LIMIT_SYNC_BATCH=0)
+
+
+class TestMetrics:
+    def test_metric_kinds_must_create_children(self):
+        with pytest.raises(TypeError):
+            Metric("untyped_total", "No child type.")
+
+    def test_render_counter_and_histogram(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests.", ("route",))
+        latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        requests.labels('/a"b').inc()
+        requests.labels('/a"b').inc(2)
+        latency.observe(0.05)
+        latency.observe(0.1)
+        latency.observe(5)
+
+        text = registry.render()
+
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{route="/a\\"b"} 3' in text
+        assert 'latency_seconds_bucket{le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{le="1"} 2' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+        assert "latency_seconds_sum 5.15" in text
+        assert "latency_seconds_count 3" in text
+
+    def test_labels_must_match(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("hits_total", "Hits.", ("namespace", "result"))
+        with pytest.raises(ValueError):
+            counter.labels("contacts")
+
+    def test_collect_callbacks_run_before_render(self):
+        registry = MetricsRegistry()
+        gauge = registry.gauge("depth", "Depth.")
+        registry.on_collect(lambda: gauge.set(7))
+        registry.on_collect(Mock(side_effect=RuntimeError("broken")))
+        assert "depth 7" in registry.render()
+
+    def test_record_cache_lookup_uses_key_namespace(self):
+        hits = cache_requests.labels("contact", "hit")
+        before = hits.value
+        record_cache_lookup("contact:pk=1", True)
+        assert hits.value == before + 1
+
+    @pytest.mark.asyncio
+    async def test_instrument_engine_times_queries(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'metrics.db'}")
+        instrument_engine(engine)
+        selects = db_query_duration.labels("SELECT")
+        before = sum(selects.counts)
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+        await engine.dispose()
+        assert sum(selects.counts) == before + 1
+
+
+class MemoryExporter(SpanExporter):
+    def __init__(self, config=None):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def memory_tracer():
+    exporter = MemoryExporter()
+    tracer = Tracer(TracingConfig(TRACING_SAMPLE_RATIO=1.0, TRACING_EXPORT_INTERVAL=0.01), exporter)
+    yield tracer, exporter
+    tracer.shutdown()
+
+
+class TestTracing:
+    def test_parse_traceparent(self):
+        header = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        assert parse_traceparent(header) == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)
+        assert parse_traceparent(header[:-1] + "0")[2] is False
+        assert parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+        assert parse_traceparent("garbage") is None
+        assert parse_traceparent(None) is None
+
+    @pytest.mark.asyncio
+    async def test_spans_nest_within_a_trace(self, memory_tracer):
+        tracer, exporter = memory_tracer
+
+        @tracer.traced("repository.load")
+        async def load():
+            with tracer.span("inner", rows=3):
+                return 42
+
+        with tracer.start_trace("GET /contacts") as root:
+            assert await load() == 42
+        tracer.shutdown()
+
+        spans = {span["name"]: span for span in exporter.spans}
+        assert set(spans) == {"GET /contacts", "repository.load", "inner"}
+        assert spans["repository.load"]["parent_id"] == root.span_id
+        assert spans["inner"]["parent_id"] == spans["repository.load"]["span_id"]
+        assert spans["inner"]["attributes"] == {"rows": 3}
+        assert len({span["trace_id"] for span in exporter.spans}) == 1
+
+    def test_unsampled_parent_disables_spans(self, memory_tracer):
+        tracer, exporter = memory_tracer
+        header = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00"
+        with tracer.start_trace("GET /contacts", header) as root:
+            with tracer.span("inner") as inner:
+                assert root is None and inner is None
+        tracer.shutdown()
+        assert exporter.spans == []
+
+    def test_sample_ratio(self):
+        tracer = Tracer(TracingConfig(TRACING_SAMPLE_RATIO=0.0), MemoryExporter())
+        with tracer.start_trace("GET /contacts") as root:
+            assert root is None
+
+    def test_errors_are_recorded(self, memory_tracer):
+        tracer, exporter = memory_tracer
+        with pytest.raises(ValueError):
+            with tracer.start_trace("job"):
+                raise ValueError("boom")
+        tracer.shutdown()
+        assert exporter.spans[0]["error"] == "ValueError('boom')"
+
+    @pytest.mark.asyncio
+    async def test_trace_engine_records_statements(self, memory_tracer, tmp_path):
+        tracer, exporter = memory_tracer
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'trace.db'}")
+        trace_engine(engine, tracer)
+        with tracer.start_trace("request") as root:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        await engine.dispose()
+        tracer.shutdown()
+
+        query = next(span for span in exporter.spans if span["name"] == "db.query")
+        assert query["parent_id"] == root.span_id
+        assert query["attributes"]["db.statement"] == "SELECT 1"
+
+    def test_middleware_continues_incoming_trace(self, memory_tracer):
+        tracer, exporter = memory_tracer
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware, tracer=tracer)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: int):
+            return {"id": item_id}
+
+        header = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        response = TestClient(app).get("/items/1", headers={"traceparent": header})
+        tracer.shutdown()
+
+        assert response.headers["traceparent"].startswith("00-4bf92f3577b34da6a3ce929d0e0e4736-")
+        [span] = exporter.spans
+        assert span["name"] == "GET /items/{item_id}"
+        assert span["parent_id"] == "00f067aa0ba902b7"
+        assert span["attributes"]["http.status_code"] == 200
+
+
+class TestServerTiming:
+    def test_header_value(self):
+        timings = RequestTimings()
+        timings.add("db", 0.002)
+        timings.add("db", 0.001)
+        timings.add("auth", 0.0005)
+
+        assert timings.header_value(0.01) == (
+            'auth;dur=0.50;desc="Authentication", '
+            'db;dur=3.00;desc="Database (2 queries)", '
+            "total;dur=10.00"
+        )
+
+    def test_record_outside_request_is_ignored(self):
+        record("db", 1.0)
+        assert request_timings.get() is None
+
+    def test_disabled_route_keeps_the_plain_endpoint(self):
+        async def items():
+            return []
+
+        route = TimedRoute("/items", items)
+
+        assert route.dependant.call is items
+        assert route.get_route_handler().__name__ != "timed_handler"
+
+    @patch("app.services.server_timing.metrics_config.SERVER_TIMING_ENABLED", True)
+    def test_middleware_reports_request_breakdown(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'timing.db'}")
+        time_engine(engine)
+        app = FastAPI()
+        app.router.route_class = TimedRoute
+        app.add_middleware(ServerTimingMiddleware)
+
+        @timed("auth")
+        async def authenticate():
+            return "user"
+
+        @app.get("/items")
+        async def items(user: str = Depends(authenticate)):
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                await connection.execute(text("SELECT 2"))
+            return [{"id": 1}]
+
+        response = TestClient(app).get("/items")
+
+        header = response.headers["server-timing"]
+        names = [entry.split(";")[0] for entry in header.split(", ")]
+        assert names == ["auth", "db", "serialize", "app", "total"]
+        assert 'desc="Database (2 queries)"' in header
+        asyncio.run(engine.dispose())
+
+
+def busy_loop(seconds: float) -> int:
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += 1
+    return total
+
+
+class TestProfiler:
+    def test_session_samples_call_tree_and_allocations(self):
+        config = ProfilingConfig(PROFILING_INTERVAL=0.001, PROFILING_TRACE_ALLOCATIONS=True)
+        session = ProfileSession("process", config, [threading.get_ident()])
+
+        session.start()
+        busy_loop(0.1)
+        kept = [bytearray(1024) for _ in range(100)]
+        report = session.stop(path="/test")
+
+        assert report.samples > 0
+        assert report.details == {"path": "/test"}
+        assert "busy_loop" in report.render_text()
+        assert report.allocations
+        assert report.summary()["path"] == "/test"
+        del kept
+
+    def test_store_keeps_most_recent_reports(self):
+        config = ProfilingConfig(PROFILING_INTERVAL=0.01, PROFILING_TRACE_ALLOCATIONS=False)
+        store = ProfileStore(2)
+        reports = []
+        for _ in range(3):
+            session = ProfileSession("process", config)
+            session.start()
+            reports.append(session.stop())
+            store.add(reports[-1])
+
+        assert store.get(reports[0].id) is None
+        assert [report.id for report in store.list()] == [reports[2].id, reports[1].id]
+
+
+class TestLoopMonitor:
+    @pytest.mark.asyncio
+    async def test_reports_blocking_call_once(self):
+        monitor = LoopMonitor(LoopMonitorConfig(LOOP_MONITOR_INTERVAL=0.01, LOOP_BLOCK_THRESHOLD=0.05))
+        await monitor.start()
+        await asyncio.sleep(0.05)
+
+        def blocking_handler():
+            time.sleep(0.3)
+
+        blocking_handler()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+        [block] = monitor.blocks
+        assert "blocking_handler" in block.stack
+        assert monitor.max_lag >= 0.25
+
+
+class TestLogging:
+    def test_json_records_carry_request_id_and_extra_fields(self):
+        stream = io.StringIO()
+        configure_logging(LoggingConfig(LOG_LEVELS={"tests.quiet": "WARNING"}), stream)
+        token = request_id.set("req-1")
+        try:
+            logging.getLogger("tests.logging").info("Hello %s", "world", extra={"route": "/x"})
+            logging.getLogger("tests.quiet").info("Not written")
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logging.getLogger("tests.logging").exception("Failed")
+        finally:
+            request_id.reset(token)
+            shutdown_logging()
+
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert first["message"] == "Hello world"
+        assert first["request_id"] == "req-1"
+        assert first["route"] == "/x"
+        assert first["logger"] == "tests.logging"
+        assert second["level"] == "ERROR"
+        assert "ValueError: boom" in second["exception"]
+
+    def test_debug_records_are_sampled(self):
+        stream = io.StringIO()
+        configure_logging(LoggingConfig(LOG_LEVEL="DEBUG", LOG_DEBUG_SAMPLE_RATIO=0.0), stream)
+        try:
+            logging.getLogger("tests.logging").debug("Sampled out")
+            logging.getLogger("tests.logging").info("Kept")
+        finally:
+            shutdown_logging()
+
+        assert [json.loads(line)["message"] for line in stream.getvalue().splitlines()] == ["Kept"]
+
+    def test_full_queue_drops_records(self):
+        handler = configure_logging(LoggingConfig(LOG_QUEUE_SIZE=1), io.StringIO())
+        shutdown_logging()
+        handler.queue.put_nowait("occupied")
+
+        handler.handle(logging.makeLogRecord({"msg": "dropped", "levelno": logging.INFO}))
+
+        assert handler.dropped == 1
+
+    def test_prepare_leaves_the_record_to_other_handlers(self):
+        handler = configure_logging(LoggingConfig(), io.StringIO())
+        shutdown_logging()
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.makeLogRecord(
+                {"msg": "Failed %s", "args": ("x",), "levelno": logging.ERROR, "exc_info": sys.exc_info()}
+            )
+
+        prepared = handler.prepare(record)
+
+        assert prepared is not record
+        assert prepared.msg == "Failed x" and prepared.args is None and prepared.exc_info is None
+        assert "ValueError: boom" in prepared.exc_text
+        assert record.msg == "Failed %s" and record.args == ("x",)
+        assert record.exc_info[0] is ValueError
+
+
+class FakeRedisManager:
+    def __init__(self, redis):
+        self.redis = redis
+
+    @asynccontextmanager
+    async def session(self):
+        yield self.redis
+
+
+class TestHealthProber:
+    @pytest_asyncio.fixture
+    async def database(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'health.db'}")
+        yield Mock(engine=engine, max_overflow=10)
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_ready_when_dependencies_respond(self, database):
+        prober = HealthProber(HealthConfig(), database, FakeRedisManager(AsyncMock()), LoopMonitor())
+        assert prober.readiness()["status"] == "starting"
+
+        await prober.probe()
+
+        report = prober.readiness()
+        assert report["status"] == "ok"
+        assert set(report["checks"]) == {"database", "redis", "pool", "event_loop"}
+
+    @pytest.mark.asyncio
+    async def test_degraded_when_pool_is_saturated(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=0)
+        prober = HealthProber(
+            HealthConfig(), Mock(engine=engine, max_overflow=0), FakeRedisManager(AsyncMock()), LoopMonitor()
+        )
+        try:
+            async with engine.connect():
+                pool = prober._check_pool()
+        finally:
+            await engine.dispose()
+
+        assert pool == {"status": "degraded", "checked_out": 1, "capacity": 1}
+
+    @pytest.mark.asyncio
+    async def test_unavailable_without_redis(self, database):
+        redis = AsyncMock()
+        redis.ping.side_effect = ConnectionError("refused")
+        prober = HealthProber(HealthConfig(), database, FakeRedisManager(redis), LoopMonitor())
+
+        await prober.probe()
+
+        report = prober.readiness()
+        assert report["status"] == "unavailable"
+        assert "refused" in report["checks"]["redis"]["error"]
+
+    @pytest.mark.asyncio
+    async def test_degraded_on_loop_lag_and_unavailable_when_stale(self, database):
+        config = HealthConfig(HEALTH_LOOP_LAG=0.1, HEALTH_PROBE_INTERVAL=1)
+        prober = HealthProber(config, database, FakeRedisManager(AsyncMock()), LoopMonitor())
+
+        await prober.probe(lag=0.5)
+        assert prober.readiness()["status"] == "degraded"
+
+        prober.checked_at -= 10
+        assert prober.readiness()["status"] == "unavailable"
+
+
+class TestWarmup:
+    @pytest_asyncio.fixture
+    async def engine(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'warmup.db'}")
+        yield engine
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_fills_pools_and_runs_every_step(self, engine):
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        redis = AsyncMock()
+        config = WarmupConfig(WARMUP_DB_CONNECTIONS=3, WARMUP_REDIS_CONNECTIONS=4)
+
+        timings = await warm_up(config, Mock(engine=engine), FakeRedisManager(redis))
+
+        assert set(timings) == {"serializers", "database", "redis"}
+        assert engine.sync_engine.pool.checkedin() == 3
+        assert redis.ping.await_count == 4
+
+    @pytest.mark.asyncio
+    async def test_failed_step_is_logged_and_skipped(self, engine, caplog):
+        # Without tables every hot statement fails
+        redis = AsyncMock()
+
+        with caplog.at_level(logging.WARNING, logger="app.services.warmup"):
+            timings = await warm_up(WarmupConfig(), Mock(engine=engine), FakeRedisManager(redis))
+
+        assert "database" not in timings
+        assert "redis" in timings
+        assert "Warm-up of database failed" in caplog.text
+
+
+class TestLazyAttribute:
+    def test_value_built_once_on_first_access(self):
+        factory = Mock(return_value="client")
+
+        class Service:
+            client = LazyAttribute(factory)
+
+        factory.assert_not_called()
+        assert Service().client == "client"
+        assert Service.client == "client"
+        factory.assert_called_once()
+
+
+class TestJSONResponses:
+    def test_encodes_like_the_standard_response(self):
+        content = {"name": "Олена", "scores": [1.5, None, True], 7: "int key"}
+
+        body = FastJSONResponse(content).body
+
+        assert json.loads(body) == json.loads(JSONResponse(content).body)
+        assert json.loads(FastJSONResponse({"price": Decimal("1.50")}).body) == {"price": "1.50"}
+
+    def test_route_serializes_response_model_to_bytes(self):
+        router = APIRouter(route_class=JSONRoute, default_response_class=FastJSONResponse)
+
+        def quota(response: Response):
+            response.headers["X-RateLimit-Remaining"] = "4"
+
+        @router.post("/contacts", response_model=list[ContactResponseSchema], status_code=201)
+        async def contacts(remaining: None = Depends(quota)):
+            return [
+                Contact(
+                    id=3, name="Ann", surname="Lee", email="ann@example.com",
+                    phone="0501234567", date_of_birth=date(1990, 5, 17), user_id=1,
+                )
+            ]
+
+        app = FastAPI()
+        app.include_router(router)
+
+        with patch.object(JSONRoute, "encode", autospec=True, side_effect=JSONRoute.encode) as mock_encode:
+            response = TestClient(app).post("/contacts")
+
+        mock_encode.assert_called_once()
+        assert response.status_code == 201
+        assert response.headers["content-type"] == "application/json"
+        assert response.headers["x-ratelimit-remaining"] == "4"
+        assert response.json() == [
+            {
+                "id": 3, "name": "Ann", "surname": "Lee", "email": "ann@example.com",
+                "phone": "0501234567", "date_of_birth": "1990-05-17", "additional_info": None,
+            }
+        ]
+
+    def test_route_reports_invalid_responses(self):
+        app = FastAPI(default_response_class=FastJSONResponse)
+        app.router.route_class = JSONRoute
+
+        @app.get("/contact", response_model=ContactResponseSchema)
+        async def contact():
+            return {"name": "Ann"}
+
+        with pytest.raises(ResponseValidationError):
+            TestClient(app).get("/contact")
+
+
+class TestCompression:
+    @pytest.fixture
+    def app(self):
+        app = FastAPI()
+
+        @app.get("/contacts")
+        async def contacts(rows: int = 100):
+            return [{"name": "Ann", "email": f"ann.{index}@example.com"} for index in range(rows)]
+
+        @app.get("/image")
+        async def image():
+            return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+        config = CompressionConfig(COMPRESSION_MIN_SIZE=500, COMPRESSION_CACHE_SIZE=8)
+        app.add_middleware(CompressionMiddleware, config=config)
+        return app
+
+    def test_negotiates_the_preferred_accepted_coding(self):
+        assert negotiate("gzip, deflate, br", ("br", "gzip")) == "br"
+        assert negotiate("gzip;q=1.0, br;q=0.5", ("br", "gzip")) == "gzip"
+        assert negotiate("br;q=0, *", ("br", "gzip")) == "gzip"
+        assert negotiate("identity", ("br", "gzip")) is None
+        assert negotiate("", ("gzip",)) is None
+
+    def test_compresses_large_json_once_per_body(self, app):
+        client = TestClient(app)
+
+        with patch.object(Compressor, "_compress", autospec=True, side_effect=Compressor._compress) as compress:
+            first = client.get("/contacts", headers={"Accept-Encoding": "gzip"})
+            second = client.get("/contacts", headers={"Accept-Encoding": "gzip"})
+
+        assert first.headers["content-encoding"] == "gzip"
+        assert first.headers["vary"] == "Accept-Encoding"
+        assert int(first.headers["content-length"]) < len(first.content)
+        assert first.json() == second.json()
+        assert len(first.json()) == 100
+        compress.assert_called_once()
+
+    def test_small_encoded_or_binary_bodies_are_sent_as_is(self, app):
+        client = TestClient(app)
+
+        small = client.get("/contacts?rows=2", headers={"Accept-Encoding": "gzip"})
+        image = client.get("/image", headers={"Accept-Encoding": "gzip"})
+        identity = client.get("/contacts", headers={"Accept-Encoding": "identity"})
+
+        for response in (small, image, identity):
+            assert "content-encoding" not in response.headers
+            assert int(response.headers["content-length"]) == len(response.content)
@@ -0,0 +1,41 @@
+"""
+Out-of-process worker delivering the verification email outbox.
+
+Run one or more instances next to the API:
+
+    python worker.py
+"""
+
+import asyncio
+import signal
+
+from app.conf.config import loop_monitor_config
+from app.database.redis import redis_manager
+from app.services.email import mail_sender
+from app.services.log import configure_logging, shutdown_logging
+from app.services.loop_monitor import loop_monitor
+from app.services.outbox import OutboxWorker
+from app.services.tracing import tracer
+
+
+async def main() -> None:
+    async with redis_manager.session() as redis:
+        worker = OutboxWorker(redis)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        if loop_monitor_config.LOOP_MONITOR_ENABLED:
+            await loop_monitor.start()
+        try:
+            await worker.run()
+        finally:
+            await loop_monitor.stop()
+            await mail_sender.close()
+            tracer.shutdown()
+            await redis_manager.close()
+            shutdown_logging()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(main())